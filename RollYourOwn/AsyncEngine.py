@@ -0,0 +1,285 @@
+"""
+asyncio probing engine shared by xTensionProbe and GetMetaData.
+
+Requests go through one aiohttp client and ffprobe runs via
+asyncio.create_subprocess_exec. Network and ffprobe concurrency are bounded
+separately: thousands of HEAD/range requests can be in flight while only
+os.cpu_count() ffprobe processes run at once.
+
+Requires aiohttp (pip install aiohttp).
+"""
+import asyncio
+import contextlib
+import importlib.util
+import os
+import tempfile
+import time
+
+import Transport
+from AuthGate import AuthGate
+from RateGovernor import parse_retry_after
+
+aiohttp = None  # Imported by the first AsyncEngine - it is slower to import than the tools themselves
+
+DEFAULT_NETWORK_CONCURRENCY = 500
+DEFAULT_FFPROBE_CONCURRENCY = os.cpu_count() or 4
+CHUNK_SIZE = 256 * 1024
+SPOOL_MAX_SIZE = 5 * 1024 * 1024  # Downloads spill to disk beyond this
+SPOOL_AHEAD_PER_SLOT = 2  # Downloads that may spool while waiting for an ffprobe slot, per slot
+
+
+def is_available():
+    return aiohttp is not None or importlib.util.find_spec('aiohttp') is not None
+
+
+class AsyncEngine:
+    """
+    Async HTTP + ffprobe runner. Use as `async with AsyncEngine(...) as engine:`.
+
+    Args:
+        session: requests.Session the cookies and headers are copied from
+        network_concurrency: Max requests in flight
+        ffprobe_concurrency: Max ffprobe processes at once
+        auth_statuses: Status codes that count as an auth failure and are retried
+        error_threshold: Consecutive auth failures before refresh_cookies runs
+        refresh_cookies: Blocking callable that refreshes `session` cookies in place
+        auth_gate: Shared AuthGate (replaces error_threshold/refresh_cookies), so threads
+            and tasks of the same tool pause together and refresh once
+        timeout: Connect/read timeout in seconds
+        governor: Optional RateGovernor that paces requests and learns from their outcome
+    """
+
+    def __init__(self, session, network_concurrency=DEFAULT_NETWORK_CONCURRENCY,
+                 ffprobe_concurrency=DEFAULT_FFPROBE_CONCURRENCY, auth_statuses=(401, 403),
+                 error_threshold=5, refresh_cookies=None, timeout=60, governor=None, auth_gate=None):
+        global aiohttp
+        if aiohttp is None:
+            try:
+                import aiohttp
+            except ImportError:
+                raise RuntimeError("The asyncio engine needs aiohttp: pip install aiohttp")
+        self.session = session
+        self.network_concurrency = network_concurrency
+        self.auth_statuses = auth_statuses
+        self.auth_gate = auth_gate or AuthGate(refresh_cookies, error_threshold)
+        self.timeout = timeout
+        self.governor = governor
+        self.network_slots = asyncio.Semaphore(network_concurrency)
+        self.ffprobe_slots = asyncio.Semaphore(ffprobe_concurrency)
+        self.spool_slots = asyncio.Semaphore(ffprobe_concurrency * SPOOL_AHEAD_PER_SLOT)
+        self.cookie_generation = None  # AuthGate generation the aiohttp cookies were copied at
+        self.http = None
+
+    async def __aenter__(self):
+        # Requests and new connections are counted in Transport.stats, like the threaded engines
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(self._on_request_start)
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        self.http = aiohttp.ClientSession(
+            headers=dict(self.session.headers),
+            connector=aiohttp.TCPConnector(limit=self.network_concurrency),
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout),
+            trace_configs=[trace_config],
+        )
+        self._copy_cookies(self.auth_gate.generation)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.http.close()
+
+    @staticmethod
+    async def _on_request_start(session, context, params):
+        Transport.stats.record_request()
+
+    @staticmethod
+    async def _on_connection_create_end(session, context, params):
+        Transport.stats.record_connection()
+
+    def _copy_cookies(self, generation):
+        self.http.cookie_jar.clear()
+        self.http.cookie_jar.update_cookies(self.session.cookies.get_dict())
+        self.cookie_generation = generation
+
+    @contextlib.asynccontextmanager
+    async def request(self, method, url, headers=None, allow_redirects=True):
+        """
+        Sends a request, retrying auth failures, and yields the response (the
+        last auth failure if the auth gate gives up on it).
+        A network slot is held until the block exits, including while the body is read.
+        No request is sent while the auth gate is closed for a cookie refresh.
+        """
+        async with self.network_slots:
+            attempt = 0
+            while True:
+                generation = await self.auth_gate.wait_async()
+                if generation != self.cookie_generation:
+                    self._copy_cookies(generation)  # The session was refreshed since the last copy
+                if self.governor is not None:
+                    await self.governor.acquire_async()
+                started = time.monotonic()
+                try:
+                    response = await self.http.request(method, url, headers=headers, allow_redirects=allow_redirects)
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    if self.governor is not None:
+                        self.governor.record(None)
+                    raise
+                if self.governor is not None:
+                    self.governor.record(response.status, time.monotonic() - started,
+                                         parse_retry_after(response.headers))
+                if response.status in self.auth_statuses:
+                    response.release()
+                    attempt += 1
+                    # The refresh (if this failure trips it) blocks, so it runs off the event loop
+                    if await asyncio.to_thread(self.auth_gate.failure, generation, attempt):
+                        continue
+                else:
+                    self.auth_gate.success(generation)
+                try:
+                    yield response
+                finally:
+                    response.release()
+                return
+
+    async def run_ffprobe_file(self, command):
+        """Runs ffprobe on a file path. Returns (returncode, stdout, stderr)."""
+        async with self.ffprobe_slots:
+            proc = await asyncio.create_subprocess_exec(
+                *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+            try:
+                stdout, stderr = await asyncio.wait_for(proc.communicate(), self.timeout)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                raise
+            return proc.returncode, stdout, stderr
+
+    async def probe_download(self, download, command, spool=None):
+        """
+        Downloads and probes concurrently without tying an ffprobe slot to the network.
+
+        `download` (async iterator of chunks) is appended to `spool` as it arrives.
+        Once an ffprobe slot is free, ffprobe is fed everything in the spool from
+        byte 0 - including bytes that were already in it - and then follows the
+        download. The download is cancelled as soon as ffprobe exits.
+        At most SPOOL_AHEAD_PER_SLOT downloads per ffprobe slot spool while waiting
+        for one; the rest wait before they start downloading.
+
+        Returns:
+            (returncode, stdout, stderr, bytes_sent)
+        """
+        own_spool = spool is None
+        if own_spool:
+            spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        spool.seek(0, os.SEEK_END)
+        state = {'written': spool.tell(), 'finished': False, 'error': None}
+        progress = asyncio.Condition()
+
+        async def produce():
+            try:
+                async for chunk in download:
+                    spool.seek(0, os.SEEK_END)
+                    spool.write(chunk)
+                    async with progress:
+                        state['written'] += len(chunk)
+                        progress.notify_all()
+            except Exception as e:
+                state['error'] = e
+            finally:
+                async with progress:
+                    state['finished'] = True
+                    progress.notify_all()
+
+        async def spooled_chunks():
+            pos = 0
+            while True:
+                async with progress:
+                    await progress.wait_for(lambda: state['written'] > pos or state['finished'])
+                if state['written'] <= pos:
+                    if state['error'] is not None:
+                        raise state['error']
+                    return
+                spool.seek(pos)
+                chunk = spool.read(min(CHUNK_SIZE, state['written'] - pos))
+                pos += len(chunk)
+                yield chunk
+
+        await self.spool_slots.acquire()
+        producer = asyncio.create_task(produce())
+        try:
+            try:
+                await self.ffprobe_slots.acquire()
+            finally:
+                self.spool_slots.release()  # Now bounded by the ffprobe slot
+            try:
+                return await self._pipe_to_ffprobe(spooled_chunks(), command)
+            finally:
+                self.ffprobe_slots.release()
+        finally:
+            producer.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await producer
+            if own_spool:
+                spool.close()
+
+    async def _pipe_to_ffprobe(self, chunks, command):
+        proc = await asyncio.create_subprocess_exec(
+            *command, stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        stdout_task = asyncio.create_task(proc.stdout.read())
+        stderr_task = asyncio.create_task(proc.stderr.read())
+        bytes_sent = 0
+        try:
+            async for chunk in chunks:
+                if proc.returncode is not None:
+                    break  # ffprobe has everything it needs
+                try:
+                    proc.stdin.write(chunk)
+                    await proc.stdin.drain()
+                except (BrokenPipeError, ConnectionResetError):
+                    break  # ffprobe exited while we were writing
+                bytes_sent += len(chunk)
+        finally:
+            with contextlib.suppress(BrokenPipeError, ConnectionResetError):
+                proc.stdin.close()
+            try:
+                await asyncio.wait_for(proc.wait(), self.timeout)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                raise
+        return proc.returncode, await stdout_task, await stderr_task, bytes_sent
+
+
+def run_all(items, probe, on_result, session, **engine_kwargs):
+    """
+    Runs probe(engine, item) for every item on a fresh event loop and calls
+    on_result(item, result) in completion order. Only a window of
+    2 x network_concurrency tasks exists at a time, so huge inputs stay cheap.
+
+    Args:
+        items: Iterable of work items
+        probe: async callable (engine, item) -> result
+        on_result: Called on the event loop thread for every finished item
+        session: requests.Session to take cookies/headers from
+        engine_kwargs: Passed on to AsyncEngine
+    """
+    async def main():
+        async with AsyncEngine(session, **engine_kwargs) as engine:
+            async def tagged(item):
+                return item, await probe(engine, item)
+
+            window = 2 * engine.network_concurrency
+            remaining = iter(items)
+            pending = set()
+            while True:
+                for item in remaining:
+                    pending.add(asyncio.ensure_future(tagged(item)))
+                    if len(pending) >= window:
+                        break
+                if not pending:
+                    return
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    on_result(*task.result())
+
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+"""
+Shared pause gate for auth failures (401/403), used by xTensionProbe and GetMetaData.
+
+Every request passes through wait() before it is sent. After `threshold`
+consecutive auth failures the gate closes: new requests block in wait(),
+exactly one caller runs the cookie refresh (the browser step), and the gate
+reopens once it returns. Failures of requests that were sent with the old
+cookies don't count towards the next trip, so requests that were already in
+flight during a refresh can't trip it again straight away.
+
+check_cookies() is the cheap check the tools run at startup, so the browser
+step is only needed when the saved cookies no longer work.
+"""
+import asyncio
+import threading
+
+import requests
+
+ASYNC_POLL_INTERVAL = 0.1
+RETRIES_WITHOUT_REFRESH = 3  # Times a request is re-sent after auth failures when there is no cookie refresh
+
+
+class AuthGate:
+    """
+    Args:
+        refresh: Blocking callable that replaces the session cookies, or None
+            (the gate then just resets its counter, e.g. in benchmarks)
+        threshold: Consecutive auth failures that close the gate
+        retries_without_refresh: Times one request is re-sent while refresh is None
+    """
+
+    def __init__(self, refresh=None, threshold=5, retries_without_refresh=RETRIES_WITHOUT_REFRESH):
+        self.refresh = refresh
+        self.threshold = threshold
+        self.retries_without_refresh = retries_without_refresh
+        self.condition = threading.Condition()
+        self.is_open = True
+        self.failures = 0
+        self.generation = 0  # Bumped after every refresh
+
+    def wait(self):
+        """Blocks while a refresh is running. Returns the cookie generation to pass back to success()/failure()."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.is_open)
+            return self.generation
+
+    async def wait_async(self):
+        """wait() for the event loop: polls instead of blocking while the gate is closed."""
+        while True:
+            with self.condition:
+                if self.is_open:
+                    return self.generation
+            await asyncio.sleep(ASYNC_POLL_INTERVAL)
+
+    def success(self, generation):
+        with self.condition:
+            if generation == self.generation:
+                self.failures = 0
+
+    def failure(self, generation, attempt=1):
+        """
+        Counts an auth failure for a request sent at `generation`. The caller that
+        trips the threshold runs the refresh before returning; everyone else returns
+        at once and blocks in wait() on the retry.
+
+        Returns:
+            True if the request should be sent again: always when there is a
+            refresh, else only while `attempt` (its failures so far, this one
+            included) is within retries_without_refresh.
+        """
+        retry = self.refresh is not None or attempt <= self.retries_without_refresh
+        with self.condition:
+            if generation != self.generation or not self.is_open:
+                return retry  # Stale cookies, or a refresh is already under way
+            self.failures += 1
+            if self.failures < self.threshold:
+                return retry
+            self.is_open = False
+        try:
+            if self.refresh is not None:
+                self.refresh()
+        finally:
+            with self.condition:
+                self.generation += 1
+                self.failures = 0
+                self.is_open = True
+                self.condition.notify_all()
+        return retry
+
+
+def check_cookies(session, url, timeout=15):
+    """
+    Sends one HEAD for a known file with the session's cookies. True if the file
+    is served directly: 2xx, not redirected to a challenge, and not an HTML page.
+    """
+    try:
+        r = session.head(url, allow_redirects=False, timeout=timeout)
+    except requests.exceptions.RequestException:
+        return False
+    return 200 <= r.status_code < 300 and 'text/html' not in r.headers.get('Content-Type', '').lower()
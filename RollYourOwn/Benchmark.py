@@ -0,0 +1,573 @@
+"""
+Offline benchmark for xTensionProbe and GetMetaData.
+
+Starts a local stand-in for the DOJ media server (synthetic JPEG/PNG/MP3/WAV
+files, MP4s with the moov box at the end, tiny files, mislabeled .pdf files)
+with Range/HEAD support, configurable latency and bandwidth and injected
+401/403 bursts. Each tool then runs against it without prompts or a browser,
+in a child process per engine, and the suite reports URLs/s, bytes transferred
+per valid file, peak RSS and p50/p99 per-URL latency.
+
+    python Benchmark.py
+    python Benchmark.py --stems 500 --latency-ms 50 --bandwidth-mbps 20 --json bench.json
+    python Benchmark.py --baseline bench.json   # flags runs that got slower
+"""
+import argparse
+import csv
+import http.server
+import json
+import os
+import random
+import re
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import AsyncEngine
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STEM_PATH = '/epstein/files/DataSet%20{dataset}/EFTA{number:08d}'
+WRITE_CHUNK = 64 * 1024
+
+# Share of stems per kind of file behind them
+CORPUS_MIX = [
+    ('mp4_trailing_moov', 0.15),
+    ('mp4_faststart', 0.05),
+    ('jpg', 0.15),
+    ('png', 0.05),
+    ('mp3', 0.08),
+    ('wav', 0.04),
+    ('tiny', 0.05),
+    ('mislabeled_pdf', 0.03),
+    ('pdf_only', 0.40),
+]
+CONTENT_TYPES = {
+    '.mp4': 'video/mp4', '.jpg': 'image/jpeg', '.png': 'image/png', '.mp3': 'audio/mpeg',
+    '.wav': 'audio/wav', '.pdf': 'application/pdf',
+}
+
+
+# --- Synthetic media (files are lists of byte strings and zero-run lengths) ---
+
+def _box(box_type, payload):
+    return struct.pack('>I', 8 + len(payload)) + box_type + payload
+
+
+def _full_box(box_type, payload):
+    return _box(box_type, b'\0\0\0\0' + payload)
+
+
+def _mp4(mdat_bytes, faststart):
+    ftyp = _box(b'ftyp', b'isom' + struct.pack('>I', 512) + b'isomiso2avc1mp41')
+    mvhd = _full_box(b'mvhd', struct.pack('>IIII', 0, 0, 1000, 60000) + b'\0' * 80)
+    sample_entry = _box(b'avc1', b'\0' * 6 + struct.pack('>H', 1) + b'\0' * 16 + struct.pack('>HH', 1280, 720) + b'\0' * 50)
+    stbl = _box(b'stbl', _full_box(b'stsd', struct.pack('>I', 1) + sample_entry))
+    mdia = _box(b'mdia', _full_box(b'mdhd', struct.pack('>IIII', 0, 0, 30000, 1800000) + b'\0' * 4)
+                + _full_box(b'hdlr', b'\0' * 4 + b'vide' + b'\0' * 13)
+                + _box(b'minf', stbl))
+    moov = _box(b'moov', mvhd + _box(b'trak', _full_box(b'tkhd', b'\0' * 80) + mdia))
+    mdat_header = struct.pack('>I', 8 + mdat_bytes) + b'mdat'
+    if faststart:
+        return [ftyp + moov + mdat_header, mdat_bytes]
+    return [ftyp + mdat_header, mdat_bytes, moov]
+
+
+def _jpeg(size):
+    head = (b'\xff\xd8\xff\xe0' + struct.pack('>H', 16) + b'JFIF\0\x01\x01\0\0\x01\0\x01\0\0'
+            + b'\xff\xc0' + struct.pack('>HBHHB', 17, 8, 1080, 1920, 3) + b'\x01\x22\0\x02\x11\x01\x03\x11\x01'
+            + b'\xff\xda' + struct.pack('>H', 12) + b'\x03\x01\0\x02\x11\x03\x11\0\x3f\0')
+    return [head, size - len(head) - 2, b'\xff\xd9']
+
+
+def _png(size):
+    ihdr = struct.pack('>IIBBBBB', 1920, 1080, 8, 2, 0, 0, 0)
+    head = b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR' + ihdr + struct.pack('>I', 0)
+    return [head, size - len(head)]
+
+
+def _mp3(size):
+    frame = struct.pack('>I', 0xFFFB9000) + b'\0' * (417 - 4)  # MPEG-1 Layer III, 128kbps, 44.1kHz
+    frames = max(2, size // len(frame))
+    return [frame * frames]
+
+
+def _wav(size):
+    data_bytes = size - 44
+    header = (b'RIFF' + struct.pack('<I', 36 + data_bytes) + b'WAVE'
+              + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, 2, 44100, 176400, 4, 16)
+              + b'data' + struct.pack('<I', data_bytes))
+    return [header, data_bytes]
+
+
+def _pdf(size):
+    return [b'%PDF-1.4\n', size - 9]
+
+
+def file_size(segments):
+    return sum(len(s) if isinstance(s, bytes) else s for s in segments)
+
+
+def iter_file_bytes(segments, start, end):
+    """Yields bytes [start, end) of a segment list, zero runs generated on the fly."""
+    pos = 0
+    for segment in segments:
+        length = len(segment) if isinstance(segment, bytes) else segment
+        seg_start, seg_end = max(start, pos), min(end, pos + length)
+        while seg_start < seg_end:
+            chunk_end = min(seg_end, seg_start + WRITE_CHUNK)
+            if isinstance(segment, bytes):
+                yield segment[seg_start - pos:chunk_end - pos]
+            else:
+                yield bytes(chunk_end - seg_start)
+            seg_start = chunk_end
+        pos += length
+        if pos >= end:
+            return
+
+
+def build_corpus(stems, seed=1, video_mb=8):
+    """
+    Returns (files, pdf_paths, media_paths): files maps URL path -> segment list,
+    pdf_paths are the scraper-style inputs for xTensionProbe and media_paths the
+    files xTensionProbe should find (the inputs for GetMetaData).
+    """
+    rng = random.Random(seed)
+    kinds = [kind for kind, _ in CORPUS_MIX]
+    weights = [weight for _, weight in CORPUS_MIX]
+    files, pdf_paths, media_paths = {}, [], []
+    for i in range(stems):
+        stem = STEM_PATH.format(dataset=1 + i // 1000, number=i + 1)
+        kind = rng.choices(kinds, weights)[0]
+        pdf_paths.append(stem + '.pdf')
+        files[stem + '.pdf'] = _pdf(rng.randint(20, 400) * 1024)
+        if kind == 'mp4_trailing_moov':
+            media = (stem + '.mp4', _mp4(rng.randint(video_mb // 2, video_mb) * 1024 * 1024, faststart=False))
+        elif kind == 'mp4_faststart':
+            media = (stem + '.mp4', _mp4(rng.randint(video_mb // 2, video_mb) * 1024 * 1024, faststart=True))
+        elif kind == 'jpg':
+            media = (stem + '.jpg', _jpeg(rng.randint(200, 3000) * 1024))
+        elif kind == 'png':
+            media = (stem + '.png', _png(rng.randint(200, 3000) * 1024))
+        elif kind == 'mp3':
+            media = (stem + '.mp3', _mp3(rng.randint(1, 6) * 1024 * 1024))
+        elif kind == 'wav':
+            media = (stem + '.wav', _wav(rng.randint(1, 6) * 1024 * 1024))
+        elif kind == 'tiny':
+            media = (stem + '.jpg', _jpeg(rng.randint(5, 90) * 1024))
+        elif kind == 'mislabeled_pdf':
+            # Served as video/mp4 under the .pdf name
+            files[stem + '.pdf'] = _mp4(rng.randint(1, video_mb) * 1024 * 1024, faststart=False)
+            media = None
+            media_paths.append(stem + '.pdf')
+        else:
+            media = None
+        if media:
+            files[media[0]] = media[1]
+            media_paths.append(media[0])
+    return files, pdf_paths, media_paths
+
+
+# --- Local stand-in server ---
+
+class _QuietServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # The async engines open hundreds of connections at once
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class BenchServer:
+    """
+    Threaded HTTP server for a corpus from build_corpus().
+
+    Args:
+        files: URL path -> segment list
+        latency: Seconds slept before every response
+        bandwidth: Bytes/second per response body (None = unthrottled)
+        auth_burst_every: Every N-th request starts a burst of auth failures (0 = never)
+        auth_burst_length: Consecutive 401/403 responses per burst
+    """
+
+    def __init__(self, files, latency=0.0, bandwidth=None, auth_burst_every=0, auth_burst_length=3):
+        self.files = files
+        self.mislabeled = {path for path, segments in files.items()
+                           if path.endswith('.pdf') and isinstance(segments[0], bytes) and segments[0][4:8] == b'ftyp'}
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.auth_burst_every = auth_burst_every
+        self.auth_burst_length = auth_burst_length
+        self.lock = threading.Lock()
+        self.reset_stats()
+        self.httpd = _QuietServer(('127.0.0.1', 0), self._handler_class())
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.httpd.server_port}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests = 0
+            self.connections = 0
+            self.bytes_sent = 0
+            self.auth_failures = 0
+            self.burst_left = 0
+            self.spans = {}  # URL path -> [first request start, last response end]
+
+    def _next_auth_failure(self):
+        """Returns 401/403 while a burst is running, else None."""
+        with self.lock:
+            self.requests += 1
+            if self.auth_burst_every and self.requests % self.auth_burst_every == 0:
+                self.burst_left = self.auth_burst_length
+            if self.burst_left:
+                self.burst_left -= 1
+                self.auth_failures += 1
+                return 401 if self.burst_left % 2 else 403
+        return None
+
+    def _record(self, path, started, sent):
+        with self.lock:
+            self.bytes_sent += sent
+            span = self.spans.setdefault(path, [started, started])
+            span[0] = min(span[0], started)
+            span[1] = max(span[1], time.monotonic())
+
+    def _handler_class(self):
+        bench = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                with bench.lock:
+                    bench.connections += 1  # One handler per connection; keep-alive requests reuse it
+
+            def do_HEAD(self):
+                self._serve(send_body=False)
+
+            def do_GET(self):
+                self._serve(send_body=True)
+
+            def _empty(self, status, headers=()):
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def _serve(self, send_body):
+                started = time.monotonic()
+                path = self.path.split('?')[0]
+                sent = 0
+                try:
+                    if bench.latency:
+                        time.sleep(bench.latency)
+                    auth_status = bench._next_auth_failure()
+                    if auth_status:
+                        return self._empty(auth_status)
+                    segments = bench.files.get(path)
+                    if segments is None:
+                        return self._empty(404)
+
+                    size = file_size(segments)
+                    start, end, status = 0, size, 200
+                    match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+                    if match:
+                        start = int(match.group(1))
+                        if start >= size:
+                            return self._empty(416, [('Content-Range', f'bytes */{size}')])
+                        end = min(size, int(match.group(2)) + 1) if match.group(2) else size
+                        status = 206
+
+                    ext = os.path.splitext(path)[1]
+                    content_type = 'video/mp4' if path in bench.mislabeled else CONTENT_TYPES.get(ext, 'application/octet-stream')
+                    self.send_response(status)
+                    self.send_header('Content-Type', content_type)
+                    self.send_header('Content-Length', str(end - start))
+                    self.send_header('Accept-Ranges', 'bytes')
+                    if status == 206:
+                        self.send_header('Content-Range', f'bytes {start}-{end - 1}/{size}')
+                    self.end_headers()
+                    if not send_body:
+                        return
+                    for chunk in iter_file_bytes(segments, start, end):
+                        self.wfile.write(chunk)
+                        sent += len(chunk)
+                        if bench.bandwidth:
+                            time.sleep(len(chunk) / bench.bandwidth)
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True  # Client stopped reading (e.g. ffprobe was done)
+                finally:
+                    bench._record(path, started, sent)
+
+        return Handler
+
+
+# --- Running the tools ---
+
+def run_child(command, cwd):
+    """Runs a tool to completion with its output in cwd/run.log. Returns (seconds, peak RSS bytes or None, exit code)."""
+    started = time.monotonic()
+    with open(os.path.join(cwd, 'run.log'), 'w') as log:
+        proc = subprocess.Popen(command, cwd=cwd, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT)
+        if hasattr(os, 'wait4'):
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            # ru_maxrss is KB on Linux, bytes on macOS
+            peak_rss = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+        else:
+            proc.wait()
+            peak_rss = None
+    return time.monotonic() - started, peak_rss, proc.returncode
+
+
+def bench_xtensionprobe(server, pdf_paths, extensions, engine, args):
+    """Runs xTensionProbe over the .pdf URLs. Returns a result row."""
+    with tempfile.TemporaryDirectory(prefix='bench_xtension_') as work_dir:
+        with open(os.path.join(work_dir, 'epstein_no_images_pdf_urls.csv'), 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['url'])
+            writer.writerows([server.base_url + path] for path in pdf_paths)
+        command = [sys.executable, os.path.join(HERE, 'xTensionProbe.py'), '--no-browser',
+                   '--extensions', ','.join(extensions), '--workers', str(args.workers),
+                   '--network-concurrency', str(args.network_concurrency),
+                   '--initial-rate', str(args.max_rate), '--max-rate', str(args.max_rate)]
+        if engine == 'async':
+            command.append('--async-engine')
+        elif args.http2:
+            command.append('--http2')
+
+        server.reset_stats()
+        seconds, peak_rss, returncode = run_child(command, work_dir)
+        valid = 0
+        output_csv = os.path.join(work_dir, 'epstein_media_checked_urls.csv')
+        if os.path.exists(output_csv):
+            with open(output_csv, newline='', encoding='utf-8') as f:
+                valid = sum(1 for row in csv.DictReader(f)
+                            if row['media_type'] not in ('no_media_yet', 'pdf_or_not_found', 'tiny_file'))
+        if returncode:
+            print(f"⚠️  xTensionProbe ({engine}) exited with {returncode}, log: {_tail(work_dir)}")
+        return _result_row('xTensionProbe', engine, len(pdf_paths), valid, seconds, peak_rss, server)
+
+
+def bench_getmetadata(server, media_paths, engine, scan_mode, args):
+    """Runs GetMetaData's validation engines over the media URLs. Returns a result row."""
+    with tempfile.TemporaryDirectory(prefix='bench_getmetadata_') as work_dir:
+        config = {
+            'urls': [server.base_url + path for path in media_paths],
+            'engine': engine,
+            'scan_mode': scan_mode,
+            'workers': args.workers,
+            'network_concurrency': args.network_concurrency,
+            'ffprobe_concurrency': args.ffprobe_concurrency,
+            'max_rate': args.max_rate,
+            'http2': args.http2,
+            'result_file': os.path.join(work_dir, 'result.json'),
+        }
+        config_file = os.path.join(work_dir, 'config.json')
+        with open(config_file, 'w') as f:
+            json.dump(config, f)
+
+        server.reset_stats()
+        seconds, peak_rss, returncode = run_child(
+            [sys.executable, os.path.join(HERE, 'Benchmark.py'), '--getmetadata-child', config_file], work_dir)
+        valid = 0
+        if os.path.exists(config['result_file']):
+            with open(config['result_file']) as f:
+                valid = json.load(f)['valid']
+        if returncode:
+            print(f"⚠️  GetMetaData ({engine}) exited with {returncode}, log: {_tail(work_dir)}")
+        return _result_row(f'GetMetaData[{scan_mode}]', engine, len(media_paths), valid, seconds, peak_rss, server)
+
+
+def getmetadata_child(config_file):
+    """Child process body for bench_getmetadata: same engines as GetMetaData.main(), no prompts."""
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    import requests
+
+    import GetMetaData
+    import RateGovernor
+    import Transport
+
+    with open(config_file) as f:
+        config = json.load(f)
+    GetMetaData.MAX_WORKERS = config['workers']
+    GetMetaData.FFPROBE_CONCURRENCY = config['ffprobe_concurrency']
+    GetMetaData.PIPELINE_QUEUE_DEPTH = 2 * config['ffprobe_concurrency']
+    GetMetaData.AUTH_GATE.refresh = None  # No browser to refresh cookies with - auth bursts are just retried
+    RateGovernor.governor.configure(initial_rate=config['max_rate'], max_rate=config['max_rate'])
+
+    session = requests.Session()
+    Transport.configure_session(session, config['workers'], http2=config['http2'] and Transport.is_http2_available())
+    rows = [{'actual_url': url} for url in config['urls']]
+    results = []
+
+    def record_result(row, metadata):
+        results.append(metadata)
+
+    scan_mode = config['scan_mode']
+    if config['engine'] == 'async':
+        async def validate_row(engine, row):
+            return await GetMetaData.async_validate_url_entry(row['actual_url'], engine, scan_mode)
+
+        AsyncEngine.run_all(rows, validate_row, record_result, session,
+                            network_concurrency=config['network_concurrency'],
+                            ffprobe_concurrency=config['ffprobe_concurrency'],
+                            governor=RateGovernor.governor, auth_gate=GetMetaData.AUTH_GATE)
+    elif config['engine'] == 'staged':
+        GetMetaData.run_staged_pipeline(rows, session, scan_mode, None, record_result)
+    else:
+        with ThreadPoolExecutor(max_workers=config['workers']) as executor:
+            futures = {executor.submit(GetMetaData.validate_url_entry, row['actual_url'], session, scan_mode): row
+                       for row in rows}
+            for future in as_completed(futures):
+                record_result(futures[future], future.result())
+
+    with open(config['result_file'], 'w') as f:
+        json.dump({'valid': sum(1 for r in results if r.get('is_valid')), 'total': len(results)}, f)
+    print(Transport.stats.summary())
+
+
+def _tail(work_dir, lines=5):
+    with open(os.path.join(work_dir, 'run.log'), errors='replace') as f:
+        return ' | '.join(f.read().strip().splitlines()[-lines:])
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def _result_row(tool, engine, urls, valid, seconds, peak_rss, server):
+    latencies = [end - start for start, end in server.spans.values()]
+    return {
+        'tool': tool,
+        'engine': engine,
+        'urls': urls,
+        'valid': valid,
+        'seconds': round(seconds, 2),
+        'urls_per_sec': round(urls / seconds, 2) if seconds else None,
+        'bytes_per_valid_file': int(server.bytes_sent / valid) if valid else None,
+        'peak_rss_mb': round(peak_rss / 1024 / 1024, 1) if peak_rss else None,
+        'p50_ms': round(_percentile(latencies, 0.50) * 1000, 1) if latencies else None,
+        'p99_ms': round(_percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+        'requests': server.requests,
+        'conn_reuse': round(1 - server.connections / server.requests, 3) if server.requests else None,
+        'auth_failures': server.auth_failures,
+    }
+
+
+def print_report(rows, baseline=None, tolerance=0.1):
+    columns = ['tool', 'engine', 'urls', 'valid', 'seconds', 'urls_per_sec', 'bytes_per_valid_file',
+               'peak_rss_mb', 'p50_ms', 'p99_ms', 'requests', 'conn_reuse', 'auth_failures']
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in columns}
+    print('\n' + '  '.join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print('  '.join(str(row[c]).ljust(widths[c]) for c in columns))
+
+    if not baseline:
+        return
+    print(f"\nCompared with baseline (regression = more than {tolerance:.0%} worse):")
+    previous = {(r['tool'], r['engine']): r for r in baseline}
+    for row in rows:
+        old = previous.get((row['tool'], row['engine']))
+        if not old:
+            continue
+        checks = [('urls_per_sec', True), ('p99_ms', False), ('bytes_per_valid_file', False), ('peak_rss_mb', False)]
+        notes = []
+        for metric, higher_is_better in checks:
+            if not old.get(metric) or row.get(metric) is None:
+                continue
+            change = row[metric] / old[metric] - 1
+            worse = -change if higher_is_better else change
+            flag = '❌' if worse > tolerance else '✅'
+            notes.append(f"{flag} {metric} {change:+.0%}")
+        print(f"  {row['tool']} ({row['engine']}): " + ', '.join(notes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline throughput benchmark for xTensionProbe and GetMetaData.")
+    parser.add_argument('--stems', type=int, default=200, help="Number of scraped .pdf URLs in the synthetic corpus")
+    parser.add_argument('--video-mb', type=int, default=8, help="Largest synthetic MP4 size in MB")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--latency-ms', type=float, default=20, help="Server latency per request")
+    parser.add_argument('--bandwidth-mbps', type=float, default=0, help="Per-response bandwidth cap in Mbit/s (0 = none)")
+    parser.add_argument('--auth-burst-every', type=int, default=250, help="Start a 401/403 burst every N requests (0 = never)")
+    parser.add_argument('--auth-burst-length', type=int, default=3, help="Auth failures per burst")
+    parser.add_argument('--tools', default='xtensionprobe,getmetadata')
+    parser.add_argument('--engines', default='threads,async,staged', help="threads, async and/or staged (GetMetaData only)")
+    parser.add_argument('--scan-mode', default='two-pass', help="GetMetaData scan mode")
+    parser.add_argument('--extensions', default='.mp4,.jpg,.png,.mp3,.wav', help="xTensionProbe extensions")
+    parser.add_argument('--workers', type=int, default=15)
+    parser.add_argument('--network-concurrency', type=int, default=100)
+    parser.add_argument('--ffprobe-concurrency', type=int, default=AsyncEngine.DEFAULT_FFPROBE_CONCURRENCY)
+    parser.add_argument('--max-rate', type=float, default=1000, help="Request rate the governor starts at and is capped to")
+    parser.add_argument('--http2', action='store_true', help="Threaded engines use the httpx transport (HTTP/1.1 here - the server is plain http)")
+    parser.add_argument('--json', help="Write the results to this file")
+    parser.add_argument('--baseline', help="Earlier --json output to compare against")
+    parser.add_argument('--getmetadata-child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.getmetadata_child:
+        getmetadata_child(args.getmetadata_child)
+        return
+
+    tools = [t.strip().lower() for t in args.tools.split(',')]
+    engines = [e.strip().lower() for e in args.engines.split(',')]
+    if 'async' in engines and not AsyncEngine.is_available():
+        print("⚠️  aiohttp isn't installed - skipping the async engine")
+        engines.remove('async')
+    if 'getmetadata' in tools and shutil.which('ffprobe') is None:
+        print("⚠️  ffprobe isn't installed - skipping GetMetaData")
+        tools.remove('getmetadata')
+
+    files, pdf_paths, media_paths = build_corpus(args.stems, args.seed, args.video_mb)
+    print(f"🧪 Corpus: {len(pdf_paths)} scraped URLs, {len(media_paths)} media files, "
+          f"{sum(file_size(s) for s in files.values()) / 1024 / 1024:.0f}MB")
+
+    rows = []
+    bandwidth = args.bandwidth_mbps * 1000 * 1000 / 8 if args.bandwidth_mbps else None
+    with BenchServer(files, args.latency_ms / 1000, bandwidth, args.auth_burst_every, args.auth_burst_length) as server:
+        for engine in engines:
+            if 'xtensionprobe' in tools and engine != 'staged':
+                print(f"⏱️  xTensionProbe ({engine})...")
+                rows.append(bench_xtensionprobe(server, pdf_paths, args.extensions.split(','), engine, args))
+            if 'getmetadata' in tools:
+                print(f"⏱️  GetMetaData ({engine}, {args.scan_mode})...")
+                rows.append(bench_getmetadata(server, media_paths, engine, args.scan_mode, args))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(rows, baseline)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+        print(f"\n💾 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
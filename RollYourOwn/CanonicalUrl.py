@@ -0,0 +1,129 @@
+"""
+Canonical form of the scraped URLs, so each file is probed and validated once.
+
+The search results can link one file under several spellings: a different
+scheme/host case, an explicit default port, %7e vs ~, a raw space vs %20, a
+#fragment, ad-tracking parameters, or the same query parameters in a
+different order. canonical_url() maps all of them to one key. Other query
+parameters are kept, since ?id=1 and ?id=2 can name different files. CanonicalIndex remembers which
+other spellings each key was seen under and counts them, so every tool can
+report how much duplicate work it skipped.
+"""
+import json
+import os
+import re
+import string
+import threading
+import urllib.parse
+
+ALIASES_FILE = 'url_aliases.json'
+KEEP_QUERY = True  # False drops the whole query string (only safe if no query parameter ever picks the file)
+# Dropped from kept queries: known ad/analytics click ids, which never pick the file
+TRACKING_PARAMS = {'fbclid', 'gclid', 'dclid', 'gbraid', 'wbraid', 'msclkid', 'yclid', 'mc_cid', 'mc_eid', '_ga', '_gl'}
+TRACKING_PREFIXES = ('utm_',)
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+_UNRESERVED = frozenset(string.ascii_letters + string.digits + '-._~')
+_ESCAPE = re.compile(r'(%[0-9A-Fa-f]{2})')
+_PATH_SAFE = "/:@!$&'()*+,;="
+
+
+def _normalize_escapes(part, safe):
+    """
+    Decodes escapes of unreserved characters (%7E → ~), upper-cases the hex of
+    the others (%2f → %2F) and escapes what must be (space → %20). Escaped
+    reserved characters stay escaped, so %2F never turns into a path separator.
+    """
+    out = []
+    for chunk in _ESCAPE.split(part):
+        if _ESCAPE.fullmatch(chunk):
+            char = chr(int(chunk[1:], 16))
+            out.append(char if char in _UNRESERVED else chunk.upper())
+        elif chunk:
+            out.append(urllib.parse.quote(chunk, safe=safe))
+    return ''.join(out)
+
+
+def _is_tracking(param):
+    param = param.lower()
+    return param in TRACKING_PARAMS or param.startswith(TRACKING_PREFIXES)
+
+
+def canonical_url(url, keep_query=None):
+    """
+    Canonical spelling of `url`: lower-case scheme and host, no default port,
+    normalized percent-encoding, no fragment, and the query without ad-tracking
+    parameters, sorted (no query at all if keep_query is False).
+    """
+    parts = urllib.parse.urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    try:
+        host, port = parts.hostname, parts.port
+    except ValueError:
+        host = port = None
+    if host is not None:
+        netloc = f'[{host}]' if ':' in host else host
+        if port is not None and port != DEFAULT_PORTS.get(scheme):
+            netloc += f':{port}'
+    path = _normalize_escapes(parts.path, _PATH_SAFE) or ('/' if netloc else '')
+    query = ''
+    if KEEP_QUERY if keep_query is None else keep_query:
+        params = [(k, v) for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True) if not _is_tracking(k)]
+        query = urllib.parse.urlencode(sorted(params), quote_via=urllib.parse.quote)
+    return urllib.parse.urlunsplit((scheme, netloc, path, query, ''))
+
+
+class CanonicalIndex:
+    """
+    {canonical URL: [other spellings]} for the URLs seen under a non-canonical
+    spelling, optionally kept in a JSON file between runs. `duplicates` counts
+    the spellings of this run that collapsed onto a URL already seen under
+    another spelling (each one a file that would otherwise be processed twice).
+
+    Args:
+        path: JSON file the index is loaded from and saved to, or None to keep it in memory
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.aliases = {}
+        self.spellings = {}  # {canonical URL: spellings seen this run}
+        self.duplicates = 0
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.aliases = json.load(f)
+
+    def add(self, url):
+        """Returns the canonical URL for `url`, recording `url` as one of its spellings."""
+        url = url.strip()
+        key = canonical_url(url)
+        with self.lock:
+            seen = self.spellings.setdefault(key, set())
+            if url not in seen:
+                if seen:
+                    self.duplicates += 1
+                seen.add(url)
+                if url != key and url not in self.aliases.get(key, ()):
+                    self.aliases.setdefault(key, []).append(url)
+        return key
+
+    def dedupe(self, urls, keep_spelling=False):
+        """
+        Canonical URLs of `urls` (with keep_spelling, the first spelling seen of
+        each instead), in first-seen order, each once. Returns (urls, duplicates dropped).
+        """
+        unique = {}
+        for url in urls:
+            unique.setdefault(self.add(url), url.strip())
+        return list(unique.values() if keep_spelling else unique), len(urls) - len(unique)
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            temp_file = self.path + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.aliases, f, indent=1, sort_keys=True)
+            os.replace(temp_file, self.path)
@@ -0,0 +1,106 @@
+"""
+Learned extension ordering for xTensionProbe.
+
+Hit rates are tracked per extension, overall and per URL path prefix (the
+dataset directory), and saved between runs. Each stem then tries its
+extensions in descending hit probability, so a stem with media usually needs
+one or two HEAD requests instead of walking the list in selection order.
+
+Estimates are smoothed towards the broader rate (bucket -> overall -> the
+average of all extensions), so an extension seen a handful of times can't jump
+to the front and unseen extensions keep their selection order.
+"""
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+PRIOR_WEIGHT = 5  # Pseudo-tries pulling an estimate towards the broader rate
+DEFAULT_HIT_RATE = 0.05  # Before anything has been recorded
+
+
+def path_bucket(url):
+    """Bucket key for a URL or stem: its directory, e.g. '/epstein/files/DataSet 9'."""
+    return urlsplit(url).path.rsplit('/', 1)[0]
+
+
+class ExtensionStats:
+    """
+    Args:
+        path: JSON file the counts are loaded from and saved to
+        bucket_by_path: Also learn per path prefix (dataset) rates
+        save_interval: Minimum seconds between saves from maybe_save()
+    """
+
+    def __init__(self, path, bucket_by_path=True, save_interval=30):
+        self.path = path
+        self.bucket_by_path = bucket_by_path
+        self.save_interval = save_interval
+        self.lock = threading.Lock()
+        self.overall = {}  # ext -> [hits, tries]
+        self.buckets = {}  # bucket -> {ext: [hits, tries]}
+        self.session_tries = 0
+        self.session_stems = 0
+        self.last_save = time.monotonic()
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.overall = data.get('overall', {})
+                self.buckets = data.get('buckets', {})
+            except (OSError, ValueError):
+                print(f"⚠️  Could not read {path} - starting with fresh extension hit rates")
+
+    def _rate(self, counts, ext, prior):
+        hits, tries = counts.get(ext, (0, 0))
+        return (hits + PRIOR_WEIGHT * prior) / (tries + PRIOR_WEIGHT)
+
+    def order(self, stem, extensions):
+        """Returns `extensions` sorted by descending estimated hit probability for this stem."""
+        with self.lock:
+            total_hits = sum(h for h, _ in self.overall.values())
+            total_tries = sum(t for _, t in self.overall.values())
+            average = (total_hits + PRIOR_WEIGHT * DEFAULT_HIT_RATE) / (total_tries + PRIOR_WEIGHT)
+            bucket = self.buckets.get(path_bucket(stem), {}) if self.bucket_by_path else {}
+            scores = {}
+            for ext in extensions:
+                overall_rate = self._rate(self.overall, ext, average)
+                scores[ext] = self._rate(bucket, ext, overall_rate) if bucket else overall_rate
+        # sorted() is stable, so ties keep the selection order
+        return sorted(extensions, key=lambda ext: -scores[ext])
+
+    def record(self, stem, ext, hit):
+        """Counts one HEAD for stem+ext."""
+        with self.lock:
+            self.session_tries += 1
+            targets = [self.overall]
+            if self.bucket_by_path:
+                targets.append(self.buckets.setdefault(path_bucket(stem), {}))
+            for counts in targets:
+                entry = counts.setdefault(ext, [0, 0])
+                entry[1] += 1
+                if hit:
+                    entry[0] += 1
+
+    def stem_done(self):
+        with self.lock:
+            self.session_stems += 1
+
+    def requests_per_stem(self):
+        with self.lock:
+            return self.session_tries / self.session_stems if self.session_stems else 0.0
+
+    def maybe_save(self):
+        if time.monotonic() - self.last_save >= self.save_interval:
+            self.save()
+
+    def save(self):
+        """Writes the counts atomically."""
+        with self.lock:
+            data = {'overall': self.overall, 'buckets': self.buckets}
+            temp_file = self.path + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(temp_file, self.path)
+            self.last_save = time.monotonic()
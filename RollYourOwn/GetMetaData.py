@@ -1,11 +1,16 @@
 import csv
+import sys
 import subprocess
 import json
 import os
-import random
 import time
-import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import tempfile
+import itertools
+import asyncio
+import collections
+import multiprocessing
+import queue
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 import requests
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
@@ -15,22 +20,63 @@ import selenium_stealth
 
 import questionary
 
+import AsyncEngine
+from AuthGate import AuthGate, check_cookies
+import CanonicalUrl
+import IsoBmff
+import MediaHeaders
+import PipelineStore
+import RateGovernor
+import ResultJournal
+import Transport
+from RangeCache import RangeCache
+
 # --- Configuration ---
 INPUT_CSV = 'epstein_media_checked_urls.csv'
 OUTPUT_CSV = 'epstein_full_metadata.csv'
+JOURNAL_FILE = 'epstein_full_metadata.jsonl' # Append-only results; the CSV is exported from it
+PARQUET_FILE = 'epstein_full_metadata.parquet' # Optional typed export (needs pyarrow)
 COOKIES_FILE = 'doj_cookies_metadata.json' # Use a separate cookie file
+COOKIE_CHECK_URL = None # File requested to check the saved cookies (default: the first media URL of the input)
 MAX_WORKERS = 15  # Default worker count
 PROBE_SIZE_MB = 5 # How many MB to download to check metadata
 DEEP_SCAN_SIZE_MB = 100 # How many MB to download for deep scan
 SUPERDEEP_SCAN_SIZE_MB = 200 # Superdeep scan size
 MANDINGO_DEEP_SCAN_SIZE_MB = 500 # Mandingo deep scan size
-SAVE_BATCH_SIZE = 50 # Save progress every N files
-RANDOM_SLEEP = False
+SAVE_BATCH_SIZE = 50 # fsync the journal every N files
+PREFERRED_COLUMNS = ['original_url', 'actual_url', 'media_type', 'is_valid', 'validation_method', 'file_size_bytes', 'error']
+INITIAL_REQUEST_RATE = 5 # Requests/second the adaptive rate governor starts at
+MAX_REQUEST_RATE = 50 # Upper bound for the adaptive rate governor
+STREAM_TO_FFPROBE = True # Pipe chunks into ffprobe as they arrive instead of buffering the whole range
+STREAM_CHUNK_SIZE = 256 * 1024 # Bytes per chunk when streaming into ffprobe
+FFPROBE_TIMEOUT = 60
+MOOV_AWARE_PROBING = True # Smart mode: locate and fetch only the moov box for MP4/MOV files
+MOOV_HEAD_BYTES = 64 * 1024 # Head fetched to walk the top-level boxes
+MOOV_MAX_MB = 64 # Give up on the tail-aware probe for moov boxes larger than this
+HEADER_PARSE_FAST_PATH = True # Parse common container headers in Python before spawning ffprobe
+HEADER_PARSE_BYTES = 64 * 1024 # Head fetched for the pure-Python header parsers
+RANGE_CACHE_DIR = 'metadata_range_cache' # On-disk cache of downloaded byte ranges, shared across runs
+RANGE_CACHE_MAX_GB = 20 # Least recently used files are evicted beyond this
+RANGE_CACHE = None # RangeCache instance when the cache is enabled
+USE_ASYNC_ENGINE = False # asyncio + aiohttp engine instead of the thread pool
+NETWORK_CONCURRENCY = AsyncEngine.DEFAULT_NETWORK_CONCURRENCY # Async engine: max requests in flight
+FFPROBE_CONCURRENCY = AsyncEngine.DEFAULT_FFPROBE_CONCURRENCY # Async engine / staged pipeline: max ffprobe processes at once
+USE_STAGED_PIPELINE = False # Thread pool downloads into buffers, a separate process pool runs ffprobe + parsing
+PIPELINE_QUEUE_DEPTH = 2 * FFPROBE_CONCURRENCY # Staged pipeline: downloaded buffers allowed to wait for an ffprobe process
+USE_HTTP2 = False # Threaded engines: multiplex all workers over HTTP/2 via httpx (pip install 'httpx[http2]')
+USE_PIPELINE_STORE = False # Read finds from / write results to the shared SQLite store instead of the CSVs and journal (or pass --store)
+STORE_FILE = PipelineStore.STORE_FILE
+
+FFPROBE_COMMAND = [
+    'ffprobe', '-v', 'quiet', '-print_format', 'json',
+    '-show_streams', '-show_format', '-'
+]
 
 # --- 401 Handling Globals ---
-consecutive_401s = 0
 ERROR_THRESHOLD = 5
-refresh_lock = threading.Lock()
+# Shared by every worker and engine: after ERROR_THRESHOLD consecutive auth errors new
+# requests wait while exactly one of them refreshes the cookies (main() sets the refresh)
+AUTH_GATE = AuthGate(threshold=ERROR_THRESHOLD)
 
 # --- Helper to check for FFmpeg ---
 def is_ffmpeg_installed():
@@ -73,29 +119,22 @@ def get_cookies():
     driver.quit()
     return cookies
 
-def refresh_cookies_and_session(session):
-    """Pauses execution to allow user to change VPN and refresh cookies."""
-    global consecutive_401s
-    with refresh_lock:
-        # Double-check inside the lock
-        if consecutive_401s < ERROR_THRESHOLD:
-            return
-
-        print(f"\n🔄 *** BOT BLOCKED ({ERROR_THRESHOLD} consecutive auth errors) - HUMAN INTERVENTION REQUIRED ***")
-        print("1. Please CHANGE YOUR VPN IP now.")
-        print("2. Once changed, press Enter to open the browser and solve challenges.")
-        input("Press Enter to continue...")
+def refresh_session_cookies(session):
+    """Asks the user to change VPN, re-runs the browser step and updates the session in place."""
+    print(f"\n🔄 *** BOT BLOCKED ({ERROR_THRESHOLD} consecutive auth errors) - HUMAN INTERVENTION REQUIRED ***")
+    print("1. Please CHANGE YOUR VPN IP now.")
+    print("2. Once changed, press Enter to open the browser and solve challenges.")
+    input("Press Enter to continue...")
 
-        # Get new cookies
-        new_cookies = get_cookies()
-        
-        # Update the session in-place
-        session.cookies.clear()
-        for cookie in new_cookies:
-            session.cookies.set(cookie['name'], cookie['value'])
-        
-        print("✅ Cookies refreshed and session updated. Resuming...")
-        consecutive_401s = 0
+    # Get new cookies
+    new_cookies = get_cookies()
+    
+    # Update the session in-place
+    session.cookies.clear()
+    for cookie in new_cookies:
+        session.cookies.set(cookie['name'], cookie['value'])
+    
+    print("✅ Cookies refreshed and session updated. Resuming...")
 
 def flatten_dict(d, parent_key='', sep='_'):
     """Flattens a nested dictionary."""
@@ -108,78 +147,375 @@ def flatten_dict(d, parent_key='', sep='_'):
             items.append((new_key, v))
     return dict(items)
 
-def run_ffprobe(session, url, size_mb=None):
+def pipe_chunks_to_ffprobe(chunks):
+    """
+    Feeds byte chunks into a running ffprobe process as they arrive.
+    Stops pulling from `chunks` as soon as ffprobe exits, so the caller can drop
+    the rest of the download. Only one chunk is held in memory at a time.
+
+    Returns:
+        (returncode, stdout, stderr, bytes_sent)
+    """
+    # ffprobe output goes to temp files so a full stdout pipe can never block our writes
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        proc = subprocess.Popen(FFPROBE_COMMAND, stdin=subprocess.PIPE, stdout=out, stderr=err)
+        bytes_sent = 0
+        try:
+            for chunk in chunks:
+                if proc.poll() is not None:
+                    break  # ffprobe has everything it needs
+                if not chunk:
+                    continue
+                try:
+                    proc.stdin.write(chunk)
+                except (BrokenPipeError, OSError):
+                    break  # ffprobe exited while we were writing
+                bytes_sent += len(chunk)
+        finally:
+            try:
+                proc.stdin.close()
+            except (BrokenPipeError, OSError):
+                pass
+            try:
+                proc.wait(timeout=FFPROBE_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+                raise
+        out.seek(0)
+        err.seek(0)
+        return proc.returncode, out.read(), err.read(), bytes_sent
+
+def parse_ffprobe_output(returncode, stdout, stderr, validation_method):
+    """Turns raw ffprobe JSON output into a flattened metadata row."""
+    if returncode != 0:
+        return {'is_valid': False, 'error': f'ffprobe_error: {stderr.decode(errors="replace")[:200]}'}
+
+    return probe_data_to_metadata(json.loads(stdout), validation_method)
+
+def probe_data_to_metadata(data, validation_method):
+    """Flattens ffprobe-shaped JSON ({'format': ..., 'streams': [...]}) into a metadata row."""
+    if not data.get('streams'):
+        return {'is_valid': False, 'error': 'no_media_streams'}
+
+    metadata = {'is_valid': True, 'validation_method': validation_method}
+
+    if 'format' in data:
+        metadata.update(flatten_dict(data['format'], parent_key='format'))
+        # Ensure a top-level size column for easy access
+        metadata['file_size_bytes'] = data['format'].get('size')
+
+    for i, stream in enumerate(data.get('streams', [])):
+        codec_type = stream.get('codec_type', 'unknown')
+        metadata.update(flatten_dict(stream, parent_key=f'stream_{i}_{codec_type}'))
+
+    return metadata
+
+def iter_file_chunks(f, start, end):
+    """Yields bytes [start, end) from a seekable file in STREAM_CHUNK_SIZE pieces."""
+    pos = start
+    while pos < end:
+        f.seek(pos)
+        chunk = f.read(min(STREAM_CHUNK_SIZE, end - pos))
+        if not chunk:
+            break
+        pos += len(chunk)
+        yield chunk
+
+def slice_chunks(chunks, skip, limit):
+    """Drops the first `skip` bytes of a chunk stream and stops after `limit` bytes."""
+    for chunk in chunks:
+        if skip:
+            if len(chunk) <= skip:
+                skip -= len(chunk)
+                continue
+            chunk = chunk[skip:]
+            skip = 0
+        if len(chunk) >= limit:
+            yield chunk[:limit]
+            return
+        limit -= len(chunk)
+        yield chunk
+
+def tee_chunks_to_file(chunks, f):
+    """Appends every chunk to `f` on its way through, so the bytes can be reused later."""
+    for chunk in chunks:
+        f.seek(0, os.SEEK_END)
+        f.write(chunk)
+        yield chunk
+
+def authorized_get(session, url, headers):
+    """
+    Streaming GET with retry logic for 401/403 errors.
+    Waits at AUTH_GATE while cookies are being refreshed (after ERROR_THRESHOLD
+    consecutive auth errors) and returns the first response that isn't an auth
+    failure, or the last auth failure once AUTH_GATE gives up on the request.
+    """
+    attempt = 0
+    while True:
+        generation = AUTH_GATE.wait()
+        # Paced by the shared adaptive governor instead of a fixed random sleep
+        RateGovernor.governor.acquire()
+        started = time.monotonic()
+        try:
+            response = session.get(url, headers=headers, stream=True, timeout=60)
+        except requests.exceptions.RequestException:
+            RateGovernor.governor.record(None)
+            raise
+        RateGovernor.governor.record(response.status_code, time.monotonic() - started,
+                                     RateGovernor.parse_retry_after(response.headers))
+
+        if response.status_code in [401, 403]:
+            response.close()
+            attempt += 1
+            if AUTH_GATE.failure(generation, attempt):
+                continue # Retry this request (the governor has already slowed down)
+            return response # No refresh to wait for - the caller's raise_for_status() reports it
+
+        AUTH_GATE.success(generation)
+        return response
+
+def iter_url_range(session, url, start, end, info=None):
+    """
+    Yields the bytes of the inclusive range [start, end], stopping early at end of file.
+    Segments already in RANGE_CACHE are read from disk; only the gaps go to the
+    network, and downloaded chunks are written through to the cache.
+
+    Args:
+        info: Optional dict; 'total_size' is set in it when the file size is learned
+    """
+    if info is None:
+        info = {}
+    if RANGE_CACHE is not None:
+        total_size = RANGE_CACHE.total_size(url)
+        if total_size is not None:
+            info['total_size'] = total_size
+            end = min(end, total_size - 1)
+        segments = RANGE_CACHE.plan(url, start, end + 1)
+    else:
+        segments = [(start, end + 1, False)]
+
+    for seg_start, seg_end, is_cached in segments:
+        if is_cached:
+            try:
+                cached_chunks = RANGE_CACHE.read_chunks(url, seg_start, seg_end, STREAM_CHUNK_SIZE)
+            except OSError:
+                cached_chunks = None # Evicted since plan() - download it instead
+            if cached_chunks is not None:
+                yield from cached_chunks
+                continue
+
+        response = authorized_get(session, url, {'Range': f'bytes={seg_start}-{seg_end - 1}'})
+        try:
+            total_size = Transport.response_total_size(response.status_code, response.headers)
+            if total_size is not None:
+                info['total_size'] = total_size
+                if RANGE_CACHE is not None:
+                    RANGE_CACHE.set_total_size(url, total_size)
+            if response.status_code == 416:
+                return # Range starts past the end of the file
+            response.raise_for_status()
+
+            # A plain 200 means the server ignored Range and is sending from byte 0
+            skip = seg_start if response.status_code == 200 else 0
+            offset = seg_start
+            for chunk in slice_chunks(response.iter_content(chunk_size=STREAM_CHUNK_SIZE), skip, seg_end - seg_start):
+                if RANGE_CACHE is not None:
+                    RANGE_CACHE.write(url, offset, chunk)
+                offset += len(chunk)
+                yield chunk
+            if offset < seg_end:
+                return # File ended inside this segment
+        finally:
+            # Closing drops whatever is left of the range once the consumer is done
+            response.close()
+
+def fetch_range(session, url, start, end):
+    """
+    Downloads the inclusive byte range [start, end] (through the range cache if enabled).
+
+    Returns:
+        (data, total_size) - data is empty past the end of the file,
+        total_size is None when the server doesn't report it.
+    """
+    info = {}
+    data = b''.join(iter_url_range(session, url, start, end, info))
+    return data, info.get('total_size')
+
+def run_ffprobe(session, url, size_mb=None, prefix=None):
     """
     Core ffprobe logic. Downloads specified MB chunk and runs ffprobe.
-    Includes retry logic for 401/403 errors.
+    401/403 retries are handled by authorized_get.
+
+    With STREAM_TO_FFPROBE enabled the bytes are piped into ffprobe chunk by
+    chunk and the download is abandoned as soon as ffprobe finishes, so memory
+    per worker stays at one chunk instead of the whole range. With the range
+    cache enabled only the parts of the range it is missing are downloaded.
     
     Args:
         session: Authenticated requests session
         url: URL to probe
         size_mb: Size in MB to download (None uses PROBE_SIZE_MB for backward compat)
+        prefix: Optional seekable file holding bytes already downloaded from the
+            start of the file. Only the missing range is requested, the combined
+            bytes are probed, and the new bytes are appended to it for the next call.
     """
-    global consecutive_401s
-    
     if size_mb is None:
         size_mb = PROBE_SIZE_MB
+
+    range_end = size_mb * 1024 * 1024
     
-    while True:
-        if RANDOM_SLEEP:
-            time.sleep(random.uniform(0.5, 1.5))
+    try:
+        range_start = 0
+        if prefix is not None:
+            prefix.seek(0, os.SEEK_END)
+            range_start = min(prefix.tell(), range_end + 1)
 
+        # Download specified chunk size via authenticated session (only the part we don't have yet)
+        download = iter_url_range(session, url, range_start, range_end)
         try:
-            # Download specified chunk size via authenticated session
-            headers = {'Range': f'bytes=0-{size_mb * 1024 * 1024}'}
-            
-            response = session.get(url, headers=headers, stream=True, timeout=60)
-            
-            if response.status_code in [401, 403]:
-                consecutive_401s += 1
-                if consecutive_401s >= ERROR_THRESHOLD:
-                    refresh_cookies_and_session(session)
-                else:
-                    # Small delay before retry
-                    time.sleep(random.uniform(1, 3))
-                continue # Retry this request
+            body = download
+            if prefix is not None:
+                body = tee_chunks_to_file(body, prefix)
 
-            response.raise_for_status()
-            consecutive_401s = 0 # Reset on success
-            
-            content_to_probe = response.content
-            if not content_to_probe:
-                return {'is_valid': False, 'error': 'empty_response_body'}
-
-            command = [
-                'ffprobe', '-v', 'quiet', '-print_format', 'json',
-                '-show_streams', '-show_format', '-'
-            ]
-            result = subprocess.run(command, input=content_to_probe, capture_output=True, timeout=60)
-            
-            if result.returncode != 0:
-                return {'is_valid': False, 'error': f'ffprobe_error: {result.stderr.decode()[:200]}'}
+            if STREAM_TO_FFPROBE:
+                chunks = body
+                if range_start:
+                    chunks = itertools.chain(iter_file_chunks(prefix, 0, range_start), body)
+                returncode, stdout, stderr, bytes_sent = pipe_chunks_to_ffprobe(chunks)
+                if not bytes_sent:
+                    return {'is_valid': False, 'error': 'empty_response_body'}
+            else:
+                content_to_probe = b''.join(body)
+                if range_start:
+                    content_to_probe = b''.join(iter_file_chunks(prefix, 0, range_start)) + content_to_probe
+                if not content_to_probe:
+                    return {'is_valid': False, 'error': 'empty_response_body'}
+                result = subprocess.run(FFPROBE_COMMAND, input=content_to_probe, capture_output=True, timeout=FFPROBE_TIMEOUT)
+                returncode, stdout, stderr = result.returncode, result.stdout, result.stderr
+        finally:
+            download.close()
 
-            data = json.loads(result.stdout)
-            
-            if not data.get('streams'):
-                return {'is_valid': False, 'error': 'no_media_streams'}
+        return parse_ffprobe_output(returncode, stdout, stderr, f'{size_mb}MB_scan')
 
-            metadata = {'is_valid': True, 'validation_method': f'{size_mb}MB_scan'}
-            
-            if 'format' in data:
-                metadata.update(flatten_dict(data['format'], parent_key='format'))
-                # Ensure a top-level size column for easy access
-                metadata['file_size_bytes'] = data['format'].get('size')
-
-            for i, stream in enumerate(data.get('streams', [])):
-                codec_type = stream.get('codec_type', 'unknown')
-                metadata.update(flatten_dict(stream, parent_key=f'stream_{i}_{codec_type}'))
-                
-            return metadata
+    except requests.exceptions.RequestException as e:
+        return {'is_valid': False, 'error': f'http_error: {e}'}
+    except Exception as e:
+        return {'is_valid': False, 'error': f'general_error: {e}', 'url': url}
 
-        except requests.exceptions.RequestException as e:
-            return {'is_valid': False, 'error': f'http_error: {e}'}
-        except Exception as e:
-            return {'is_valid': False, 'error': f'general_error: {e}', 'url': url}
+def run_header_parse(session, url, prefix=None):
+    """
+    Fast path: fetches the first HEADER_PARSE_BYTES and parses the container
+    header in Python (see MediaHeaders), so common images, WAV/AIFF/MP3,
+    MP4/MOV with a leading moov and Matroska never spawn an ffprobe process.
+
+    Args:
+        session: Authenticated requests session
+        url: URL to probe
+        prefix: Optional empty two-pass prefix file; the head is saved to it
+
+    Returns:
+        Metadata dict, or None if the header isn't recognised (fall back to ffprobe).
+    """
+    try:
+        head, total_size = fetch_range(session, url, 0, HEADER_PARSE_BYTES - 1)
+    except requests.exceptions.RequestException as e:
+        return {'is_valid': False, 'error': f'http_error: {e}'}
+    if prefix is not None:
+        prefix.seek(0, os.SEEK_END)
+        if prefix.tell() == 0:
+            prefix.write(head)
+
+    data = MediaHeaders.parse_media_header(head, total_size)
+    if data is None:
+        return None
+    return probe_data_to_metadata(data, 'header_parse')
+
+def parse_moov_bytes(head, moov_offset, moov_end, missing, total_size):
+    """Tries the pure-Python moov parser on head + the fetched moov bytes. Returns a metadata row or None."""
+    if moov_end <= len(head):
+        moov_bytes = head[moov_offset:moov_end]
+    elif moov_offset >= len(head):
+        moov_bytes = missing
+    else:
+        moov_bytes = head[moov_offset:] + missing
+    data = MediaHeaders.parse_moov(moov_bytes, total_size, MediaHeaders.ftyp_box(head))
+    if data is None:
+        return None
+    return probe_data_to_metadata(data, 'moov_header_parse')
+
+def run_moov_probe(session, url, prefix=None):
+    """
+    Tail-aware probe for ISO-BMFF (MP4/MOV/...) files whose moov box sits after mdat.
+    Walks the top-level box headers from the first MOOV_HEAD_BYTES, range-fetches
+    just the moov box, and runs ffprobe on a sparse file holding head + moov.
+
+    Args:
+        session: Authenticated requests session
+        url: URL to probe
+        prefix: Optional two-pass prefix file; the head is read from / saved to it
+
+    Returns:
+        Metadata dict, or None if the file isn't ISO-BMFF or moov couldn't be
+        located (the caller should fall back to head-only scans).
+    """
+    try:
+        head, total_size = b'', None
+        if prefix is not None:
+            prefix.seek(0, os.SEEK_END)
+            if prefix.tell() >= MOOV_HEAD_BYTES:
+                head = b''.join(iter_file_chunks(prefix, 0, MOOV_HEAD_BYTES))
+        if not head:
+            head, total_size = fetch_range(session, url, 0, MOOV_HEAD_BYTES - 1)
+            if prefix is not None and prefix.tell() == 0:
+                prefix.write(head)
+
+        if not IsoBmff.looks_like_iso_bmff(head):
+            return None
+
+        def fetch(offset, length):
+            nonlocal total_size
+            data, size = fetch_range(session, url, offset, offset + length - 1)
+            total_size = total_size or size
+            return data
+
+        if total_size is None:
+            # Head came from the prefix; a one-byte range gets us the total size
+            fetch(0, 1)
+
+        moov = IsoBmff.find_top_level_box(head, b'moov', fetch, total_size)
+        if moov is None:
+            return None
+        moov_offset, moov_size = moov
+        if moov_size is None or moov_size > MOOV_MAX_MB * 1024 * 1024:
+            return None
+
+        moov_end = moov_offset + moov_size
+        missing_start, missing = max(moov_offset, len(head)), b''
+        if moov_end > len(head):
+            missing = fetch(missing_start, moov_end - missing_start)
+        if HEADER_PARSE_FAST_PATH:
+            metadata = parse_moov_bytes(head, moov_offset, moov_end, missing, total_size)
+            if metadata is not None:
+                return metadata
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            sparse_path = os.path.join(tmp_dir, 'sparse' + os.path.splitext(url)[1].lower())
+            with open(sparse_path, 'wb') as sparse:
+                # Unwritten regions (mostly mdat) stay as holes on disk
+                sparse.truncate(max(total_size or 0, moov_end))
+                sparse.write(head)
+                if missing:
+                    sparse.seek(missing_start)
+                    sparse.write(missing)
+            result = subprocess.run(FFPROBE_COMMAND[:-1] + [sparse_path], capture_output=True, timeout=FFPROBE_TIMEOUT)
+
+        return parse_ffprobe_output(result.returncode, result.stdout, result.stderr, 'moov_scan')
+
+    except requests.exceptions.RequestException as e:
+        return {'is_valid': False, 'error': f'http_error: {e}'}
+    except Exception as e:
+        return {'is_valid': False, 'error': f'general_error: {e}', 'url': url}
 
 def validate_url_entry(url, session, scan_mode, custom_size_mb=None):
     """
@@ -195,24 +531,27 @@ def validate_url_entry(url, session, scan_mode, custom_size_mb=None):
     if 'no_media_yet' in url or 'pdf_or_not_found' in url:
         return {'is_valid': False, 'error': 'skipped_unsolved'}
 
-    if scan_mode == 'fast':
-        return run_ffprobe(session, url, size_mb=PROBE_SIZE_MB)
-    
-    elif scan_mode == 'full':
-        return run_ffprobe(session, url, size_mb=DEEP_SCAN_SIZE_MB)
-    
-    elif scan_mode == 'superdeep':
-        return run_ffprobe(session, url, size_mb=SUPERDEEP_SCAN_SIZE_MB)
-    
-    elif scan_mode == 'mandingo':
-        return run_ffprobe(session, url, size_mb=MANDINGO_DEEP_SCAN_SIZE_MB)
-    
-    elif scan_mode == 'custom':
-        if custom_size_mb is None:
-            return {'is_valid': False, 'error': 'custom_size_mb_required'}
-        return run_ffprobe(session, url, size_mb=custom_size_mb)
+    single_pass_sizes = {
+        'fast': PROBE_SIZE_MB,
+        'full': DEEP_SCAN_SIZE_MB,
+        'superdeep': SUPERDEEP_SCAN_SIZE_MB,
+        'mandingo': MANDINGO_DEEP_SCAN_SIZE_MB,
+        'custom': custom_size_mb,
+    }
+    if scan_mode == 'custom' and custom_size_mb is None:
+        return {'is_valid': False, 'error': 'custom_size_mb_required'}
+
+    if scan_mode in single_pass_sizes:
+        # The head fetched for the header parse is kept, so ffprobe's range only requests the rest
+        with tempfile.SpooledTemporaryFile(max_size=PROBE_SIZE_MB * 1024 * 1024) as prefix:
+            # Common formats are answered from their header without ffprobe
+            if HEADER_PARSE_FAST_PATH:
+                result = run_header_parse(session, url, prefix=prefix)
+                if result is not None:
+                    return result
+            return run_ffprobe(session, url, size_mb=single_pass_sizes[scan_mode], prefix=prefix)
 
-    elif scan_mode == 'two-pass':
+    if scan_mode == 'two-pass':
         # Auto-escalate through all scan levels: 5MB → 100MB → 200MB → 500MB
         scan_levels = [
             (PROBE_SIZE_MB, "Fast"),
@@ -222,52 +561,484 @@ def validate_url_entry(url, session, scan_mode, custom_size_mb=None):
         ]
         
         last_error = None
-        for idx, (size_mb, level_name) in enumerate(scan_levels):
-            result = run_ffprobe(session, url, size_mb=size_mb)
-            
-            if result.get('is_valid'):
-                if size_mb > PROBE_SIZE_MB:
-                    print(f"  ✅ {level_name} scan ({size_mb}MB) succeeded for {os.path.basename(url)}")
-                return result
-            
-            # Store error for potential return
-            last_error = result.get('error', 'unknown_error')
-            
-            # If we got streams but validation failed for other reasons, don't escalate
-            if "no_media_streams" not in last_error:
-                return result
-            
-            # Continue to next level if no streams found and more levels available
-            if idx < len(scan_levels) - 1:
-                next_size, next_name = scan_levels[idx + 1]
-                print(f"  ⬆️  Escalating to {next_name} scan ({next_size}MB) for {os.path.basename(url)}...")
+        # Bytes fetched by earlier levels are kept here (spilling to disk past the
+        # fast-scan size) so each escalation only downloads the missing range
+        with tempfile.SpooledTemporaryFile(max_size=PROBE_SIZE_MB * 1024 * 1024) as prefix:
+            if HEADER_PARSE_FAST_PATH:
+                result = run_header_parse(session, url, prefix=prefix)
+                if result is not None:
+                    return result
+
+            # MP4/MOV: go straight for the moov box instead of escalating blindly
+            if MOOV_AWARE_PROBING and os.path.splitext(url)[1].lower() in IsoBmff.ISO_BMFF_EXTENSIONS:
+                result = run_moov_probe(session, url, prefix=prefix)
+                if result is not None:
+                    return result
+
+            for idx, (size_mb, level_name) in enumerate(scan_levels):
+                result = run_ffprobe(session, url, size_mb=size_mb, prefix=prefix)
+                
+                if result.get('is_valid'):
+                    if size_mb > PROBE_SIZE_MB:
+                        print(f"  ✅ {level_name} scan ({size_mb}MB) succeeded for {os.path.basename(url)}")
+                    return result
+                
+                # Store error for potential return
+                last_error = result.get('error', 'unknown_error')
+                
+                # If we got streams but validation failed for other reasons, don't escalate
+                if "no_media_streams" not in last_error:
+                    return result
+                
+                # Continue to next level if no streams found and more levels available
+                if idx < len(scan_levels) - 1:
+                    next_size, next_name = scan_levels[idx + 1]
+                    print(f"  ⬆️  Escalating to {next_name} scan ({next_size}MB) for {os.path.basename(url)}...")
         
         # All levels failed
         return {'is_valid': False, 'error': f'all_scan_levels_failed: {last_error}'}
     
     return {'is_valid': False, 'error': 'invalid_scan_mode'}
 
+# --- Staged pipeline: download threads feed an ffprobe process pool ---
+
+def scan_levels_for(scan_mode, custom_size_mb=None):
+    """[(size_mb, level_name), ...] a scan mode works through; one level for single-pass modes."""
+    if scan_mode == 'two-pass':
+        return [
+            (PROBE_SIZE_MB, "Fast"),
+            (DEEP_SCAN_SIZE_MB, "Deep"),
+            (SUPERDEEP_SCAN_SIZE_MB, "Superdeep"),
+            (MANDINGO_DEEP_SCAN_SIZE_MB, "Mandingo Deep")
+        ]
+    sizes = {
+        'fast': PROBE_SIZE_MB,
+        'full': DEEP_SCAN_SIZE_MB,
+        'superdeep': SUPERDEEP_SCAN_SIZE_MB,
+        'mandingo': MANDINGO_DEEP_SCAN_SIZE_MB,
+        'custom': custom_size_mb,
+    }
+    return [(sizes.get(scan_mode), scan_mode)]
+
+def download_stage(url, session, scan_mode, size_mb, first_pass, buffer_path):
+    """
+    Download stage (runs on a download thread). Fills buffer_path with the first
+    size_mb MB of the file, requesting only what the buffer doesn't hold yet.
+    On the first pass the header fast path and the moov probe get a chance to
+    finish the URL without ffprobe.
+
+    Returns:
+        (metadata, None) when the URL is finished, or (None, size_mb) when the
+        buffer is ready for the probe stage.
+    """
+    if 'no_media_yet' in url or 'pdf_or_not_found' in url:
+        return {'is_valid': False, 'error': 'skipped_unsolved'}, None
+    if size_mb is None:
+        error = 'custom_size_mb_required' if scan_mode == 'custom' else 'invalid_scan_mode'
+        return {'is_valid': False, 'error': error}, None
+
+    try:
+        with open(buffer_path, 'r+b') as buffer:
+            if first_pass:
+                if HEADER_PARSE_FAST_PATH:
+                    result = run_header_parse(session, url, prefix=buffer)
+                    if result is not None:
+                        return result, None
+                if scan_mode == 'two-pass' and MOOV_AWARE_PROBING \
+                        and os.path.splitext(url)[1].lower() in IsoBmff.ISO_BMFF_EXTENSIONS:
+                    result = run_moov_probe(session, url, prefix=buffer)
+                    if result is not None:
+                        return result, None
+
+            range_end = size_mb * 1024 * 1024
+            buffer.seek(0, os.SEEK_END)
+            range_start = min(buffer.tell(), range_end + 1)
+            for chunk in iter_url_range(session, url, range_start, range_end):
+                buffer.write(chunk)
+            if buffer.tell() == 0:
+                return {'is_valid': False, 'error': 'empty_response_body'}, None
+        return None, size_mb
+
+    except requests.exceptions.RequestException as e:
+        return {'is_valid': False, 'error': f'http_error: {e}'}, None
+    except Exception as e:
+        return {'is_valid': False, 'error': f'general_error: {e}', 'url': url}, None
+
+def probe_stage(buffer_path, validation_method):
+    """Probe stage (runs in a worker process): ffprobe on a buffer file, then JSON parsing and flattening."""
+    try:
+        with open(buffer_path, 'rb') as buffer:
+            result = subprocess.run(FFPROBE_COMMAND, stdin=buffer, capture_output=True, timeout=FFPROBE_TIMEOUT)
+        return parse_ffprobe_output(result.returncode, result.stdout, result.stderr, validation_method)
+    except Exception as e:
+        return {'is_valid': False, 'error': f'general_error: {e}'}
+
+def run_staged_pipeline(rows, session, scan_mode, custom_size_mb, on_result):
+    """
+    Validates rows with decoupled download and probe stages and calls
+    on_result(row, metadata) as each URL finishes.
+
+    MAX_WORKERS download threads fill one buffer file per URL; FFPROBE_CONCURRENCY
+    processes run ffprobe and parse/flatten its output outside this process's GIL.
+    New URLs are only admitted while fewer than PIPELINE_QUEUE_DEPTH buffers wait
+    for a probe process, so a slow stage holds the other back instead of piling up
+    buffers. Smart mode escalations re-enter the download stage with the same
+    buffer and only fetch the missing range; they wait for a free download
+    thread like new URLs do (ahead of them), so at most MAX_WORKERS downloads
+    are ever under way.
+    """
+    levels = scan_levels_for(scan_mode, custom_size_mb)
+    events = queue.Queue()
+    waiting = collections.deque()  # Buffers ready for the probe stage
+    escalating = collections.deque()  # Buffers waiting for a download thread to fetch their next level
+    counts = {'downloading': 0, 'probing': 0}
+    remaining = iter(rows)
+    buffer_ids = itertools.count()
+
+    # spawn: forking a process that already runs download threads can deadlock
+    probe_context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory(prefix='metadata_buffers_') as buffer_dir, \
+            ThreadPoolExecutor(max_workers=MAX_WORKERS) as downloads, \
+            ProcessPoolExecutor(max_workers=FFPROBE_CONCURRENCY, mp_context=probe_context) as probes:
+
+        def start_download(row, level, buffer_path):
+            counts['downloading'] += 1
+            future = downloads.submit(download_stage, row['actual_url'], session, scan_mode,
+                                      levels[level][0], level == 0, buffer_path)
+            future.add_done_callback(lambda f: events.put(('downloaded', row, level, buffer_path, f)))
+
+        def start_probe(row, level, buffer_path):
+            counts['probing'] += 1
+            future = probes.submit(probe_stage, buffer_path, f'{levels[level][0]}MB_scan')
+            future.add_done_callback(lambda f: events.put(('probed', row, level, buffer_path, f)))
+
+        def finish(row, buffer_path, metadata):
+            os.remove(buffer_path)
+            on_result(row, metadata)
+
+        while True:
+            # Escalations first: they already hold a buffer, and share the download threads with new URLs
+            while escalating and counts['downloading'] < MAX_WORKERS:
+                start_download(*escalating.popleft())
+            # Admit new URLs while download threads are free and the probe queue has room
+            while counts['downloading'] < MAX_WORKERS and len(waiting) < PIPELINE_QUEUE_DEPTH:
+                row = next(remaining, None)
+                if row is None:
+                    break
+                buffer_path = os.path.join(buffer_dir, f'{next(buffer_ids)}.bin')
+                open(buffer_path, 'wb').close()
+                start_download(row, 0, buffer_path)
+            while waiting and counts['probing'] < FFPROBE_CONCURRENCY:
+                start_probe(*waiting.popleft())
+            if not (counts['downloading'] or counts['probing'] or waiting or escalating):
+                return
+
+            kind, row, level, buffer_path, future = events.get()
+            url = row['actual_url']
+            if kind == 'downloaded':
+                counts['downloading'] -= 1
+                metadata, _ = future.result()
+                if metadata is not None:
+                    finish(row, buffer_path, metadata)
+                else:
+                    waiting.append((row, level, buffer_path))
+                continue
+
+            counts['probing'] -= 1
+            try:
+                metadata = future.result()
+            except Exception as e:  # e.g. a probe process died
+                metadata = {'is_valid': False, 'error': f'general_error: {e}'}
+
+            if scan_mode != 'two-pass':
+                finish(row, buffer_path, metadata)
+            elif metadata.get('is_valid'):
+                size_mb, level_name = levels[level]
+                if size_mb > PROBE_SIZE_MB:
+                    print(f"  ✅ {level_name} scan ({size_mb}MB) succeeded for {os.path.basename(url)}")
+                finish(row, buffer_path, metadata)
+            elif "no_media_streams" not in metadata.get('error', 'unknown_error'):
+                finish(row, buffer_path, metadata)
+            elif level + 1 < len(levels):
+                next_size, next_name = levels[level + 1]
+                print(f"  ⬆️  Escalating to {next_name} scan ({next_size}MB) for {os.path.basename(url)}...")
+                escalating.append((row, level + 1, buffer_path))
+            else:
+                finish(row, buffer_path, {'is_valid': False, 'error': f"all_scan_levels_failed: {metadata.get('error')}"})
+
+# --- asyncio engine counterparts (same rows as the threaded functions above) ---
+
+async def aslice_chunks(chunks, skip, limit):
+    """Async version of slice_chunks."""
+    async for chunk in chunks:
+        if skip:
+            if len(chunk) <= skip:
+                skip -= len(chunk)
+                continue
+            chunk = chunk[skip:]
+            skip = 0
+        if len(chunk) >= limit:
+            yield chunk[:limit]
+            return
+        limit -= len(chunk)
+        yield chunk
+
+async def async_iter_url_range(engine, url, start, end, info=None):
+    """Async version of iter_url_range: cached segments from disk, gaps over the network."""
+    if info is None:
+        info = {}
+    if RANGE_CACHE is not None:
+        total_size = RANGE_CACHE.total_size(url)
+        if total_size is not None:
+            info['total_size'] = total_size
+            end = min(end, total_size - 1)
+        segments = RANGE_CACHE.plan(url, start, end + 1)
+    else:
+        segments = [(start, end + 1, False)]
+
+    for seg_start, seg_end, is_cached in segments:
+        if is_cached:
+            try:
+                cached_chunks = RANGE_CACHE.read_chunks(url, seg_start, seg_end, STREAM_CHUNK_SIZE)
+            except OSError:
+                cached_chunks = None # Evicted since plan() - download it instead
+            if cached_chunks is not None:
+                for chunk in cached_chunks:
+                    yield chunk
+                continue
+
+        async with engine.request('GET', url, headers={'Range': f'bytes={seg_start}-{seg_end - 1}'}) as response:
+            total_size = Transport.response_total_size(response.status, response.headers)
+            if total_size is not None:
+                info['total_size'] = total_size
+                if RANGE_CACHE is not None:
+                    RANGE_CACHE.set_total_size(url, total_size)
+            if response.status == 416:
+                return # Range starts past the end of the file
+            response.raise_for_status()
+
+            # A plain 200 means the server ignored Range and is sending from byte 0
+            skip = seg_start if response.status == 200 else 0
+            offset = seg_start
+            async for chunk in aslice_chunks(response.content.iter_chunked(STREAM_CHUNK_SIZE), skip, seg_end - seg_start):
+                if RANGE_CACHE is not None:
+                    RANGE_CACHE.write(url, offset, chunk)
+                offset += len(chunk)
+                yield chunk
+            if offset < seg_end:
+                return # File ended inside this segment
+
+async def async_fetch_range(engine, url, start, end):
+    """Async version of fetch_range. Returns (data, total_size)."""
+    info = {}
+    data = b''.join([chunk async for chunk in async_iter_url_range(engine, url, start, end, info)])
+    return data, info.get('total_size')
+
+async def async_run_ffprobe(engine, url, size_mb=None, prefix=None):
+    """
+    Async version of run_ffprobe. The range is spooled (into `prefix` when given)
+    while it downloads and fed to ffprobe as soon as an ffprobe slot is free;
+    the download is cancelled once ffprobe is done.
+    """
+    if size_mb is None:
+        size_mb = PROBE_SIZE_MB
+
+    range_end = size_mb * 1024 * 1024
+
+    try:
+        range_start = 0
+        if prefix is not None:
+            prefix.seek(0, os.SEEK_END)
+            range_start = min(prefix.tell(), range_end + 1)
+
+        download = async_iter_url_range(engine, url, range_start, range_end)
+        returncode, stdout, stderr, bytes_sent = await engine.probe_download(download, FFPROBE_COMMAND, spool=prefix)
+        if not bytes_sent:
+            return {'is_valid': False, 'error': 'empty_response_body'}
+
+        return parse_ffprobe_output(returncode, stdout, stderr, f'{size_mb}MB_scan')
+
+    except (AsyncEngine.aiohttp.ClientError, asyncio.TimeoutError) as e:
+        return {'is_valid': False, 'error': f'http_error: {e}'}
+    except Exception as e:
+        return {'is_valid': False, 'error': f'general_error: {e}', 'url': url}
+
+async def async_run_header_parse(engine, url, prefix=None):
+    """Async version of run_header_parse. Returns None when the header isn't recognised."""
+    try:
+        head, total_size = await async_fetch_range(engine, url, 0, HEADER_PARSE_BYTES - 1)
+    except (AsyncEngine.aiohttp.ClientError, asyncio.TimeoutError) as e:
+        return {'is_valid': False, 'error': f'http_error: {e}'}
+    if prefix is not None:
+        prefix.seek(0, os.SEEK_END)
+        if prefix.tell() == 0:
+            prefix.write(head)
+
+    data = MediaHeaders.parse_media_header(head, total_size)
+    if data is None:
+        return None
+    return probe_data_to_metadata(data, 'header_parse')
+
+async def async_run_moov_probe(engine, url, prefix=None):
+    """Async version of run_moov_probe. Returns None when the file isn't ISO-BMFF or moov isn't found."""
+    try:
+        head, total_size = b'', None
+        if prefix is not None:
+            prefix.seek(0, os.SEEK_END)
+            if prefix.tell() >= MOOV_HEAD_BYTES:
+                head = b''.join(iter_file_chunks(prefix, 0, MOOV_HEAD_BYTES))
+        if not head:
+            head, total_size = await async_fetch_range(engine, url, 0, MOOV_HEAD_BYTES - 1)
+            if prefix is not None and prefix.tell() == 0:
+                prefix.write(head)
+
+        if not IsoBmff.looks_like_iso_bmff(head):
+            return None
+
+        async def fetch(offset, length):
+            nonlocal total_size
+            data, size = await async_fetch_range(engine, url, offset, offset + length - 1)
+            total_size = total_size or size
+            return data
+
+        if total_size is None:
+            # Head came from the prefix; a one-byte range gets us the total size
+            await fetch(0, 1)
+
+        moov = await IsoBmff.async_find_top_level_box(head, b'moov', fetch, total_size)
+        if moov is None:
+            return None
+        moov_offset, moov_size = moov
+        if moov_size is None or moov_size > MOOV_MAX_MB * 1024 * 1024:
+            return None
+
+        moov_end = moov_offset + moov_size
+        missing_start, missing = max(moov_offset, len(head)), b''
+        if moov_end > len(head):
+            missing = await fetch(missing_start, moov_end - missing_start)
+        if HEADER_PARSE_FAST_PATH:
+            metadata = parse_moov_bytes(head, moov_offset, moov_end, missing, total_size)
+            if metadata is not None:
+                return metadata
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            sparse_path = os.path.join(tmp_dir, 'sparse' + os.path.splitext(url)[1].lower())
+            with open(sparse_path, 'wb') as sparse:
+                # Unwritten regions (mostly mdat) stay as holes on disk
+                sparse.truncate(max(total_size or 0, moov_end))
+                sparse.write(head)
+                if missing:
+                    sparse.seek(missing_start)
+                    sparse.write(missing)
+            returncode, stdout, stderr = await engine.run_ffprobe_file(FFPROBE_COMMAND[:-1] + [sparse_path])
+
+        return parse_ffprobe_output(returncode, stdout, stderr, 'moov_scan')
+
+    except (AsyncEngine.aiohttp.ClientError, asyncio.TimeoutError) as e:
+        return {'is_valid': False, 'error': f'http_error: {e}'}
+    except Exception as e:
+        return {'is_valid': False, 'error': f'general_error: {e}', 'url': url}
+
+async def async_validate_url_entry(url, engine, scan_mode, custom_size_mb=None):
+    """Async version of validate_url_entry; produces the same rows for every scan mode."""
+    if 'no_media_yet' in url or 'pdf_or_not_found' in url:
+        return {'is_valid': False, 'error': 'skipped_unsolved'}
+
+    single_pass_sizes = {
+        'fast': PROBE_SIZE_MB,
+        'full': DEEP_SCAN_SIZE_MB,
+        'superdeep': SUPERDEEP_SCAN_SIZE_MB,
+        'mandingo': MANDINGO_DEEP_SCAN_SIZE_MB,
+        'custom': custom_size_mb,
+    }
+    if scan_mode == 'custom' and custom_size_mb is None:
+        return {'is_valid': False, 'error': 'custom_size_mb_required'}
+    if scan_mode in single_pass_sizes:
+        # The head fetched for the header parse is kept, so ffprobe's range only requests the rest
+        with tempfile.SpooledTemporaryFile(max_size=PROBE_SIZE_MB * 1024 * 1024) as prefix:
+            if HEADER_PARSE_FAST_PATH:
+                result = await async_run_header_parse(engine, url, prefix=prefix)
+                if result is not None:
+                    return result
+            return await async_run_ffprobe(engine, url, size_mb=single_pass_sizes[scan_mode], prefix=prefix)
+
+    if scan_mode == 'two-pass':
+        scan_levels = [
+            (PROBE_SIZE_MB, "Fast"),
+            (DEEP_SCAN_SIZE_MB, "Deep"),
+            (SUPERDEEP_SCAN_SIZE_MB, "Superdeep"),
+            (MANDINGO_DEEP_SCAN_SIZE_MB, "Mandingo Deep")
+        ]
+
+        last_error = None
+        with tempfile.SpooledTemporaryFile(max_size=PROBE_SIZE_MB * 1024 * 1024) as prefix:
+            if HEADER_PARSE_FAST_PATH:
+                result = await async_run_header_parse(engine, url, prefix=prefix)
+                if result is not None:
+                    return result
+
+            if MOOV_AWARE_PROBING and os.path.splitext(url)[1].lower() in IsoBmff.ISO_BMFF_EXTENSIONS:
+                result = await async_run_moov_probe(engine, url, prefix=prefix)
+                if result is not None:
+                    return result
+
+            for idx, (size_mb, level_name) in enumerate(scan_levels):
+                result = await async_run_ffprobe(engine, url, size_mb=size_mb, prefix=prefix)
+
+                if result.get('is_valid'):
+                    if size_mb > PROBE_SIZE_MB:
+                        print(f"  ✅ {level_name} scan ({size_mb}MB) succeeded for {os.path.basename(url)}")
+                    return result
+
+                last_error = result.get('error', 'unknown_error')
+                if "no_media_streams" not in last_error:
+                    return result
+
+                if idx < len(scan_levels) - 1:
+                    next_size, next_name = scan_levels[idx + 1]
+                    print(f"  ⬆️  Escalating to {next_name} scan ({next_size}MB) for {os.path.basename(url)}...")
+
+        return {'is_valid': False, 'error': f'all_scan_levels_failed: {last_error}'}
+
+    return {'is_valid': False, 'error': 'invalid_scan_mode'}
+
 def save_results_to_csv(results, file_path):
+    """Export step: writes the wide CSV (union of all metadata columns) from the results."""
     if not results:
         return
-        
-    # Dynamically generate all possible headers from the collected data
-    all_headers = set()
-    for res in results:
-        all_headers.update(res.keys())
-    
-    # Define a preferred order for key columns
-    preferred_order = ['original_url', 'actual_url', 'media_type', 'is_valid', 'validation_method', 'file_size_bytes', 'error']
-    sorted_headers = sorted(list(all_headers), key=lambda h: (preferred_order.index(h) if h in preferred_order else len(preferred_order), h))
+    ResultJournal.export_csv(results, file_path, preferred_order=PREFERRED_COLUMNS)
+    print(f"💾 Exported {len(results)} URLs to {file_path}")
 
-    with open(file_path, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=sorted_headers, extrasaction='ignore')
-        writer.writeheader()
-        writer.writerows(results)
-    print(f"💾 Progress saved for {len(results)} URLs to {file_path}")
+def export_results():
+    """Compacts the journal and exports the CSV (and Parquet if pyarrow is installed) without probing."""
+    if USE_PIPELINE_STORE:
+        if not os.path.exists(STORE_FILE):
+            print(f"❌ Error: {STORE_FILE} not found. Nothing to export.")
+            exit(1)
+        store = PipelineStore.PipelineStore(STORE_FILE)
+        rows = store.export_metadata_csv(OUTPUT_CSV, preferred_order=PREFERRED_COLUMNS)
+        store.close()
+        print(f"💾 Exported {len(rows)} URLs to {OUTPUT_CSV}")
+        if ResultJournal.pyarrow is not None and rows:
+            ResultJournal.export_parquet(rows, PARQUET_FILE)
+            print(f"💾 Exported typed columns to {PARQUET_FILE}")
+        return
+    if not os.path.exists(JOURNAL_FILE):
+        print(f"❌ Error: {JOURNAL_FILE} not found. Nothing to export.")
+        exit(1)
+    processed_urls = ResultJournal.load_journal(JOURNAL_FILE, 'actual_url')
+    journal = ResultJournal.ResultJournal(JOURNAL_FILE, fsync_every=SAVE_BATCH_SIZE)
+    journal.compact(processed_urls.values())
+    journal.close()
+    save_results_to_csv(list(processed_urls.values()), OUTPUT_CSV)
+    if ResultJournal.pyarrow is not None:
+        ResultJournal.export_parquet(list(processed_urls.values()), PARQUET_FILE)
+        print(f"💾 Exported typed columns to {PARQUET_FILE}")
 
 def main():
-    global MAX_WORKERS, RANDOM_SLEEP
+    global MAX_WORKERS, MAX_REQUEST_RATE, STREAM_TO_FFPROBE, RANGE_CACHE
+    global USE_ASYNC_ENGINE, NETWORK_CONCURRENCY, FFPROBE_CONCURRENCY
+    global USE_STAGED_PIPELINE, PIPELINE_QUEUE_DEPTH, USE_HTTP2
     if not is_ffmpeg_installed():
         exit(1)
 
@@ -287,24 +1058,158 @@ def main():
             MAX_WORKERS = user_max_workers
     except: pass
 
-    RANDOM_SLEEP = questionary.confirm(
-        "Enable random sleep between requests? (Helps avoid detection)",
+    if AsyncEngine.is_available():
+        USE_ASYNC_ENGINE = questionary.confirm(
+            "Use the asyncio engine? (Many requests in flight, ffprobe limited to CPU count)",
+            default=False
+        ).ask()
+    if USE_ASYNC_ENGINE:
+        concurrency_str = questionary.text(
+            f"Max network requests in flight [default: {NETWORK_CONCURRENCY}]:",
+            default=str(NETWORK_CONCURRENCY)
+        ).ask()
+        try:
+            if int(concurrency_str) >= 1:
+                NETWORK_CONCURRENCY = int(concurrency_str)
+        except (ValueError, TypeError): pass
+        ffprobe_str = questionary.text(
+            f"Max concurrent ffprobe processes [default: {FFPROBE_CONCURRENCY}]:",
+            default=str(FFPROBE_CONCURRENCY)
+        ).ask()
+        try:
+            if int(ffprobe_str) >= 1:
+                FFPROBE_CONCURRENCY = int(ffprobe_str)
+        except (ValueError, TypeError): pass
+    else:
+        USE_STAGED_PIPELINE = questionary.confirm(
+            "Decouple downloads from ffprobe? (Workers only download; a separate process pool runs ffprobe)",
+            default=False
+        ).ask()
+    if USE_STAGED_PIPELINE:
+        ffprobe_str = questionary.text(
+            f"Number of ffprobe processes [default: {FFPROBE_CONCURRENCY}]:",
+            default=str(FFPROBE_CONCURRENCY)
+        ).ask()
+        try:
+            if int(ffprobe_str) >= 1:
+                FFPROBE_CONCURRENCY = int(ffprobe_str)
+        except (ValueError, TypeError): pass
+        depth_str = questionary.text(
+            f"Max downloaded files waiting for ffprobe (caps buffer disk use) [default: {2 * FFPROBE_CONCURRENCY}]:",
+            default=str(2 * FFPROBE_CONCURRENCY)
+        ).ask()
+        try:
+            PIPELINE_QUEUE_DEPTH = max(1, int(depth_str))
+        except (ValueError, TypeError):
+            PIPELINE_QUEUE_DEPTH = 2 * FFPROBE_CONCURRENCY
+    if not USE_ASYNC_ENGINE and Transport.is_http2_available():
+        USE_HTTP2 = questionary.confirm(
+            "Use HTTP/2? (All workers share a few multiplexed connections instead of one each)",
+            default=USE_HTTP2
+        ).ask()
+
+    # --- Adaptive rate limit (replaces fixed random sleeps) ---
+    max_rate_str = questionary.text(
+        f"Max requests per second? (Starts at {INITIAL_REQUEST_RATE}/s, speeds up while the server is healthy, backs off on 401/403/429) [default: {MAX_REQUEST_RATE}]:",
+        default=str(MAX_REQUEST_RATE)
+    ).ask()
+    try:
+        if float(max_rate_str) > 0:
+            MAX_REQUEST_RATE = float(max_rate_str)
+    except (ValueError, TypeError): pass
+    RateGovernor.governor.configure(initial_rate=min(INITIAL_REQUEST_RATE, MAX_REQUEST_RATE), max_rate=MAX_REQUEST_RATE)
+
+    if not USE_STAGED_PIPELINE:
+        STREAM_TO_FFPROBE = questionary.confirm(
+            "Stream downloads straight into ffprobe? (Low memory, stops as soon as ffprobe is done)",
+            default=STREAM_TO_FFPROBE
+        ).ask()
+
+    use_range_cache = questionary.confirm(
+        f"Use the on-disk range cache in {RANGE_CACHE_DIR}/? (Reuses bytes from earlier runs/scans, max {RANGE_CACHE_MAX_GB}GB)",
         default=True
     ).ask()
+    if use_range_cache:
+        RANGE_CACHE = RangeCache(RANGE_CACHE_DIR, RANGE_CACHE_MAX_GB * 1024 * 1024 * 1024)
+        print(f"🗄️  Range cache: {len(RANGE_CACHE.entries)} files, {RANGE_CACHE.total_bytes / 1024 / 1024:.1f}MB cached")
 
     # --- Load existing results to support resume ---
     processed_urls = {}
-    if os.path.exists(OUTPUT_CSV):
-        print(f"📂 Loading existing results from: {OUTPUT_CSV}")
-        with open(OUTPUT_CSV, 'r', newline='', encoding='utf-8') as f:
+    store = None
+    journal = None
+    if USE_PIPELINE_STORE:
+        # Finds and results live in the shared store; resume is an indexed query per iteration
+        store = PipelineStore.open_store(STORE_FILE)
+        if store.find_count() == 0 and os.path.exists(INPUT_CSV):
+            print(f"📂 Seeded the store with {store.import_probe_csv(INPUT_CSV)} media finds from {INPUT_CSV}")
+        if sum(store.metadata_counts()) == 0 and os.path.exists(JOURNAL_FILE):
+            print(f"📂 Seeded the store with {store.import_journal(JOURNAL_FILE)} results from {JOURNAL_FILE}")
+        source_rows = store.media_rows()
+        if not source_rows:
+            print(f"❌ Error: no media finds in {STORE_FILE}. Please run probe.py first.")
+            exit(1)
+    else:
+        seed_journal = False
+        if os.path.exists(JOURNAL_FILE):
+            print(f"📂 Loading existing results from: {JOURNAL_FILE}")
+            processed_urls = ResultJournal.load_journal(JOURNAL_FILE, 'actual_url')
+        elif os.path.exists(OUTPUT_CSV):
+            # Older runs only have the CSV - carry it over into the journal once
+            print(f"📂 Loading existing results from: {OUTPUT_CSV}")
+            with open(OUTPUT_CSV, 'r', newline='', encoding='utf-8') as f:
+                reader = csv.DictReader(f)
+                for row in reader:
+                    if 'is_valid' in row:
+                        row['is_valid'] = (row['is_valid'] == 'True')
+                    processed_urls[row['actual_url']] = row
+            seed_journal = True
+
+        # Results are matched to the input by canonical URL (older runs saved the scraped spelling)
+        processed_urls = {CanonicalUrl.canonical_url(url): row for url, row in processed_urls.items()}
+        journal = ResultJournal.ResultJournal(JOURNAL_FILE, fsync_every=SAVE_BATCH_SIZE)
+        if seed_journal:
+            journal.compact(processed_urls.values())
+
+        # --- Read source URLs ---
+        if not os.path.exists(INPUT_CSV):
+            print(f"❌ Error: {INPUT_CSV} not found. Please run probe.py first.")
+            exit(1)
+
+        # One row per file: other spellings of an actual_url already listed are dropped
+        source_rows = {}
+        duplicates = 0
+        with open(INPUT_CSV, 'r', newline='', encoding='utf-8') as f:
             reader = csv.DictReader(f)
             for row in reader:
-                if 'is_valid' in row:
-                    row['is_valid'] = (row['is_valid'] == 'True')
-                processed_urls[row['actual_url']] = row
+                if row['media_type'] in ['no_media_yet', 'pdf_or_not_found']:
+                    continue
+                row['actual_url'] = CanonicalUrl.canonical_url(row['actual_url'])
+                if row['actual_url'] in source_rows:
+                    duplicates += 1
+                    continue
+                source_rows[row['actual_url']] = row
+        source_rows = list(source_rows.values())
+        if duplicates:
+            print(f"📂 Skipped {duplicates} duplicate media URLs (another spelling of a listed file) – {duplicates} downloads saved")
+
+    def result_counts():
+        """(valid, invalid) URLs validated so far."""
+        if store is not None:
+            return store.metadata_counts()
         valid_count = sum(1 for r in processed_urls.values() if r.get('is_valid'))
-        invalid_count = len(processed_urls) - valid_count
-        print(f"   Found {len(processed_urls)} URLs ({valid_count} valid, {invalid_count} invalid)")
+        return valid_count, len(processed_urls) - valid_count
+
+    valid_count, invalid_count = result_counts()
+    if valid_count + invalid_count:
+        print(f"   Found {valid_count + invalid_count} URLs ({valid_count} valid, {invalid_count} invalid)")
+
+    session = requests.Session()
+    session.headers.update({
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+    })
+    # One pooled connection per worker instead of requests' default of 10
+    Transport.configure_session(session, MAX_WORKERS, http2=USE_HTTP2)
+    AUTH_GATE.refresh = lambda: refresh_session_cookies(session)
 
     # --- Get authenticated cookies once at startup ---
     if not os.path.exists(COOKIES_FILE):
@@ -314,32 +1219,25 @@ def main():
         print(f"\n🔐 Loading saved cookies from {COOKIES_FILE}")
         with open(COOKIES_FILE, 'r') as f:
             cookies = json.load(f)
-        refresh = questionary.confirm(
-            "Refresh cookies? (Open browser to solve new challenges)",
-            default=False
-        ).ask()
+        for cookie in cookies:
+            session.cookies.set(cookie['name'], cookie['value'])
+        # One cheap request tells whether the browser step is needed at all
+        check_url = COOKIE_CHECK_URL or (source_rows[0]['actual_url'] if source_rows else None)
+        if check_url is None:
+            refresh = questionary.confirm(
+                "Refresh cookies? (Open browser to solve new challenges)",
+                default=False
+            ).ask()
+        else:
+            refresh = not check_cookies(session, check_url)
+            print("   Saved cookies were rejected - opening browser..." if refresh
+                  else "✅ Saved cookies still work - skipping the browser")
         if refresh:
             cookies = get_cookies()
     
-    session = requests.Session()
+    session.cookies.clear()
     for cookie in cookies:
         session.cookies.set(cookie['name'], cookie['value'])
-    session.headers.update({
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-    })
-
-    # --- Read source URLs ---
-    if not os.path.exists(INPUT_CSV):
-        print(f"❌ Error: {INPUT_CSV} not found. Please run probe.py first.")
-        exit(1)
-    
-    source_rows = []
-    with open(INPUT_CSV, 'r', newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if row['media_type'] in ['no_media_yet', 'pdf_or_not_found']:
-                continue
-            source_rows.append(row)
 
     # --- Iterative workflow loop ---
     iteration = 1
@@ -349,14 +1247,17 @@ def main():
         print(f"{'='*60}")
         
         # Build queue of URLs to validate
-        rows_to_validate = []
-        for row in source_rows:
-            url = row['actual_url']
-            if url not in processed_urls:
-                rows_to_validate.append(row)
+        if store is not None:
+            rows_to_validate = store.unvalidated_media()
+        else:
+            rows_to_validate = []
+            for row in source_rows:
+                url = row['actual_url']
+                if url not in processed_urls:
+                    rows_to_validate.append(row)
         
         if not rows_to_validate:
-            invalid_count = sum(1 for r in processed_urls.values() if not r.get('is_valid'))
+            invalid_count = result_counts()[1]
             if invalid_count == 0:
                 print("\n✅ All URLs have been validated successfully!")
                 break
@@ -371,10 +1272,13 @@ def main():
                 break
             
             # Add invalid URLs to queue
-            for row in source_rows:
-                url = row['actual_url']
-                if url in processed_urls and not processed_urls[url].get('is_valid'):
-                    rows_to_validate.append(row)
+            if store is not None:
+                rows_to_validate = store.invalid_media()
+            else:
+                for row in source_rows:
+                    url = row['actual_url']
+                    if url in processed_urls and not processed_urls[url].get('is_valid'):
+                        rows_to_validate.append(row)
         
         if not rows_to_validate:
             break
@@ -415,32 +1319,54 @@ def main():
         scan_mode_display = f"{scan_mode} ({custom_size_mb}MB)" if scan_mode == 'custom' else scan_mode
         print(f"\n🔍 Running '{scan_mode_display}' scan on {len(rows_to_validate)} URLs...")
 
-        # Process in parallel
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            future_to_row = {executor.submit(validate_url_entry, row['actual_url'], session, scan_mode, custom_size_mb): row 
-                            for row in rows_to_validate}
-            
-            for i, future in enumerate(as_completed(future_to_row)):
-                original_row = future_to_row[future]
-                url = original_row['actual_url']
-                metadata = future.result()
-                
-                full_row_data = {**original_row, **metadata}
+        completed = [0]
+        def record_result(original_row, metadata):
+            url = original_row['actual_url']
+            full_row_data = {**original_row, **metadata}
+            if store is not None:
+                store.put_metadata(full_row_data)
+            else:
                 processed_urls[url] = full_row_data
-                
-                is_valid_str = "✅" if metadata.get('is_valid') else "❌"
-                print(f"({i+1}/{len(rows_to_validate)}) {is_valid_str} {os.path.basename(url)}")
+                journal.append(full_row_data)
+            completed[0] += 1
+            
+            is_valid_str = "✅" if metadata.get('is_valid') else "❌"
+            print(f"({completed[0]}/{len(rows_to_validate)}) {is_valid_str} {os.path.basename(url)}")
 
-                if (i + 1) % SAVE_BATCH_SIZE == 0:
-                    save_results_to_csv(list(processed_urls.values()), OUTPUT_CSV)
+        if USE_ASYNC_ENGINE:
+            # One event loop: network and ffprobe concurrency are bounded separately
+            async def validate_row(engine, row):
+                return await async_validate_url_entry(row['actual_url'], engine, scan_mode, custom_size_mb)
 
-        # Final save
-        save_results_to_csv(list(processed_urls.values()), OUTPUT_CSV)
+            AsyncEngine.run_all(
+                rows_to_validate, validate_row, record_result, session,
+                network_concurrency=NETWORK_CONCURRENCY,
+                ffprobe_concurrency=FFPROBE_CONCURRENCY,
+                auth_gate=AUTH_GATE,
+                governor=RateGovernor.governor,
+            )
+        elif USE_STAGED_PIPELINE:
+            # Download threads and ffprobe processes sized separately, joined by a bounded queue
+            run_staged_pipeline(rows_to_validate, session, scan_mode, custom_size_mb, record_result)
+        else:
+            # Process in parallel
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                future_to_row = {executor.submit(validate_url_entry, row['actual_url'], session, scan_mode, custom_size_mb): row 
+                                for row in rows_to_validate}
+                
+                for future in as_completed(future_to_row):
+                    record_result(future_to_row[future], future.result())
+
+        # Final save - the journal is already on disk, export the wide CSV once
+        if journal is not None:
+            journal.sync()
+            save_results_to_csv(list(processed_urls.values()), OUTPUT_CSV)
+        if RANGE_CACHE is not None:
+            RANGE_CACHE.close()
         
         # Show results
-        valid_count = sum(1 for r in processed_urls.values() if r.get('is_valid'))
-        invalid_count = len(processed_urls) - valid_count
-        print(f"\n📈 Results: {valid_count} valid, {invalid_count} invalid out of {len(processed_urls)} total")
+        valid_count, invalid_count = result_counts()
+        print(f"\n📈 Results: {valid_count} valid, {invalid_count} invalid out of {valid_count + invalid_count} total")
         
         # Ask if want to continue
         if invalid_count > 0:
@@ -456,9 +1382,32 @@ def main():
         
         iteration += 1
 
-    valid_count = sum(1 for r in processed_urls.values() if r.get('is_valid'))
-    invalid_count = len(processed_urls) - valid_count
-    print(f"\n🎉 Final results: {valid_count} valid, {invalid_count} invalid out of {len(processed_urls)} total")
+    if store is not None:
+        print(f"💾 Results are in {STORE_FILE} (python PipelineStore.py --export writes {OUTPUT_CSV})")
+    else:
+        # Rescans append a new line per URL - keep only the latest result for each
+        journal.compact(processed_urls.values())
+        journal.close()
+    valid_count, invalid_count = result_counts()
+    if ResultJournal.pyarrow is not None and valid_count + invalid_count:
+        export_parquet = questionary.confirm(
+            f"Also export typed columns to {PARQUET_FILE}?",
+            default=False
+        ).ask()
+        if export_parquet:
+            rows = store.metadata_rows() if store is not None else list(processed_urls.values())
+            ResultJournal.export_parquet(rows, PARQUET_FILE)
+            print(f"💾 Exported typed columns to {PARQUET_FILE}")
+    if store is not None:
+        store.close()
+
+    print(f"\n🎉 Final results: {valid_count} valid, {invalid_count} invalid out of {valid_count + invalid_count} total")
+    print(f"🔌 {Transport.stats.summary()}")
 
 if __name__ == "__main__":
-    main()
+    if '--store' in sys.argv[1:]:
+        USE_PIPELINE_STORE = True
+    if '--export' in sys.argv[1:]:
+        export_results()
+    else:
+        main()
@@ -1,11 +1,15 @@
+import collections
 import csv
+import html
 import os
+import re
+import threading
 import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import requests
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.chrome.service import Service
 import selenium_stealth
@@ -13,20 +17,62 @@ import json
 import subprocess
 import sys
 
+import CanonicalUrl
+import PipelineStore
+import RateGovernor
+import Transport
+
 # Config
 CSV_FILE = 'epstein_no_images_pdf_urls.csv'
+HTTP_PAGINATION = True  # After the manual step, fetch result pages over plain HTTP; the browser only pages as a fallback
+SEARCH_PAGE_URL = None  # Results page URL, optionally with a {page} placeholder (default: the browser's URL after the manual step)
+PAGE_PARAM = 'page'  # Query parameter holding the page number
+FIRST_PAGE_NUMBER = 0  # PAGE_PARAM value of the first results page (Drupal pagers count from 0)
+HTTP_WORKERS = 8  # Result pages fetched at once
+HTTP_INITIAL_RATE = 5  # Requests/second the adaptive rate governor starts at
+HTTP_MAX_RATE = 20  # Upper bound for the adaptive rate governor
+REQUEST_TIMEOUT = 30
+PAGE_TIMEOUT = 10  # Seconds to wait for a results page to show its PDF links / for Next to load the next page
+LAZY_LOAD_QUIET_MS = 300  # After scrolling, links are harvested once the page has gone this long without changing
+SCRIPT_TIMEOUT = 120  # WebDriver limit for the in-page waits (above every timeout they are given)
+BROWSER_SHARDS = 1  # Browser fallback: browsers walking disjoint page ranges at once (each extra one is a new Chrome sharing the cookies)
+SHARD_RETRIES = 1  # Times a failed shard is restarted with a fresh browser before giving up
+SHARD_PROGRESS_FILE = 'geturls_shards.json'  # Per-shard progress, so unfinished shards are resumed on their own
+CHECKPOINT_FILE = 'geturls_checkpoint.json'  # Last fully scraped page and URLs per page, per query, for direct-jump resume
+URL_ALIASES_FILE = CanonicalUrl.ALIASES_FILE  # Other spellings (case, encoding, fragment, query) each saved URL was seen under
+USE_PIPELINE_STORE = False  # Write URLs to the shared SQLite store as they are found instead of rewriting the CSV (or pass --store; python PipelineStore.py --export writes it)
+STORE_FILE = PipelineStore.STORE_FILE
+STREAM_PIPELINE = False  # Probe (xTensionProbe) and validate (GetMetaData) every URL as soon as it is scraped, in this process
+PIPELINE_EXTENSIONS = ['.mp4', '.mov', '.jpg', '.jpeg', '.png', '.mp3']  # Extensions probed per PDF (its .pdf is tried last)
+PIPELINE_SCAN_MODE = 'fast'  # GetMetaData scan mode for the finds ('fast', 'full', 'two-pass', ...)
+PIPELINE_PROBE_WORKERS = 5  # Threads probing extensions
+PIPELINE_VALIDATE_WORKERS = 4  # Threads validating finds (each may run an ffprobe)
+PIPELINE_QUEUE_DEPTH = 200  # Max stems / finds waiting for each stage; scraping waits when the probe queue is full
+
+if '--store' in sys.argv[1:]:
+    USE_PIPELINE_STORE = True
 
-# Load existing URLs for deduplication/resume
+# Load existing URLs for deduplication/resume (saved in their canonical spelling)
 all_urls = set()
-if os.path.exists(CSV_FILE):
+store = None
+pipeline = None  # StreamingPipeline in STREAM_PIPELINE mode
+url_index = CanonicalUrl.CanonicalIndex(None if USE_PIPELINE_STORE else URL_ALIASES_FILE)  # The store keeps its own
+if USE_PIPELINE_STORE:
+    store = PipelineStore.open_store(STORE_FILE)
+    if store.url_count() == 0 and os.path.exists(CSV_FILE):
+        print(f"Seeded the store with {store.import_urls_csv(CSV_FILE)} URLs from {CSV_FILE}")
+    all_urls.update(store.urls())
+    print(f"Loaded {len(all_urls)} existing URLs – duplicates will be skipped")
+elif os.path.exists(CSV_FILE):
     try:
         with open(CSV_FILE, 'r', newline='', encoding='utf-8') as f:
             reader = csv.reader(f)
             next(reader, None)  # Skip header
-            for row in reader:
-                if row and row[0].strip():
-                    all_urls.add(row[0].strip())
+            saved_urls, duplicates = url_index.dedupe([row[0] for row in reader if row and row[0].strip()])
+        all_urls.update(saved_urls)
         print(f"Loaded {len(all_urls)} existing URLs – duplicates will be skipped")
+        if duplicates:
+            print(f"   ({duplicates} duplicate spellings of the same URLs dropped)")
     except Exception as e:
         print(f"CSV load error: {e}")
 
@@ -94,23 +140,27 @@ try:
 except Exception as e:
     log_debug("File check FAILED", {"error": str(e)}, "G")
 
-service = Service(driver_path)
+def start_driver():
+    """Visible, stealth-patched Chrome: the manual-step browser, and every extra shard browser."""
+    browser = webdriver.Chrome(service=Service(driver_path), options=options)
+    selenium_stealth.stealth(browser,
+        languages=["en-US", "en"],
+        vendor="Google Inc.",
+        platform="MacIntel",
+        webgl_vendor="Intel Inc.",
+        renderer="Intel Iris OpenGL Engine",
+        fix_hairline=True,
+    )
+    browser.set_script_timeout(SCRIPT_TIMEOUT)
+    return browser
+
 try:
-    driver = webdriver.Chrome(service=service, options=options)
+    driver = start_driver()
     log_debug("Driver started successfully", {}, "GENERAL")
 except Exception as e:
     log_debug("Driver init FAILED", {"error": str(e)}, "GENERAL")
     raise
 
-selenium_stealth.stealth(driver,
-    languages=["en-US", "en"],
-    vendor="Google Inc.",
-    platform="MacIntel",
-    webgl_vendor="Intel Inc.",
-    renderer="Intel Iris OpenGL Engine",
-    fix_hairline=True,
-)
-
 # On-screen attribution (assistance message)
 _CONTACT = "\033[40;97m @ThatRetiredDude on 𝕏 or MaxwellInternational.ai \033[0m"
 print("Follow the on-screen instructions. Any questions? Contact", _CONTACT)
@@ -127,147 +177,622 @@ print("3. Wait for results to load (PDF links visible).")
 print("4. When ready, come back here and press Enter to start scraping.")
 input("Press Enter to begin scraping...")
 
-# Helper function to wait for PDF links using robust detection
-def wait_for_pdf_links(timeout=15):
-    """Wait for PDF links to be present using robust detection (handles query params)"""
-    for _ in range(timeout):
-        all_links = driver.find_elements(By.TAG_NAME, 'a')
-        pdf_count = sum(1 for link in all_links 
-                       if link.get_attribute('href') and '.pdf' in link.get_attribute('href').lower())
-        if pdf_count > 0:
-            return True
-        time.sleep(0.5)
-    return False
-
-# Helper function to check if PDF links exist
-def has_pdf_links():
-    """Check if PDF links exist using robust detection"""
-    all_links = driver.find_elements(By.TAG_NAME, 'a')
-    return any(link.get_attribute('href') and '.pdf' in link.get_attribute('href').lower() 
-               for link in all_links)
+# --- In-page helpers: each DOM read is one execute_script round trip, waits follow DOM changes ---
+# Shared by the scripts below: the deduplicated PDF hrefs in page order (case-insensitive,
+# query params OK), the pager's current page, and waitFor(), which re-runs check() on
+# every DOM change and hands its first truthy result (or fallback on timeout) to done()
+PAGE_JS = r"""
+const pdfLinks = () => Array.from(new Set(Array.from(document.querySelectorAll('a[href]'), a => a.href)
+    .filter(href => href.toLowerCase().includes('.pdf'))));
+const currentPage = () => {
+    const current = document.querySelector('a[aria-current="page"]');
+    const page = current && parseInt((current.getAttribute('aria-label') || '').trim().split(/\s+/).pop(), 10);
+    return page || 1;
+};
+const waitFor = (check, timeoutMs, fallback, done) => {
+    let finished = false;
+    const finish = value => {
+        if (finished) return;
+        finished = true;
+        observer.disconnect();
+        clearTimeout(timer);
+        done(value);
+    };
+    const observer = new MutationObserver(() => { const value = check(); if (value) finish(value); });
+    observer.observe(document, {childList: true, subtree: true, attributes: true});
+    const timer = setTimeout(() => finish(fallback), timeoutMs);
+    const value = check();
+    if (value) finish(value);
+};
+"""
+
+WAIT_FOR_LINKS_JS = PAGE_JS + """
+waitFor(() => pdfLinks().length > 0, arguments[0], false, arguments[arguments.length - 1]);
+"""
+
+# Scrolls to the bottom to trigger lazy loading and returns the links once the page has stopped changing
+HARVEST_JS = PAGE_JS + """
+const [quietMs, timeoutMs, done] = [arguments[0], arguments[1], arguments[arguments.length - 1]];
+let finished = false, quiet;
+const finish = () => {
+    if (finished) return;
+    finished = true;
+    observer.disconnect();
+    clearTimeout(quiet);
+    clearTimeout(deadline);
+    window.scrollTo(0, 0);
+    done(pdfLinks());
+};
+const observer = new MutationObserver(() => { clearTimeout(quiet); quiet = setTimeout(finish, quietMs); });
+observer.observe(document, {childList: true, subtree: true});
+const deadline = setTimeout(finish, timeoutMs);
+window.scrollTo(0, document.body.scrollHeight);
+quiet = setTimeout(finish, quietMs);
+"""
+
+# Clicks the first visible, enabled match of the Next selectors (XPath); false if there is none
+CLICK_NEXT_JS = """
+for (const selector of arguments[0]) {
+    const button = document.evaluate(selector, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    if (button && button.offsetParent !== null && !button.disabled && button.getAttribute('aria-disabled') !== 'true') {
+        button.scrollIntoView(true);
+        button.click();
+        return true;
+    }
+}
+return false;
+"""
+
+# The new page number once the pager has moved past the old page and the result list has changed, else 0
+WAIT_FOR_NEXT_PAGE_JS = PAGE_JS + """
+const [previous, oldPage, timeoutMs, done] = [arguments[0], arguments[1], arguments[2], arguments[arguments.length - 1]];
+waitFor(() => {
+    const links = pdfLinks();
+    return currentPage() > oldPage && links.length > 0 && links.join('\\n') !== previous ? currentPage() : 0;
+}, timeoutMs, 0, done);
+"""
+
+NEXT_SELECTORS = [
+    '//a[@rel="next"]',
+    '//a[contains(@aria-label, "Next")]',
+    '//a[text()="Next" or text()=">"]',
+    '//button[contains(text(), "Next")]'
+]
+
+def wait_for_pdf_links(timeout=PAGE_TIMEOUT, browser=None):
+    """True as soon as the page shows a PDF link, False after `timeout` seconds"""
+    try:
+        return (browser or driver).execute_async_script(WAIT_FOR_LINKS_JS, int(timeout * 1000))
+    except Exception:
+        return False
+
+def harvest_pdf_links(browser=None):
+    """Scrolls to trigger lazy loading and returns the PDF hrefs (in page order) once the page has settled"""
+    return (browser or driver).execute_async_script(HARVEST_JS, LAZY_LOAD_QUIET_MS, PAGE_TIMEOUT * 1000)
+
+def wait_for_next_page(old_page, old_links, timeout=PAGE_TIMEOUT, browser=None):
+    """
+    The new page number once the pager and the result list have both moved on
+    from old_page, or None after `timeout` seconds.
+    """
+    browser = browser or driver
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        remaining_ms = int((deadline - time.monotonic()) * 1000)
+        try:
+            return browser.execute_async_script(WAIT_FOR_NEXT_PAGE_JS, '\n'.join(old_links), old_page, remaining_ms) or None
+        except Exception:
+            time.sleep(0.1)  # A full page load replaced the document the wait ran in - wait again in the new one
+    return None
 
 # Confirm results are loaded - FIXED: Use robust detection instead of restrictive selector
-try:
-    WebDriverWait(driver, 30).until(lambda d: has_pdf_links())
+if wait_for_pdf_links(timeout=30):
     print("PDF results detected – starting scrape")
-except:
+else:
     print("No PDF links found – check browser manually")
     driver.save_screenshot("manual_error.png")
     driver.quit()
     raise SystemExit
+results_url = driver.current_url  # The results page the manual step ended on
+
+# Shard browsers add to all_urls and save from their own threads
+urls_lock = threading.Lock()
+save_lock = threading.Lock()
 
 # Save function (atomic, fast)
 def save_progress():
-    temp_file = CSV_FILE + '.tmp'
-    with open(temp_file, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(["URL"])
-        for url in all_urls:
-            writer.writerow([url])
-    os.replace(temp_file, CSV_FILE)
+    """
+    Saves the URLs, then the page checkpoint and shard progress. Those are copied
+    before the URLs are written (a page is recorded after its URLs are added), so
+    after a crash they never claim a page whose URLs weren't saved.
+    """
+    with save_lock:  # Shard threads save too; one at a time, so an older copy never overwrites a newer one
+        with checkpoint_lock:
+            saved_checkpoint = checkpoint and {**checkpoint, 'pages': dict(checkpoint['pages'])}
+        with shards_lock:
+            saved_shards = active_shards and [dict(shard) for shard in active_shards]
+        if store is None:  # Otherwise add_urls already wrote the new rows
+            temp_file = CSV_FILE + '.tmp'
+            with urls_lock:
+                with open(temp_file, 'w', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(["URL"])
+                    for url in all_urls:
+                        writer.writerow([url])
+                os.replace(temp_file, CSV_FILE)
+            url_index.save()
+        if saved_checkpoint:
+            save_checkpoint(saved_checkpoint)
+        if saved_shards:
+            save_shards(saved_shards)
     # print(f"   → Saved progress: {len(all_urls)} URLs")
 
+def add_urls(links):
+    """
+    Adds links to all_urls in their canonical spelling (and hands the new ones to
+    the pipeline), so a file linked under several spellings is only kept once.
+    Returns how many were new.
+    """
+    with urls_lock:
+        new_links = []
+        for link in links:
+            url = url_index.add(link)
+            if url not in all_urls:
+                all_urls.add(url)
+                new_links.append(url)
+        if store is not None:
+            store.add_urls(links)  # Only new URLs and spellings are inserted
+    if pipeline is not None and new_links:
+        pipeline.submit(new_links)
+    return len(new_links)
+
 # Current page detection
-def get_current_page():
+def get_current_page(browser=None):
     try:
-        current = driver.find_element(By.CSS_SELECTOR, 'a[aria-current="page"]')
-        aria = current.get_attribute("aria-label")
-        return int(aria.split()[-1])
+        return (browser or driver).execute_script(PAGE_JS + "return currentPage();")
     except:
         return 1
 
-save_counter = 0
-page_counter = get_current_page()
-while True:
-    before = len(all_urls)
-    
-    # FIXED: Wait for PDF links specifically, not just any links
-    if not wait_for_pdf_links(timeout=10):
-        print(f"Warning: No PDF links found on page {page_counter} after waiting")
-    
-    # FIXED: Scroll to trigger lazy loading of PDF links
-    driver.execute_script("window.scrollTo(0, 0);")
-    time.sleep(0.5)  # Brief pause for lazy loading
-    
-    # Scroll down gradually to trigger any lazy-loaded content
-    driver.execute_script("window.scrollTo(0, document.body.scrollHeight/2);")
-    time.sleep(0.5)
-    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-    time.sleep(0.5)
-    driver.execute_script("window.scrollTo(0, 0);")
-    time.sleep(0.5)
-        
-    # Robust PDF finder (case-insensitive, query params OK)
-    all_links = driver.find_elements(By.TAG_NAME, 'a')
-    pdf_links = []
-    for link in all_links:
-        href = link.get_attribute('href')
-        if href and '.pdf' in href.lower():
-            pdf_links.append(link)
-    new_added = 0
-    for link in pdf_links:
-        url = link.get_attribute('href')
-        if url and url not in all_urls:
-            all_urls.add(url)
-            new_added += 1
-    
-    print(f"Page {page_counter}: {len(pdf_links)} links → {new_added} new → Total: {len(all_urls)}")
-    if new_added > 0:
-        save_counter += 1
-        if save_counter % 5 == 0:  # Save every 5 pages for speed
-            save_progress()
-            save_counter = 0
-    
-    # Click Next (multiple selectors)
-    next_clicked = False
-    next_selectors = [
-        '//a[@rel="next"]',
-        '//a[contains(@aria-label, "Next")]',
-        '//a[text()="Next" or text()=">"]',
-        '//button[contains(text(), "Next")]'
-    ]
-    for sel in next_selectors:
+def get_last_page():
+    """Highest page number the pager links to (by label or page parameter), or None without a pager."""
+    links = driver.execute_script(
+        "return Array.from(document.querySelectorAll('a[href]')).map(a => [a.getAttribute('aria-label') || '', a.href]);")
+    results_path = urllib.parse.urlsplit(results_url).path
+    pages = []
+    for label, href in links:
+        words = label.split()
+        if words and words[-1].isdigit() and 'page' in label.lower():
+            pages.append(int(words[-1]))
+        parts = urllib.parse.urlsplit(href)
+        value = urllib.parse.parse_qs(parts.query).get(PAGE_PARAM)
+        if value and value[0].isdigit() and parts.path == results_path:
+            pages.append(int(value[0]) - FIRST_PAGE_NUMBER + 1)
+    return max(pages, default=None)
+
+# --- HTTP pagination: result pages fetched with the browser's cookies, no clicking ---
+# Quoted strings with a path ending in .pdf - hrefs in server-rendered HTML, or URLs in a JSON search response
+PDF_HREF = re.compile(r'''["']([^"'\s<>]*/[^"'\s<>]*?\.pdf(?:[?#][^"'\s<>]*)?)["']''', re.IGNORECASE)
+
+def page_url(template, page):
+    """URL of results page `page` (1-based, as shown in the pager)."""
+    value = page - 1 + FIRST_PAGE_NUMBER
+    if '{page}' in template:
+        return template.replace('{page}', str(value))
+    parts = urllib.parse.urlsplit(template)
+    query = [(k, v) for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True) if k != PAGE_PARAM]
+    query.append((PAGE_PARAM, str(value)))
+    return urllib.parse.urlunsplit(parts._replace(query=urllib.parse.urlencode(query)))
+
+def parse_pdf_links(body, base_url):
+    """Absolute PDF URLs found in a results page (HTML or JSON)."""
+    links = set()
+    for match in PDF_HREF.finditer(body):
+        href = html.unescape(match.group(1).replace('\\/', '/'))
+        links.add(urllib.parse.urljoin(base_url, href))
+    return links
+
+def create_http_session():
+    """requests.Session with the browser's cookies and User-Agent, pooled for HTTP_WORKERS threads."""
+    if pipeline is not None:
+        return pipeline.session  # One cookie session for every stage
+    session = requests.Session()
+    for cookie in driver.get_cookies():
+        session.cookies.set(cookie['name'], cookie['value'])
+    session.headers.update({
+        'User-Agent': driver.execute_script("return navigator.userAgent"),
+        'Referer': driver.current_url
+    })
+    Transport.configure_session(session, HTTP_WORKERS)
+    return session
+
+def refresh_pipeline_cookies(session):
+    """Runs once per 401/403 burst in the pipeline stages, from their shared auth gate, while their other requests wait."""
+    print("\n🔄 *** Pipeline requests rejected (401/403 burst) - HUMAN INTERVENTION ***")
+    print("1. Change VPN/IP if needed.")
+    print("2. Solve any challenge in the open browser window.")
+    input("3. Press Enter to resume...")
+    session.cookies.clear()
+    for cookie in driver.get_cookies():
+        session.cookies.set(cookie['name'], cookie['value'])
+    print("✅ Cookies refreshed - resuming...")
+
+def fetch_page(session, template, page):
+    """Returns (links, error) for results page `page`; error is set if the page couldn't be fetched."""
+    url = page_url(template, page)
+    RateGovernor.governor.acquire()
+    started = time.monotonic()
+    try:
+        r = session.get(url, timeout=REQUEST_TIMEOUT)
+    except requests.exceptions.RequestException as e:
+        RateGovernor.governor.record(None)
+        return set(), str(e)[:80]
+    RateGovernor.governor.record(r.status_code, time.monotonic() - started, RateGovernor.parse_retry_after(r.headers))
+    if r.status_code != 200:
+        return set(), f"status {r.status_code}"
+    return parse_pdf_links(r.text, r.url), None
+
+def scrape_over_http(start_page):
+    """
+    Walks the result pages from start_page over plain HTTP, HTTP_WORKERS pages at
+    a time, up to the last page in the pager. Drupal answers a page past the end
+    with the last page again, and every page links the same header/footer PDFs,
+    so the results also end at the first page that has no PDF links or repeats
+    the page before it. Pages whose URLs are all known already (e.g. from the
+    CSV of an earlier run) are walked through. Pages are recorded in page order,
+    since whether a page is past the end depends on the one before it.
+
+    Returns:
+        None when the results were walked to the end, or the page the browser
+        should continue from: start_page if the page HTML has no links (results
+        rendered by JavaScript), or the first page that failed (e.g. blocked).
+    """
+    template = SEARCH_PAGE_URL or results_url
+    session = create_http_session()
+    last_page = get_last_page()  # None without a pager
+    end_page = None  # First page past the end of the results
+    failed_page = None  # First page that couldn't be fetched
+    next_page = start_page
+    next_record = start_page  # Next page to record; fetched pages wait for the ones before them
+    fetched = {}  # {page: links} fetched but not recorded yet
+    previous_links = None
+    no_links_at_start = False
+    pending = {}
+    save_counter = 0
+    with ThreadPoolExecutor(max_workers=HTTP_WORKERS) as executor:
+        while True:
+            stop = min((p for p in (end_page, failed_page) if p is not None), default=None)
+            while (len(pending) < HTTP_WORKERS and next_page < next_record + 2 * HTTP_WORKERS
+                   and (stop is None or next_page < stop) and (last_page is None or next_page <= last_page)):
+                pending[executor.submit(fetch_page, session, template, next_page)] = next_page
+                next_page += 1
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                page = pending.pop(future)
+                links, error = future.result()
+                if error:
+                    print(f"Page {page}: HTTP fetch failed ({error})")
+                    failed_page = page if failed_page is None else min(failed_page, page)
+                    continue
+                fetched[page] = links
+            while end_page is None and next_record in fetched and (failed_page is None or next_record < failed_page):
+                page = next_record
+                links = fetched.pop(page)
+                next_record += 1
+                if not links or links == previous_links:
+                    no_links_at_start = page == start_page and not links
+                    end_page = page
+                    break
+                new_added = add_urls(links)
+                previous_links = links
+                record_page(page, len(links))
+                print(f"Page {page}: {len(links)} links → {new_added} new → Total: {len(all_urls)}")
+                if new_added:
+                    save_counter += 1
+                    if save_counter % 5 == 0:  # Save every 5 pages for speed
+                        save_progress()
+                        save_counter = 0
+    reached_end = not no_links_at_start and (end_page is not None or failed_page is None)
+    last_scraped = next_record - 1 if end_page is None else end_page - 1
+    if reached_end and last_scraped >= start_page:  # Below start_page: nothing scraped (pager ends earlier), keep any earlier end
+        record_end(last_scraped)
+    save_progress()
+    print(Transport.stats.summary())
+
+    if no_links_at_start and failed_page is None:
+        print("Results page HTML has no PDF links (rendered by JavaScript?) – paging in the browser")
+        return start_page
+    if not reached_end:
+        print(f"HTTP pagination stopped at page {failed_page} – continuing in the browser")
+        if failed_page != get_current_page():
+            driver.get(page_url(results_url, failed_page))
+        return failed_page
+    if end_page is None:
+        print(f"Last page in the pager ({last_page}) reached – end of results")
+    else:
+        print(f"Page {end_page} has no PDF links or repeats page {end_page - 1} – end of results reached")
+    return None
+
+# --- Page checkpoint: restart at the first page not scraped yet, re-fetch pages that came up short ---
+checkpoint_lock = threading.Lock()
+checkpoint = None  # Loaded once the results page is known; written to disk by save_progress()
+
+def load_checkpoint(start_page):
+    """The checkpoint of an earlier run over the same query, or a fresh one starting at start_page."""
+    query = page_url(results_url, 1)
+    if os.path.exists(CHECKPOINT_FILE):
         try:
-            # TURBO: Reduced wait time
-            next_btn = WebDriverWait(driver, 3).until(EC.element_to_be_clickable((By.XPATH, sel)))
-            driver.execute_script("arguments[0].scrollIntoView(true);", next_btn)
-            driver.execute_script("arguments[0].click();", next_btn)
-            next_clicked = True
-            break
-        except:
-            continue
-    
-    if not next_clicked:
-        print("No Next button – end of results reached")
-        break
-    
-    # print("Clicked Next")
-    
-    # Wait for page number change (ensures real navigation)
-    old_page = page_counter
+            with open(CHECKPOINT_FILE, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            if saved['query'] == query:
+                saved['pages'] = {int(page): count for page, count in saved['pages'].items()}
+                return saved
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Checkpoint unreadable ({e}) – starting from the current page")
+    # last_page: every page up to here is scraped; end_page: last results page, once reached
+    return {'query': query, 'last_page': start_page - 1, 'end_page': None, 'pages': {}}
+
+def save_checkpoint(state):
+    temp_file = CHECKPOINT_FILE + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(temp_file, CHECKPOINT_FILE)
+
+def record_page(page, url_count):
+    """
+    Records a scraped page (call after add_urls) and moves last_page up to the end
+    of the unbroken run of scraped pages. Saved by the next save_progress().
+    """
+    with checkpoint_lock:
+        checkpoint['pages'][page] = url_count
+        while checkpoint['last_page'] + 1 in checkpoint['pages']:
+            checkpoint['last_page'] += 1
+
+def record_end(page):
+    with checkpoint_lock:
+        checkpoint['end_page'] = page
+
+def short_pages():
+    """Scraped pages with fewer URLs than the usual page size (the last results page may be short)."""
+    counts = {page: count for page, count in checkpoint['pages'].items() if page != checkpoint['end_page']}
+    if not counts:
+        return []
+    usual = collections.Counter(counts.values()).most_common(1)[0][0]
+    return sorted(page for page, count in counts.items() if count < usual)
+
+def refetch_pages(pages):
+    """Scrapes pages again, over HTTP if it works for them, else by opening them in the browser."""
+    session = create_http_session() if HTTP_PAGINATION else None
+    for page in pages:
+        links = set()
+        if session is not None:
+            links, _ = fetch_page(session, SEARCH_PAGE_URL or results_url, page)
+        if not links:
+            driver.get(page_url(results_url, page))
+            if wait_for_pdf_links():
+                links = set(harvest_pdf_links())
+        new_added = add_urls(links)
+        print(f"Page {page} re-fetched: {checkpoint['pages'][page]} → {len(links)} links → {new_added} new → Total: {len(all_urls)}")
+        if len(links) > checkpoint['pages'][page]:
+            record_page(page, len(links))
+    save_progress()
+
+def resume_from_checkpoint(page_counter):
+    """
+    Re-fetches the short pages of an earlier run, then opens the first page not
+    scraped yet (the last results page again if the end was reached, for new
+    results) directly by URL. Returns the page to continue from.
+    """
+    if not checkpoint['pages']:
+        return page_counter
+    missing = short_pages()
+    if missing:
+        print(f"Re-fetching {len(missing)} page(s) that came up short: {', '.join(map(str, missing[:20]))}{' ...' if len(missing) > 20 else ''}")
+        refetch_pages(missing)
+
+    resume_page = checkpoint['last_page'] + 1
+    if checkpoint['end_page'] is not None:
+        resume_page = min(resume_page, checkpoint['end_page'])
+    resume_page = max(resume_page, 1)
+    print(f"Checkpoint: pages up to {checkpoint['last_page']} scraped – jumping to page {resume_page}")
+    driver.get(page_url(results_url, resume_page))
+    if wait_for_pdf_links() and get_current_page() == resume_page:
+        return resume_page
+    print(f"Couldn't open page {resume_page} directly – continuing from the search results page")
+    driver.get(results_url)
+    wait_for_pdf_links()
+    return get_current_page()
+
+# --- Sharded browser pagination: N browsers jump straight to their own page ranges ---
+shards_lock = threading.Lock()
+active_shards = None  # Shards being walked; their progress is written to disk by save_progress()
+
+def save_shards(shards):
+    temp_file = SHARD_PROGRESS_FILE + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump({'results_url': page_url(results_url, 1), 'shards': shards}, f, indent=1)
+    os.replace(temp_file, SHARD_PROGRESS_FILE)
+
+def load_shards(start_page, last_page):
+    """The shards of an earlier run over the same results if some are unfinished, else a fresh split of start_page..last_page."""
+    if os.path.exists(SHARD_PROGRESS_FILE):
+        try:
+            with open(SHARD_PROGRESS_FILE, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            if saved['results_url'] == page_url(results_url, 1) and any(s['next_page'] < s['end'] for s in saved['shards']):
+                print(f"Resuming the unfinished shards from {SHARD_PROGRESS_FILE}")
+                return saved['shards']
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Shard progress unreadable ({e}) – splitting the pages again")
+    count = min(BROWSER_SHARDS, last_page - start_page + 1)
+    size = -(-(last_page - start_page + 1) // count)  # Ceiling division
+    return [{'start': first, 'end': min(first + size, last_page + 1), 'next_page': first, 'error': None}
+            for first in range(start_page, last_page + 1, size)]
+
+def scrape_shard(index, shards, cookies, browser=None):
+    """
+    Walks shard `index` page by page, navigating straight to each page URL.
+    Without `browser` a fresh one is started with `cookies`. A failure is
+    recorded in the shard (and its progress kept) instead of raised.
+    """
+    shard = shards[index]
+    own_browser = browser is None
+    save_counter = 0
     try:
-        WebDriverWait(driver, 10).until(
-            lambda d: get_current_page() > old_page
-        )
-        page_counter = get_current_page()
-        # print(f"Advanced to page {page_counter}")
-    except:
-        print("Page didn't advance – possible block. Screenshot saved.")
-        driver.save_screenshot(f"stuck_{old_page}.png")
-        break
-    
-    # FIXED: Wait for PDF links to load after navigation
-    if not wait_for_pdf_links(timeout=10):
-        print(f"Warning: No PDF links found on page {page_counter} after navigation")
+        if own_browser:
+            browser = start_driver()
+            browser.get(results_url)  # Cookies can only be added for the site that is open
+            for cookie in cookies:
+                browser.add_cookie(cookie)
+        for page in range(shard['next_page'], shard['end']):
+            browser.get(page_url(results_url, page))
+            if not wait_for_pdf_links(browser=browser) or get_current_page(browser) != page:
+                browser.save_screenshot(f"stuck_{page}.png")
+                raise RuntimeError(f"page {page} didn't load (blocked, or the page parameter isn't honoured)")
+            links = harvest_pdf_links(browser)  # Scrolls for lazy-loaded links, like the single-browser walk
+            new_added = add_urls(links)
+            record_page(page, len(links))
+            print(f"[Shard {index + 1}] Page {page}: {len(links)} links → {new_added} new → Total: {len(all_urls)}")
+            with shards_lock:
+                shard['next_page'] = page + 1
+                shard['error'] = None
+            if new_added:
+                save_counter += 1
+                if save_counter % 5 == 0:  # Save every 5 pages for speed
+                    save_progress()
+                    save_counter = 0
+    except Exception as e:
+        with shards_lock:
+            shard['error'] = str(e)[:200]
+        save_progress()
+        print(f"[Shard {index + 1}] Stopped at page {shard['next_page']}: {shard['error']}")
+    finally:
+        if own_browser and browser is not None:
+            browser.quit()
+
+def scrape_in_shards(start_page, last_page):
+    """
+    Splits start_page..last_page into BROWSER_SHARDS ranges walked at once.
+    The manual-step browser takes the first one; the others get new browsers
+    with its cookies. Failed shards are restarted on their own (from the page
+    they stopped at) up to SHARD_RETRIES times, and again on the next run.
+    """
+    global active_shards
+    shards = active_shards = load_shards(start_page, last_page)
+    cookies = driver.get_cookies()
+    for attempt in range(SHARD_RETRIES + 1):
+        todo = [i for i, shard in enumerate(shards) if shard['next_page'] < shard['end']]
+        if not todo:
+            break
+        if attempt:
+            print(f"Retrying {len(todo)} failed shard(s)...")
+        remaining = sum(shards[i]['end'] - shards[i]['next_page'] for i in todo)
+        print(f"Walking {remaining} pages in {len(todo)} browser shard(s)")
+        with ThreadPoolExecutor(max_workers=len(todo)) as executor:
+            futures = [executor.submit(scrape_shard, i, shards, cookies, driver if n == 0 else None)
+                       for n, i in enumerate(todo)]
+            for future in futures:
+                future.result()
+
+    failed = [shard for shard in shards if shard['next_page'] < shard['end']]
+    for shard in failed:
+        print(f"Shard {shard['start']}–{shard['end'] - 1} unfinished at page {shard['next_page']} – re-run to retry it")
+    if not failed:
+        record_end(max(shard['end'] for shard in shards) - 1)
+    save_progress()
+    with shards_lock:
+        active_shards = None
+    if not failed and os.path.exists(SHARD_PROGRESS_FILE):
+        os.remove(SHARD_PROGRESS_FILE)
+
+# --- Browser pagination (fallback): scroll, harvest, click Next ---
+def scrape_with_browser(page_counter):
+    save_counter = 0
+    while True:
+        # FIXED: Wait for PDF links specifically, not just any links
+        if not wait_for_pdf_links():
+            print(f"Warning: No PDF links found on page {page_counter} after waiting")
+
+        # Scroll to trigger lazy loading, then harvest in one round trip once the list has settled
+        pdf_links = harvest_pdf_links()
+        new_added = add_urls(pdf_links)
+        record_page(page_counter, len(pdf_links))
+
+        print(f"Page {page_counter}: {len(pdf_links)} links → {new_added} new → Total: {len(all_urls)}")
+        if new_added > 0:
+            save_counter += 1
+            if save_counter % 5 == 0:  # Save every 5 pages for speed
+                save_progress()
+                save_counter = 0
+
+        # Click Next (multiple selectors)
+        if not driver.execute_script(CLICK_NEXT_JS, NEXT_SELECTORS):
+            print("No Next button – end of results reached")
+            record_end(page_counter)
+            save_progress()
+            break
+
+        # Wait for the page number and the result list to change (ensures real navigation)
+        old_page = page_counter
+        page_counter = wait_for_next_page(old_page, pdf_links)
+        if page_counter is None:
+            print("Page didn't advance – possible block. Screenshot saved.")
+            driver.save_screenshot(f"stuck_{old_page}.png")
+            save_progress()
+            break
+
+RateGovernor.governor.configure(initial_rate=HTTP_INITIAL_RATE, max_rate=HTTP_MAX_RATE)
+if STREAM_PIPELINE:
+    import GetMetaData
+    import StreamingPipeline
+    import xTensionProbe
+    from AuthGate import AuthGate
+    if GetMetaData.is_ffmpeg_installed():
+        pipeline_session = create_http_session()
+        Transport.configure_session(pipeline_session, HTTP_WORKERS + PIPELINE_PROBE_WORKERS + PIPELINE_VALIDATE_WORKERS)
+        # One gate for both stages: an auth burst is fixed once, in this browser, for every thread
+        xTensionProbe.auth_gate = GetMetaData.AUTH_GATE = AuthGate(
+            lambda: refresh_pipeline_cookies(pipeline_session), xTensionProbe.error_threshold)
+        pipeline = StreamingPipeline.StreamingPipeline(
+            pipeline_session, PIPELINE_EXTENSIONS, PIPELINE_SCAN_MODE,
+            probe_workers=PIPELINE_PROBE_WORKERS, validate_workers=PIPELINE_VALIDATE_WORKERS,
+            queue_depth=PIPELINE_QUEUE_DEPTH, store=store)
+        pipeline.start(backlog=sorted(all_urls))
+    else:
+        print("Pipeline mode needs FFmpeg – only scraping URLs")
+page_counter = get_current_page()
+checkpoint = load_checkpoint(page_counter)
+page_counter = resume_from_checkpoint(page_counter)
+if HTTP_PAGINATION:
+    page_counter = scrape_over_http(page_counter)
+if page_counter is not None:
+    last_page = get_last_page() if BROWSER_SHARDS > 1 else None
+    if last_page is not None and last_page > page_counter:
+        scrape_in_shards(page_counter, last_page)
+    else:
+        scrape_with_browser(page_counter)
+
+if pipeline is not None:
+    print("Scraping done – waiting for the probe and validation stages to finish...")
+    pipeline.finish()
+if url_index.duplicates:
+    print(f"Skipped {url_index.duplicates} links that were another spelling of a URL already found "
+          f"(case, encoding, #fragment, tracking parameters)")
 
 # Final sorted save
-print("Finalizing sorted CSV...")
-sorted_urls = sorted(all_urls)
-with open(CSV_FILE, 'w', newline='', encoding='utf-8') as f:
-    writer = csv.writer(f)
-    writer.writerow(["URL"])
-    for url in sorted_urls:
-        writer.writerow([url])
-
-print(f"DONE! {len(all_urls)} unique URLs saved (~{len(all_urls)//10} pages)")
+if store is not None:
+    store.close()
+    print(f"DONE! {len(all_urls)} unique URLs saved to {STORE_FILE} (python PipelineStore.py --export writes {CSV_FILE})")
+else:
+    print("Finalizing sorted CSV...")
+    url_index.save()
+    sorted_urls = sorted(all_urls)
+    with open(CSV_FILE, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["URL"])
+        for url in sorted_urls:
+            writer.writerow([url])
+
+    print(f"DONE! {len(all_urls)} unique URLs saved (~{len(all_urls)//10} pages)")
 driver.quit()
\ No newline at end of file
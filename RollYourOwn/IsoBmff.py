@@ -0,0 +1,129 @@
+"""
+Minimal ISO base media file format (MP4/MOV/M4A/3GP/HEIF) box walking helpers.
+
+Only top-level box headers are read, so the position of the `moov` box can be
+found without downloading the `mdat` payload that usually sits in front of it.
+"""
+import collections
+import struct
+
+# Extensions that are (almost always) ISO-BMFF / QuickTime containers
+ISO_BMFF_EXTENSIONS = {
+    '.mp4', '.mov', '.m4v', '.m4a', '.m4b', '.3gp', '.3g2',
+    '.qt', '.f4v', '.heic', '.heif'
+}
+
+# Box types a well-formed file can start with
+LEADING_BOX_TYPES = {b'ftyp', b'moov', b'mdat', b'free', b'skip', b'wide', b'pnot'}
+
+BOX_HEADER_SIZE = 16  # Long enough for a 64-bit "largesize" header
+MAX_TOP_LEVEL_BOXES = 64
+
+
+def parse_box_header(buf, offset=0):
+    """
+    Parses the box header starting at buf[offset].
+
+    Returns:
+        (box_size, box_type, header_size), or None if the bytes aren't a valid header.
+        box_size is None when the box runs to the end of the file.
+    """
+    if len(buf) - offset < 8:
+        return None
+    box_size, box_type = struct.unpack_from('>I4s', buf, offset)
+    header_size = 8
+    if box_size == 1:
+        if len(buf) - offset < 16:
+            return None
+        box_size = struct.unpack_from('>Q', buf, offset + 8)[0]
+        header_size = 16
+    elif box_size == 0:
+        box_size = None
+    if box_size is not None and box_size < header_size:
+        return None
+    return box_size, box_type, header_size
+
+
+def looks_like_iso_bmff(head):
+    """True if the first bytes of a file start with a plausible top-level box."""
+    header = parse_box_header(head)
+    return header is not None and header[1] in LEADING_BOX_TYPES
+
+
+# Request from walk_top_level_boxes() for the bytes at offset (a box header past the head)
+HeaderFetch = collections.namedtuple('HeaderFetch', 'offset length')
+
+
+def walk_top_level_boxes(head, total_size=None):
+    """
+    The top-level box walk without the I/O, so sync and async callers share it.
+
+    A generator yielding (offset, size, type) for each box, and a HeaderFetch
+    whenever it needs a header beyond `head`; send() it the bytes at that
+    position. size is None only for a run-to-EOF box when total_size is unknown.
+    """
+    offset = 0
+    for _ in range(MAX_TOP_LEVEL_BOXES):
+        if total_size is not None and offset >= total_size:
+            return
+        if offset + BOX_HEADER_SIZE <= len(head):
+            buf, at = head, offset
+        else:
+            buf, at = (yield HeaderFetch(offset, BOX_HEADER_SIZE)), 0
+        header = parse_box_header(buf, at)
+        if header is None:
+            return
+        box_size, box_type, _ = header
+        if box_size is None:
+            if total_size is None:
+                yield offset, None, box_type
+                return
+            box_size = total_size - offset
+        yield offset, box_size, box_type
+        offset += box_size
+
+
+def iter_top_level_boxes(head, fetch, total_size=None):
+    """
+    Yields (offset, size, type) for each top-level box.
+
+    Headers inside `head` are read directly; headers beyond it are read with
+    fetch(offset, length), which should return the bytes at that position.
+    size is None only for a run-to-EOF box when total_size is unknown.
+    """
+    walk = walk_top_level_boxes(head, total_size)
+    data = None
+    while True:
+        try:
+            item = walk.send(data)
+        except StopIteration:
+            return
+        data = None
+        if isinstance(item, HeaderFetch):
+            data = fetch(item.offset, item.length)
+        else:
+            yield item
+
+
+def find_top_level_box(head, box_type, fetch, total_size=None):
+    """Returns (offset, size) of the first top-level box of `box_type`, or None."""
+    for offset, box_size, found_type in iter_top_level_boxes(head, fetch, total_size):
+        if found_type == box_type:
+            return offset, box_size
+    return None
+
+
+async def async_find_top_level_box(head, box_type, fetch, total_size=None):
+    """find_top_level_box() for an async fetch(offset, length) coroutine."""
+    walk = walk_top_level_boxes(head, total_size)
+    data = None
+    while True:
+        try:
+            item = walk.send(data)
+        except StopIteration:
+            return None
+        data = None
+        if isinstance(item, HeaderFetch):
+            data = await fetch(item.offset, item.length)
+        elif item[2] == box_type:
+            return item[0], item[1]
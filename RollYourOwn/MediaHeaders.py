@@ -0,0 +1,734 @@
+"""
+Pure-Python header parsers for the common formats in ALL_EXTENSIONS.
+
+parse_media_header(head, total_size) looks at the first bytes of a file and,
+for JPEG/PNG/GIF/WebP/TIFF, WAV/AIFF, MP3, MP4/MOV (when moov is in the head)
+and Matroska/WebM, returns a dict shaped like ffprobe's
+`-show_format -show_streams` JSON: {'format': {...}, 'streams': [...]}.
+GetMetaData flattens it into the same format_*/stream_N_* columns, so most
+files never need an ffprobe process. None means "not handled here" and the
+caller falls back to ffprobe.
+
+sniff_media_type(head) only names the MIME type behind the magic bytes, for
+xTensionProbe's sniff mode, where the Content-Type can't be trusted.
+"""
+import struct
+
+import IsoBmff
+
+
+def parse_media_header(head, total_size=None):
+    """Returns ffprobe-shaped metadata for `head`, or None if no parser can handle it."""
+    for parser in PARSERS:
+        try:
+            data = parser(head, total_size)
+        except (struct.error, IndexError, ValueError, ZeroDivisionError, OverflowError):
+            data = None
+        if data:
+            return data
+    return None
+
+
+# --- ffprobe-shaped result helpers ---
+
+def _format(format_name, format_long_name, streams, total_size=None, duration=None, bit_rate=None, tags=None):
+    fmt = {
+        'filename': 'pipe:',
+        'nb_streams': len(streams),
+        'nb_programs': 0,
+        'format_name': format_name,
+        'format_long_name': format_long_name,
+    }
+    if duration:
+        fmt['duration'] = f'{duration:.6f}'
+    if total_size:
+        fmt['size'] = str(total_size)
+        if duration and not bit_rate:
+            bit_rate = int(total_size * 8 / duration)
+    if bit_rate:
+        fmt['bit_rate'] = str(int(bit_rate))
+    if tags:
+        fmt['tags'] = tags
+    return {'format': fmt, 'streams': streams}
+
+
+def _image(format_name, format_long_name, codec_name, codec_long_name, width, height, total_size, **extra):
+    if not width or not height:
+        return None
+    stream = {
+        'index': 0,
+        'codec_name': codec_name,
+        'codec_long_name': codec_long_name,
+        'codec_type': 'video',
+        'width': width,
+        'height': height,
+        'coded_width': width,
+        'coded_height': height,
+    }
+    stream.update(extra)
+    return _format(format_name, format_long_name, [stream], total_size)
+
+
+def _audio_stream(index, codec_name, codec_long_name, sample_rate, channels, **extra):
+    stream = {
+        'index': index,
+        'codec_name': codec_name,
+        'codec_long_name': codec_long_name,
+        'codec_type': 'audio',
+        'sample_rate': str(int(sample_rate)),
+        'channels': channels,
+    }
+    stream.update({k: v for k, v in extra.items() if v is not None})
+    return stream
+
+
+# --- Images ---
+
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+JPEG_LOSSLESS_MARKERS = {0xC3, 0xC7, 0xCB, 0xCF}
+# Luma sampling relative to chroma (h, v) -> pix_fmt, for 8-bit YCbCr JPEGs
+JPEG_YUV_PIX_FMTS = {
+    (1, 1): 'yuvj444p', (2, 1): 'yuvj422p', (2, 2): 'yuvj420p', (1, 2): 'yuvj440p', (4, 1): 'yuvj411p',
+}
+
+
+def _jpeg_pix_fmt(precision, lossless, components, adobe_transform):
+    """
+    ffprobe's pix_fmt from the SOF components [(id, h, v)], or None. RGB (Adobe
+    transform 0 or R/G/B component ids), CMYK/YCCK and unusual layouts are left out.
+    """
+    if precision != 8 or lossless:
+        return None
+    if len(components) == 1:
+        return 'gray'
+    if len(components) != 3 or adobe_transform == 0 or bytes(c[0] for c in components) == b'RGB':
+        return None
+    (_, y_h, y_v), (_, cb_h, cb_v), (_, cr_h, cr_v) = components
+    if (cb_h, cb_v) != (cr_h, cr_v) or y_h % cb_h or y_v % cb_v:
+        return None
+    return JPEG_YUV_PIX_FMTS.get((y_h // cb_h, y_v // cb_v))
+
+
+def parse_jpeg(head, total_size):
+    if not head.startswith(b'\xff\xd8'):
+        return None
+    pos = 2
+    adobe_transform = None
+    while pos + 4 <= len(head):
+        if head[pos] != 0xFF:
+            return None
+        marker = head[pos + 1]
+        if marker == 0xFF:  # Fill byte
+            pos += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        length = struct.unpack_from('>H', head, pos + 2)[0]
+        if marker == 0xEE and head[pos + 4:pos + 9] == b'Adobe':  # APP14: colour transform of 3/4-component files
+            adobe_transform = head[pos + 15]
+        if marker in JPEG_SOF_MARKERS:
+            precision, height, width, count = struct.unpack_from('>BHHB', head, pos + 4)
+            components = [(head[c], head[c + 1] >> 4, head[c + 1] & 0x0F)
+                          for c in range(pos + 10, pos + 10 + 3 * count, 3)]
+            extra = {}
+            pix_fmt = _jpeg_pix_fmt(precision, marker in JPEG_LOSSLESS_MARKERS, components, adobe_transform)
+            if pix_fmt:
+                extra['pix_fmt'] = pix_fmt
+            return _image('jpeg_pipe', 'piped jpeg sequence', 'mjpeg', 'Motion JPEG', width, height, total_size,
+                          bits_per_raw_sample=str(precision), **extra)
+        if marker == 0xDA:  # Start of scan without a frame header
+            return None
+        pos += 2 + length
+    return None
+
+
+PNG_PIX_FMTS = {
+    (8, 0): 'gray', (16, 0): 'gray16be', (8, 2): 'rgb24', (16, 2): 'rgb48be',
+    (8, 3): 'pal8', (8, 4): 'ya8', (16, 4): 'ya16be', (8, 6): 'rgba', (16, 6): 'rgba64be',
+}
+
+
+def parse_png(head, total_size):
+    if not head.startswith(b'\x89PNG\r\n\x1a\n') or head[12:16] != b'IHDR':
+        return None
+    width, height, bit_depth, color_type = struct.unpack_from('>IIBB', head, 16)
+    extra = {}
+    if (bit_depth, color_type) in PNG_PIX_FMTS:
+        extra['pix_fmt'] = PNG_PIX_FMTS[(bit_depth, color_type)]
+    return _image('png_pipe', 'piped png sequence', 'png', 'PNG (Portable Network Graphics) image',
+                  width, height, total_size, **extra)
+
+
+def parse_gif(head, total_size):
+    if head[:6] not in (b'GIF87a', b'GIF89a'):
+        return None
+    width, height = struct.unpack_from('<HH', head, 6)
+    return _image('gif', 'CompuServe Graphics Interchange Format (GIF)', 'gif',
+                  'CompuServe GIF (Graphics Interchange Format)', width, height, total_size, pix_fmt='bgra')
+
+
+def parse_webp(head, total_size):
+    if head[:4] != b'RIFF' or head[8:12] != b'WEBP':
+        return None
+    chunk = head[12:16]
+    if chunk == b'VP8 ':
+        width, height = struct.unpack_from('<HH', head, 26)
+        width, height = width & 0x3FFF, height & 0x3FFF
+    elif chunk == b'VP8L':
+        if head[20] != 0x2F:
+            return None
+        bits = struct.unpack_from('<I', head, 21)[0]
+        width, height = (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    elif chunk == b'VP8X':
+        width = int.from_bytes(head[24:27], 'little') + 1
+        height = int.from_bytes(head[27:30], 'little') + 1
+    else:
+        return None
+    return _image('webp_pipe', 'piped webp sequence', 'webp', 'WebP', width, height, total_size)
+
+
+def parse_tiff(head, total_size):
+    if head[:4] == b'II*\x00':
+        endian = '<'
+    elif head[:4] == b'MM\x00*':
+        endian = '>'
+    else:
+        return None
+    ifd_offset = struct.unpack_from(endian + 'I', head, 4)[0]
+    entry_count = struct.unpack_from(endian + 'H', head, ifd_offset)[0]
+    size = {}
+    for i in range(entry_count):
+        entry = ifd_offset + 2 + i * 12
+        tag, field_type = struct.unpack_from(endian + 'HH', head, entry)
+        if tag in (256, 257):
+            fmt = 'H' if field_type == 3 else 'I'
+            size[tag] = struct.unpack_from(endian + fmt, head, entry + 8)[0]
+    return _image('tiff_pipe', 'piped tiff sequence', 'tiff', 'TIFF image',
+                  size.get(256), size.get(257), total_size)
+
+
+# --- Audio ---
+
+WAV_CODECS = {
+    (1, 8): ('pcm_u8', 'PCM unsigned 8-bit'),
+    (1, 16): ('pcm_s16le', 'PCM signed 16-bit little-endian'),
+    (1, 24): ('pcm_s24le', 'PCM signed 24-bit little-endian'),
+    (1, 32): ('pcm_s32le', 'PCM signed 32-bit little-endian'),
+    (3, 32): ('pcm_f32le', 'PCM 32-bit floating point little-endian'),
+    (3, 64): ('pcm_f64le', 'PCM 64-bit floating point little-endian'),
+}
+
+
+def parse_wav(head, total_size):
+    if head[:4] != b'RIFF' or head[8:12] != b'WAVE':
+        return None
+    pos = 12
+    fmt = None
+    while pos + 8 <= len(head):
+        chunk_id, chunk_size = struct.unpack_from('<4sI', head, pos)
+        if chunk_id == b'fmt ':
+            fmt = struct.unpack_from('<HHIIHH', head, pos + 8)
+        elif chunk_id == b'data' and fmt:
+            audio_format, channels, sample_rate, byte_rate, block_align, bits = fmt
+            if audio_format == 0xFFFE:  # WAVE_FORMAT_EXTENSIBLE: real format is the GUID's first 2 bytes
+                audio_format = _extensible_format(head)
+            codec = WAV_CODECS.get((audio_format, bits))
+            if codec is None or not byte_rate:
+                return None
+            duration = chunk_size / byte_rate
+            stream = _audio_stream(0, codec[0], codec[1], sample_rate, channels,
+                                   bits_per_sample=bits, bit_rate=str(byte_rate * 8),
+                                   duration=f'{duration:.6f}')
+            return _format('wav', 'WAV / WAVE (Waveform Audio)', [stream], total_size,
+                           duration=duration, bit_rate=byte_rate * 8)
+        pos += 8 + chunk_size + (chunk_size & 1)
+    return None
+
+
+def _extensible_format(head):
+    """Sub-format code of a WAVE_FORMAT_EXTENSIBLE fmt chunk."""
+    pos = 12
+    while pos + 8 <= len(head):
+        chunk_id, chunk_size = struct.unpack_from('<4sI', head, pos)
+        if chunk_id == b'fmt ':
+            return struct.unpack_from('<H', head, pos + 8 + 24)[0]
+        pos += 8 + chunk_size + (chunk_size & 1)
+    return None
+
+
+def _extended_to_float(data):
+    """80-bit IEEE 754 extended precision (AIFF sample rate) to float."""
+    exponent = struct.unpack('>H', data[:2])[0] & 0x7FFF
+    mantissa = struct.unpack('>Q', data[2:10])[0]
+    if exponent == 0 and mantissa == 0:
+        return 0.0
+    return mantissa * 2.0 ** (exponent - 16383 - 63)
+
+
+def parse_aiff(head, total_size):
+    if head[:4] != b'FORM' or head[8:12] not in (b'AIFF', b'AIFC'):
+        return None
+    pos = 12
+    while pos + 8 <= len(head):
+        chunk_id, chunk_size = struct.unpack_from('>4sI', head, pos)
+        if chunk_id == b'COMM':
+            channels, frames, bits = struct.unpack_from('>HIH', head, pos + 8)
+            sample_rate = _extended_to_float(head[pos + 16:pos + 26])
+            compression = head[pos + 26:pos + 30] if head[8:12] == b'AIFC' else b'NONE'
+            if compression not in (b'NONE', b'sowt') or bits not in (8, 16, 24, 32) or not sample_rate:
+                return None
+            endian = 'le' if compression == b'sowt' else 'be'
+            codec_name = 'pcm_s8' if bits == 8 else f'pcm_s{bits}{endian}'
+            long_endian = 'little-endian' if endian == 'le' else 'big-endian'
+            codec_long_name = 'PCM signed 8-bit' if bits == 8 else f'PCM signed {bits}-bit {long_endian}'
+            duration = frames / sample_rate
+            bit_rate = int(sample_rate * channels * bits)
+            stream = _audio_stream(0, codec_name, codec_long_name, sample_rate, channels,
+                                   bits_per_sample=bits, bit_rate=str(bit_rate), duration=f'{duration:.6f}')
+            return _format('aiff', 'Audio IFF', [stream], total_size, duration=duration, bit_rate=bit_rate)
+        pos += 8 + chunk_size + (chunk_size & 1)
+    return None
+
+
+MP3_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],  # MPEG-1 Layer III
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],      # MPEG-2/2.5 Layer III
+}
+MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+MP3_SCAN_BYTES = 4096  # How far past the ID3 tag to look for the first frame
+
+
+def _mp3_frame(head, pos):
+    """Decodes a Layer III frame header at pos -> (frame_len, bitrate, sample_rate, channels, version_bits)."""
+    header = struct.unpack_from('>I', head, pos)[0]
+    if header >> 21 != 0x7FF:
+        return None
+    version_bits = (header >> 19) & 3
+    layer_bits = (header >> 17) & 3
+    bitrate_index = (header >> 12) & 0xF
+    rate_index = (header >> 10) & 3
+    padding = (header >> 9) & 1
+    channel_mode = (header >> 6) & 3
+    if version_bits == 1 or layer_bits != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = MP3_BITRATES[1 if version_bits == 3 else 2][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version_bits][rate_index]
+    frame_len = (144 if version_bits == 3 else 72) * bitrate // sample_rate + padding
+    return frame_len, bitrate, sample_rate, 1 if channel_mode == 3 else 2, version_bits
+
+
+def parse_mp3(head, total_size):
+    start = 0
+    if head[:3] == b'ID3':
+        tag_size = 0
+        for byte in head[6:10]:
+            tag_size = (tag_size << 7) | (byte & 0x7F)
+        start = 10 + tag_size + (10 if head[5] & 0x10 else 0)
+    for pos in range(start, min(start + MP3_SCAN_BYTES, len(head) - 4)):
+        if head[pos] != 0xFF:
+            continue
+        frame = _mp3_frame(head, pos)
+        # Require a second valid frame right after the first to rule out false syncs
+        if frame is None or pos + frame[0] + 4 > len(head) or _mp3_frame(head, pos + frame[0]) is None:
+            continue
+        frame_len, bitrate, sample_rate, channels, version_bits = frame
+
+        duration = None
+        samples_per_frame = 1152 if version_bits == 3 else 576
+        side_info = (32 if channels == 2 else 17) if version_bits == 3 else (17 if channels == 2 else 9)
+        xing = pos + 4 + side_info
+        if head[xing:xing + 4] in (b'Xing', b'Info') and struct.unpack_from('>I', head, xing + 4)[0] & 1:
+            frames = struct.unpack_from('>I', head, xing + 8)[0]
+            duration = frames * samples_per_frame / sample_rate
+        elif total_size:
+            duration = (total_size - pos) * 8 / bitrate  # CBR estimate, like ffprobe without a Xing header
+        stream = _audio_stream(0, 'mp3', 'MP3 (MPEG audio layer 3)', sample_rate, channels,
+                               bit_rate=str(bitrate), duration=f'{duration:.6f}' if duration else None)
+        return _format('mp3', 'MP2/3 (MPEG audio layer 2/3)', [stream], total_size,
+                       duration=duration, bit_rate=bitrate if not duration or not total_size else None)
+    return None
+
+
+# --- ISO-BMFF (MP4/MOV) ---
+
+MP4_CODECS = {
+    b'avc1': ('h264', 'H.264 / AVC / MPEG-4 AVC / MPEG-4 part 10'),
+    b'avc3': ('h264', 'H.264 / AVC / MPEG-4 AVC / MPEG-4 part 10'),
+    b'hvc1': ('hevc', 'H.265 / HEVC (High Efficiency Video Coding)'),
+    b'hev1': ('hevc', 'H.265 / HEVC (High Efficiency Video Coding)'),
+    b'mp4v': ('mpeg4', 'MPEG-4 part 2'),
+    b'av01': ('av1', 'Alliance for Open Media AV1'),
+    b'vp09': ('vp9', 'Google VP9'),
+    b'jpeg': ('mjpeg', 'Motion JPEG'),
+    b'apcn': ('prores', 'Apple ProRes (iCodec Pro)'),
+    b'apch': ('prores', 'Apple ProRes (iCodec Pro)'),
+    b'apcs': ('prores', 'Apple ProRes (iCodec Pro)'),
+    b'apco': ('prores', 'Apple ProRes (iCodec Pro)'),
+    b'ap4h': ('prores', 'Apple ProRes (iCodec Pro)'),
+    b'mp4a': ('aac', 'AAC (Advanced Audio Coding)'),
+    b'ac-3': ('ac3', 'ATSC A/52A (AC-3)'),
+    b'ec-3': ('eac3', 'ATSC A/52B (AC-3, E-AC-3)'),
+    b'alac': ('alac', 'ALAC (Apple Lossless Audio Codec)'),
+    b'Opus': ('opus', 'Opus (Opus Interactive Audio Codec)'),
+    b'samr': ('amr_nb', 'AMR-NB (Adaptive Multi-Rate NarrowBand)'),
+    b'sowt': ('pcm_s16le', 'PCM signed 16-bit little-endian'),
+    b'twos': ('pcm_s16be', 'PCM signed 16-bit big-endian'),
+    b'lpcm': ('pcm_s16le', 'PCM signed 16-bit little-endian'),
+    b'ulaw': ('pcm_mulaw', 'PCM mu-law / G.711 mu-law'),
+}
+
+
+def _child_boxes(buf, start, end):
+    """Yields (type, payload_start, box_end) for boxes in buf[start:end]."""
+    pos = start
+    while pos + 8 <= end:
+        header = IsoBmff.parse_box_header(buf, pos)
+        if header is None:
+            return
+        box_size, box_type, header_size = header
+        box_end = end if box_size is None else pos + box_size
+        if box_end > end:
+            return
+        yield box_type, pos + header_size, box_end
+        pos = box_end
+
+
+def _find_child(buf, start, end, box_type):
+    for found, payload, box_end in _child_boxes(buf, start, end):
+        if found == box_type:
+            return payload, box_end
+    return None
+
+
+def _box_duration(buf, payload):
+    """(timescale, duration) from an mvhd/mdhd payload."""
+    version = buf[payload]
+    if version == 1:
+        timescale, duration = struct.unpack_from('>IQ', buf, payload + 20)
+    else:
+        timescale, duration = struct.unpack_from('>II', buf, payload + 12)
+    return timescale, duration
+
+
+def _parse_trak(buf, start, end, index):
+    mdia = _find_child(buf, start, end, b'mdia')
+    if mdia is None:
+        return None
+    hdlr = _find_child(buf, mdia[0], mdia[1], b'hdlr')
+    mdhd = _find_child(buf, mdia[0], mdia[1], b'mdhd')
+    minf = _find_child(buf, mdia[0], mdia[1], b'minf')
+    if hdlr is None or mdhd is None or minf is None:
+        return None
+    handler = buf[hdlr[0] + 8:hdlr[0] + 12]
+    timescale, duration = _box_duration(buf, mdhd[0])
+
+    stbl = _find_child(buf, minf[0], minf[1], b'stbl')
+    stsd = stbl and _find_child(buf, stbl[0], stbl[1], b'stsd')
+    if not stsd:
+        return None
+    entry = stsd[0] + 8  # Skip version/flags and entry count
+    fourcc = buf[entry + 4:entry + 8]
+    stream = {'index': index, 'codec_tag_string': fourcc.decode('latin-1')}
+    if timescale:
+        stream['time_base'] = f'1/{timescale}'
+        stream['duration_ts'] = duration
+        stream['duration'] = f'{duration / timescale:.6f}'
+
+    if handler == b'vide':
+        codec = MP4_CODECS.get(fourcc)
+        if codec is None:
+            return None
+        width, height = struct.unpack_from('>HH', buf, entry + 32)
+        stream.update({'codec_name': codec[0], 'codec_long_name': codec[1], 'codec_type': 'video',
+                       'width': width, 'height': height, 'coded_width': width, 'coded_height': height})
+    elif handler == b'soun':
+        codec = MP4_CODECS.get(fourcc)
+        if codec is None:
+            return None
+        channels, bits = struct.unpack_from('>HH', buf, entry + 24)
+        sample_rate = struct.unpack_from('>I', buf, entry + 32)[0] >> 16
+        stream.update({'codec_name': codec[0], 'codec_long_name': codec[1], 'codec_type': 'audio',
+                       'sample_rate': str(sample_rate), 'channels': channels})
+        if codec[0].startswith('pcm_'):
+            stream['bits_per_sample'] = bits
+    else:
+        stream['codec_type'] = 'data'
+    return stream
+
+
+def ftyp_box(head):
+    """The leading ftyp box of an ISO-BMFF head, or None."""
+    header = IsoBmff.parse_box_header(head)
+    if header is None or header[1] != b'ftyp' or header[0] is None or header[0] > len(head):
+        return None
+    return head[:header[0]]
+
+
+def parse_moov(moov, total_size=None, ftyp=None):
+    """
+    ffprobe-shaped metadata from a complete moov box (bytes starting at its
+    header), e.g. one fetched from the tail of the file. None if any track
+    uses a codec we don't know.
+    """
+    try:
+        return _parse_moov(moov, total_size, ftyp)
+    except (struct.error, IndexError, ValueError, ZeroDivisionError):
+        return None
+
+
+def _parse_moov(moov, total_size, ftyp):
+    header = IsoBmff.parse_box_header(moov)
+    if header is None or header[1] != b'moov' or (header[0] or len(moov)) > len(moov):
+        return None
+    moov_end = header[0] or len(moov)
+    mvhd = _find_child(moov, header[2], moov_end, b'mvhd')
+    if mvhd is None:
+        return None
+    timescale, duration = _box_duration(moov, mvhd[0])
+
+    streams = []
+    for box_type, payload, box_end in _child_boxes(moov, header[2], moov_end):
+        if box_type == b'trak':
+            stream = _parse_trak(moov, payload, box_end, len(streams))
+            if stream is None:
+                return None  # Unknown codec - let ffprobe decide
+            streams.append(stream)
+    if not any(s['codec_type'] in ('video', 'audio') for s in streams):
+        return None
+
+    tags = None
+    if ftyp and len(ftyp) >= 16:
+        tags = {
+            'major_brand': ftyp[8:12].decode('latin-1'),
+            'minor_version': str(struct.unpack_from('>I', ftyp, 12)[0]),
+            'compatible_brands': ftyp[16:].decode('latin-1'),
+        }
+    return _format('mov,mp4,m4a,3gp,3g2,mj2', 'QuickTime / MOV', streams, total_size,
+                   duration=duration / timescale if timescale else None, tags=tags)
+
+
+def parse_iso_bmff(head, total_size):
+    if not IsoBmff.looks_like_iso_bmff(head):
+        return None
+    moov = IsoBmff.find_top_level_box(head, b'moov', lambda offset, length: b'', total_size)
+    if moov is None or moov[1] is None or moov[0] + moov[1] > len(head):
+        return None  # moov isn't inside the head - the tail-aware probe handles it
+    return _parse_moov(head[moov[0]:moov[0] + moov[1]], total_size, ftyp_box(head))
+
+
+# --- Matroska / WebM ---
+
+MKV_CODECS = {
+    'V_MPEG4/ISO/AVC': ('h264', 'H.264 / AVC / MPEG-4 AVC / MPEG-4 part 10'),
+    'V_MPEGH/ISO/HEVC': ('hevc', 'H.265 / HEVC (High Efficiency Video Coding)'),
+    'V_VP8': ('vp8', 'On2 VP8'),
+    'V_VP9': ('vp9', 'Google VP9'),
+    'V_AV1': ('av1', 'Alliance for Open Media AV1'),
+    'V_MPEG4/ISO/ASP': ('mpeg4', 'MPEG-4 part 2'),
+    'A_AAC': ('aac', 'AAC (Advanced Audio Coding)'),
+    'A_OPUS': ('opus', 'Opus (Opus Interactive Audio Codec)'),
+    'A_VORBIS': ('vorbis', 'Vorbis'),
+    'A_MPEG/L3': ('mp3', 'MP3 (MPEG audio layer 3)'),
+    'A_AC3': ('ac3', 'ATSC A/52A (AC-3)'),
+    'A_EAC3': ('eac3', 'ATSC A/52B (AC-3, E-AC-3)'),
+    'A_FLAC': ('flac', 'FLAC (Free Lossless Audio Codec)'),
+    'A_PCM/INT/LIT': ('pcm_s16le', 'PCM signed 16-bit little-endian'),
+    'S_TEXT/UTF8': ('subrip', 'SubRip subtitle'),
+    'S_TEXT/ASS': ('ass', 'ASS (Advanced SSA) subtitle'),
+}
+MKV_TRACK_TYPES = {1: 'video', 2: 'audio', 17: 'subtitle'}
+EBML_ID, SEGMENT_ID, INFO_ID, TRACKS_ID, CLUSTER_ID = 0x1A45DFA3, 0x18538067, 0x1549A966, 0x1654AE6B, 0x1F43B675
+
+
+def _read_vint(buf, pos, keep_marker):
+    """EBML variable-length integer -> (value, length); value None means 'unknown size'."""
+    first = buf[pos]
+    length = 1
+    while length <= 8 and not first & (0x80 >> (length - 1)):
+        length += 1
+    if length > 8:
+        raise ValueError('bad EBML vint')
+    value = first if keep_marker else first & (0xFF >> length)
+    for byte in buf[pos + 1:pos + length]:
+        value = (value << 8) | byte
+    if len(buf) < pos + length:
+        raise IndexError('truncated EBML vint')
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        value = None
+    return value, length
+
+
+def _ebml_elements(buf, start, end):
+    """Yields (id, data_start, data_end) for EBML elements in buf[start:end]; data_end may pass end."""
+    pos = start
+    while pos < end:
+        element_id, id_len = _read_vint(buf, pos, keep_marker=True)
+        size, size_len = _read_vint(buf, pos + id_len, keep_marker=False)
+        data_start = pos + id_len + size_len
+        data_end = len(buf) if size is None else data_start + size
+        yield element_id, data_start, data_end
+        pos = data_end
+
+
+def _ebml_uint(buf, start, end):
+    return int.from_bytes(buf[start:end], 'big')
+
+
+def _ebml_float(buf, start, end):
+    return struct.unpack('>f' if end - start == 4 else '>d', buf[start:end])[0]
+
+
+def parse_matroska(head, total_size):
+    if head[:4] != b'\x1a\x45\xdf\xa3':
+        return None
+    doc_type = 'matroska'
+    timecode_scale, duration, streams = 1000000, None, None
+    for element_id, data_start, data_end in _ebml_elements(head, 0, len(head)):
+        if element_id == EBML_ID:
+            for child_id, child_start, child_end in _ebml_elements(head, data_start, data_end):
+                if child_id == 0x4282:
+                    doc_type = head[child_start:child_end].decode('ascii', 'replace')
+        elif element_id == SEGMENT_ID:
+            for child_id, child_start, child_end in _ebml_elements(head, data_start, min(data_end, len(head))):
+                if child_id == CLUSTER_ID:
+                    break
+                if child_end > len(head):
+                    continue  # Runs past the head; if it's Tracks we bail out below
+                if child_id == INFO_ID:
+                    for info_id, info_start, info_end in _ebml_elements(head, child_start, child_end):
+                        if info_id == 0x2AD7B1:
+                            timecode_scale = _ebml_uint(head, info_start, info_end)
+                        elif info_id == 0x4489:
+                            duration = _ebml_float(head, info_start, info_end)
+                elif child_id == TRACKS_ID:
+                    streams = _parse_mkv_tracks(head, child_start, child_end)
+            break
+    if not streams:
+        return None
+    seconds = duration * timecode_scale / 1e9 if duration else None
+    return _format('matroska,webm', 'Matroska / WebM', streams, total_size, duration=seconds,
+                   tags={'DOCTYPE': doc_type} if doc_type != 'matroska' else None)
+
+
+def _parse_mkv_tracks(buf, start, end):
+    streams = []
+    for element_id, entry_start, entry_end in _ebml_elements(buf, start, end):
+        if element_id != 0xAE:  # TrackEntry
+            continue
+        track = {}
+        for child_id, child_start, child_end in _ebml_elements(buf, entry_start, entry_end):
+            if child_id == 0x83:
+                track['type'] = _ebml_uint(buf, child_start, child_end)
+            elif child_id == 0x86:
+                track['codec_id'] = buf[child_start:child_end].decode('ascii', 'replace').rstrip('\x00')
+            elif child_id in (0xE0, 0xE1):  # Video / Audio settings
+                for setting_id, setting_start, setting_end in _ebml_elements(buf, child_start, child_end):
+                    if setting_id == 0xB0:
+                        track['width'] = _ebml_uint(buf, setting_start, setting_end)
+                    elif setting_id == 0xBA:
+                        track['height'] = _ebml_uint(buf, setting_start, setting_end)
+                    elif setting_id == 0xB5:
+                        track['sample_rate'] = _ebml_float(buf, setting_start, setting_end)
+                    elif setting_id == 0x9F:
+                        track['channels'] = _ebml_uint(buf, setting_start, setting_end)
+                    elif setting_id == 0x6264:
+                        track['bits'] = _ebml_uint(buf, setting_start, setting_end)
+        codec_type = MKV_TRACK_TYPES.get(track.get('type'))
+        codec = MKV_CODECS.get(track.get('codec_id'))
+        if codec_type is None or codec is None:
+            return None  # Unknown track/codec - let ffprobe decide
+        index = len(streams)
+        if codec_type == 'audio':
+            stream = _audio_stream(index, codec[0], codec[1], track.get('sample_rate', 8000), track.get('channels', 1),
+                                   bits_per_sample=track.get('bits'))
+        else:
+            stream = {'index': index, 'codec_name': codec[0], 'codec_long_name': codec[1], 'codec_type': codec_type}
+            if codec_type == 'video':
+                stream.update({'width': track.get('width'), 'height': track.get('height'),
+                               'coded_width': track.get('width'), 'coded_height': track.get('height')})
+        streams.append(stream)
+    return streams
+
+
+PARSERS = [
+    parse_jpeg, parse_png, parse_gif, parse_webp, parse_tiff,
+    parse_wav, parse_aiff, parse_mp3, parse_iso_bmff, parse_matroska,
+]
+
+
+# --- Magic-byte sniffing ---
+
+MPEG_TS_PACKET = 188
+
+# (offset, magic, MIME type), checked in order
+MAGIC_SIGNATURES = [
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (0, b'II*\x00', 'image/tiff'),
+    (0, b'MM\x00*', 'image/tiff'),
+    (0, b'8BPS', 'image/vnd.adobe.photoshop'),
+    (0, b'\x00\x00\x01\x00', 'image/x-icon'),
+    (0, b'ID3', 'audio/mpeg'),
+    (0, b'OggS', 'audio/ogg'),
+    (0, b'fLaC', 'audio/flac'),
+    (0, b'#!AMR', 'audio/amr'),
+    (0, b'caff', 'audio/x-caf'),
+    (0, b'MThd', 'audio/midi'),
+    (0, b'FLV\x01', 'video/x-flv'),
+    (0, b'\x30\x26\xb2\x75\x8e\x66\xcf\x11', 'video/x-ms-asf'),
+    (0, b'.RMF', 'application/vnd.rn-realmedia'),
+    (0, b'\x00\x00\x01\xba', 'video/mpeg'),
+    (0, b'\x06\x0e\x2b\x34\x02\x05\x01\x01', 'application/mxf'),
+    (0, b'%PDF', 'application/pdf'),
+]
+
+RIFF_TYPES = {b'WAVE': 'audio/wav', b'WEBP': 'image/webp', b'AVI ': 'video/x-msvideo'}
+FORM_TYPES = {b'AIFF': 'audio/aiff', b'AIFC': 'audio/aiff'}
+FTYP_BRANDS = {
+    b'qt  ': 'video/quicktime',
+    b'M4A ': 'audio/mp4', b'M4B ': 'audio/mp4', b'M4P ': 'audio/mp4', b'F4A ': 'audio/mp4',
+    b'heic': 'image/heic', b'heix': 'image/heic', b'mif1': 'image/heif', b'msf1': 'image/heif',
+    b'avif': 'image/avif',
+    b'3gp4': 'video/3gpp', b'3gp5': 'video/3gpp', b'3gp6': 'video/3gpp', b'3g2a': 'video/3gpp2',
+}
+# Containers whose registered MIME type isn't under video/, audio/ or image/
+MEDIA_APPLICATION_TYPES = {'application/mxf', 'application/vnd.rn-realmedia'}
+
+
+def is_media_type(mime_type):
+    """True for video/, audio/ and image/ types and the media containers registered under application/."""
+    mime_type = mime_type.split(';', 1)[0].strip().lower()
+    return mime_type.startswith(('video/', 'audio/', 'image/')) or mime_type in MEDIA_APPLICATION_TYPES
+
+
+def sniff_media_type(head):
+    """MIME type named by the magic bytes at the start of `head`, or None if they're unknown."""
+    if len(head) < 12:
+        return None
+    for offset, magic, mime_type in MAGIC_SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            return mime_type
+    if head[:4] == b'RIFF':
+        return RIFF_TYPES.get(head[8:12])
+    if head[:4] == b'FORM':
+        return FORM_TYPES.get(head[8:12])
+    if head[4:8] == b'ftyp':
+        return FTYP_BRANDS.get(head[8:12], 'video/mp4')
+    if head[:4] == b'\x1a\x45\xdf\xa3':
+        return 'video/webm' if b'webm' in head[:64] else 'video/x-matroska'
+    # MPEG-TS: sync byte every 188 bytes (M2TS adds a 4-byte timestamp before each packet)
+    for start, stride in ((0, MPEG_TS_PACKET), (4, MPEG_TS_PACKET + 4)):
+        if len(head) > start + 2 * stride and all(head[start + i * stride] == 0x47 for i in range(3)):
+            return 'video/mp2t'
+    if head[:2] == b'BM' and head[6:10] == b'\x00\x00\x00\x00':
+        return 'image/bmp'
+    if head[0] == 0xFF and _mp3_frame(head, 0) is not None:
+        return 'audio/mpeg'
+    if head[0] == 0xFF and head[1] & 0xF6 == 0xF0:
+        return 'audio/aac'  # ADTS
+    if head.lstrip()[:1] == b'<':
+        return 'text/html'
+    return None
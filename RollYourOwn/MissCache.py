@@ -0,0 +1,85 @@
+"""
+Persistent cache of negative xTensionProbe results.
+
+Only hits end up in the output CSV, so without this a rerun (or a resume after
+a crash) sends every stem+extension HEAD that already came back 404 or
+non-media again. Misses are appended to a JSON Lines journal as they happen,
+keyed by the probed URL, with the status, Content-Type and time of the check.
+Known misses are skipped on the next run. Misses older than the TTL count as
+unknown and are probed again, unless keep_expired says to skip them too.
+
+Each miss also records the probe mode that judged it. A HEAD miss with status
+200 was judged by its Content-Type only (e.g. a mislabeled video served as
+application/pdf), so sniff mode, which judges by the magic bytes, probes it
+again instead of skipping it.
+"""
+import os
+import threading
+import time
+
+import ResultJournal
+
+# 403/429/5xx can be transient (auth, rate limiting, outages) and are never cached;
+# 206 is a sniff GET whose first bytes weren't media
+CACHEABLE_STATUSES = (200, 206, 404, 410)
+HEAD_MODE = 'head'
+SNIFF_MODE = 'sniff'
+
+
+class MissCache:
+    """
+    Args:
+        path: Journal file the misses are loaded from and appended to
+        ttl_days: Age after which a miss counts as expired (unknown, probed again)
+        keep_expired: Keep skipping expired misses instead of probing them again
+        fsync_every: Appends between fsyncs of the journal
+    """
+
+    def __init__(self, path, ttl_days=30, keep_expired=False, fsync_every=200):
+        self.path = path
+        self.ttl = ttl_days * 24 * 3600
+        self.keep_expired = keep_expired
+        self.lock = threading.Lock()
+        self.entries = ResultJournal.load_journal(path, 'url') if os.path.exists(path) else {}
+        self.journal = ResultJournal.ResultJournal(path, fsync_every=fsync_every)
+        self.skipped = 0
+
+    def _expired(self, entry, now):
+        return now - entry.get('checked_at', 0) > self.ttl
+
+    def expired_count(self):
+        now = time.time()
+        with self.lock:
+            return sum(1 for entry in self.entries.values() if self._expired(entry, now))
+
+    def is_known_miss(self, url, mode=HEAD_MODE):
+        """True if `url` is a cached miss that should be skipped when probing in `mode` (counted in `skipped`)."""
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is None or (not self.keep_expired and self._expired(entry, time.time())):
+                return False
+            if mode == SNIFF_MODE and entry['status'] == 200 and entry.get('mode', HEAD_MODE) == HEAD_MODE:
+                return False  # Non-media by Content-Type only - the bytes may still be media
+            self.skipped += 1
+            return True
+
+    def record(self, url, status, content_type, mode=HEAD_MODE):
+        """Caches a miss found in probe `mode`, unless its status may be transient."""
+        if status not in CACHEABLE_STATUSES:
+            return
+        row = {'url': url, 'status': status, 'content_type': content_type, 'mode': mode, 'checked_at': int(time.time())}
+        with self.lock:
+            self.entries[url] = row
+        self.journal.append(row)
+
+    def discard(self, url):
+        """Forgets a miss that has turned into a hit on a recheck."""
+        with self.lock:
+            self.entries.pop(url, None)
+
+    def close(self):
+        """Rewrites the journal with one line per URL and closes it."""
+        with self.lock:
+            entries = list(self.entries.values())
+        self.journal.compact(entries)
+        self.journal.close()
@@ -0,0 +1,311 @@
+"""
+Optional shared SQLite store for the three stages.
+
+Without it the stages hand off through CSV files: each one re-reads the previous
+stage's file in full and rewrites its own output in full on every save. With it,
+GetURLs, xTensionProbe and GetMetaData read and write one SQLite database (WAL
+mode, so one stage can read while another writes) row by row:
+
+    urls           one row per scraped URL (canonical spelling), with its stem computed once
+    url_aliases    other spellings the same URLs were scraped under
+    probe_results  one row per media find, keyed by stem
+    metadata       one row per validated media URL (the wide row as JSON)
+
+Resuming is an indexed query (stems without a probe result, finds without
+metadata) instead of a scan of the previous CSV. The usual CSV files are still
+written on demand:
+
+    python PipelineStore.py --export
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import CanonicalUrl
+import ResultJournal
+
+STORE_FILE = 'epstein_pipeline.db'
+URLS_CSV = 'epstein_no_images_pdf_urls.csv'
+PROBE_CSV = 'epstein_media_checked_urls.csv'
+METADATA_CSV = 'epstein_full_metadata.csv'
+METADATA_COLUMNS = ['original_url', 'actual_url', 'media_type', 'is_valid', 'validation_method', 'file_size_bytes', 'error']
+PROBE_COLUMNS = ['original_url', 'actual_url', 'media_type', 'size_bytes', 'is_tiny']
+NOT_MEDIA = ('no_media_yet', 'pdf_or_not_found')
+TINY_BYTES = 1024 * 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    stem TEXT NOT NULL,
+    is_pdf INTEGER NOT NULL,
+    added_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS urls_stem ON urls (stem);
+CREATE INDEX IF NOT EXISTS urls_pdf_stem ON urls (is_pdf, stem);
+CREATE TABLE IF NOT EXISTS url_aliases (
+    url TEXT PRIMARY KEY,
+    canonical TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS url_aliases_canonical ON url_aliases (canonical);
+CREATE TABLE IF NOT EXISTS probe_results (
+    stem TEXT PRIMARY KEY,
+    original_url TEXT NOT NULL,
+    actual_url TEXT NOT NULL,
+    media_type TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    probed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS probe_results_actual_url ON probe_results (actual_url);
+CREATE TABLE IF NOT EXISTS metadata (
+    actual_url TEXT PRIMARY KEY,
+    is_valid INTEGER NOT NULL,
+    row TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS metadata_is_valid ON metadata (is_valid);
+"""
+
+
+def url_stem(url):
+    return url.rsplit('.', 1)[0]
+
+
+def is_tiny(size_bytes):
+    return size_bytes != -1 and size_bytes < TINY_BYTES
+
+
+class PipelineStore:
+    """
+    One connection shared by a stage's threads (writes are serialized by a lock).
+    Every write is its own transaction; with WAL and synchronous=NORMAL a commit
+    doesn't fsync, and a crash loses at most the last few rows, never the file.
+    """
+
+    def __init__(self, path=STORE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def _query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def _write(self, sql, rows, *more):
+        """
+        Runs `sql` once per row in one transaction (then each further sql, rows
+        pair in `more`). Returns how many rows the first statement changed.
+        """
+        with self.lock:
+            before = self.conn.total_changes
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.conn.executemany(sql, rows)
+                changed = self.conn.total_changes - before
+                for extra_sql, extra_rows in zip(more[::2], more[1::2]):
+                    self.conn.executemany(extra_sql, extra_rows)
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+            return changed
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # --- GetURLs ---
+    def add_urls(self, urls):
+        """
+        Inserts scraped URLs in their canonical spelling (other spellings go to
+        url_aliases); ones already stored are ignored. Returns how many were new.
+        """
+        now = time.time()
+        spellings = [(url.strip(), CanonicalUrl.canonical_url(url)) for url in urls]
+        return self._write(
+            'INSERT OR IGNORE INTO urls (url, stem, is_pdf, added_at) VALUES (?, ?, ?, ?)',
+            [(canonical, url_stem(canonical), canonical.lower().endswith('.pdf'), now) for _, canonical in spellings],
+            'INSERT OR IGNORE INTO url_aliases (url, canonical) VALUES (?, ?)',
+            [(url, canonical) for url, canonical in spellings if url != canonical])
+
+    def alias_count(self):
+        return self._query('SELECT COUNT(*) FROM url_aliases')[0][0]
+
+    def urls(self):
+        return [url for (url,) in self._query('SELECT url FROM urls ORDER BY url')]
+
+    def url_count(self):
+        return self._query('SELECT COUNT(*) FROM urls')[0][0]
+
+    # --- xTensionProbe ---
+    def pending_stems(self):
+        """{stem: original PDF URL} for the PDF stems that have no probe result yet."""
+        return dict(self._query(
+            'SELECT u.stem, MIN(u.url) FROM urls u LEFT JOIN probe_results p ON p.stem = u.stem '
+            'WHERE u.is_pdf AND p.stem IS NULL GROUP BY u.stem'))
+
+    def pdf_stem_count(self):
+        return self._query('SELECT COUNT(DISTINCT stem) FROM urls WHERE is_pdf')[0][0]
+
+    def add_probe_result(self, stem, original_url, result):
+        self.add_probe_results([(stem, original_url, result)])
+
+    def add_probe_results(self, finds):
+        """finds: (stem, original_url, result) with result as returned by xTensionProbe.probe_stem."""
+        now = time.time()
+        self._write(
+            'INSERT OR REPLACE INTO probe_results (stem, original_url, actual_url, media_type, size_bytes, probed_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            [(stem, original_url, result['actual_url'], result['media_type'], result.get('size_bytes', -1), now)
+             for stem, original_url, result in finds])
+
+    def find_count(self):
+        return self._query('SELECT COUNT(*) FROM probe_results')[0][0]
+
+    def probe_finds(self):
+        """{stem: result} for every media find, the shape xTensionProbe.load_finds returns."""
+        return {stem: {'actual_url': actual_url, 'media_type': media_type, 'size_bytes': size_bytes}
+                for stem, actual_url, media_type, size_bytes in self._query(
+                    'SELECT stem, actual_url, media_type, size_bytes FROM probe_results')}
+
+    # --- GetMetaData ---
+    def _media_rows(self, where=''):
+        rows = self._query(
+            'SELECT p.original_url, p.actual_url, p.media_type, p.size_bytes FROM probe_results p '
+            'LEFT JOIN metadata m ON m.actual_url = p.actual_url ' + where + ' ORDER BY p.original_url')
+        return [{'original_url': original_url, 'actual_url': actual_url, 'media_type': media_type,
+                 'size_bytes': size_bytes, 'is_tiny': is_tiny(size_bytes)}
+                for original_url, actual_url, media_type, size_bytes in rows]
+
+    def media_rows(self):
+        """Every media find, as the rows GetMetaData reads from xTensionProbe's CSV."""
+        return self._media_rows()
+
+    def unvalidated_media(self):
+        return self._media_rows('WHERE m.actual_url IS NULL')
+
+    def invalid_media(self):
+        return self._media_rows('WHERE m.is_valid = 0')
+
+    def put_metadata(self, row):
+        """Stores one validated row (the wide dict GetMetaData writes to its CSV); a rescan replaces it."""
+        self.put_metadata_rows([row])
+
+    def put_metadata_rows(self, rows):
+        now = time.time()
+        self._write(
+            'INSERT OR REPLACE INTO metadata (actual_url, is_valid, row, updated_at) VALUES (?, ?, ?, ?)',
+            [(row['actual_url'], bool(row.get('is_valid')), json.dumps(row, ensure_ascii=False, default=str), now)
+             for row in rows])
+
+    def has_metadata(self, actual_url):
+        return bool(self._query('SELECT 1 FROM metadata WHERE actual_url = ?', (actual_url,)))
+
+    def metadata_rows(self):
+        return [json.loads(row) for (row,) in self._query('SELECT row FROM metadata ORDER BY actual_url')]
+
+    def metadata_counts(self):
+        """(valid, invalid) validated URLs."""
+        valid, total = self._query('SELECT COALESCE(SUM(is_valid), 0), COUNT(*) FROM metadata')[0]
+        return valid, total - valid
+
+    # --- CSV handoff files ---
+    def import_urls_csv(self, path=URLS_CSV):
+        """Seeds the urls table from GetURLs' CSV (first run with the store). Returns how many were new."""
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            return self.add_urls([row[0].strip() for row in reader if row and row[0].strip()])
+
+    def import_probe_csv(self, path=PROBE_CSV):
+        """Seeds the urls and probe_results tables from xTensionProbe's CSV. Returns how many finds it had."""
+        urls, finds = [], []
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                urls.append(row['original_url'])
+                if row['media_type'] not in NOT_MEDIA:
+                    size_bytes = int(row['size_bytes']) if row.get('size_bytes', '').lstrip('-').isdigit() else -1
+                    original_url = CanonicalUrl.canonical_url(row['original_url'])
+                    finds.append((url_stem(original_url), original_url,
+                                  {'actual_url': CanonicalUrl.canonical_url(row['actual_url']), 'media_type': row['media_type'], 'size_bytes': size_bytes}))
+        self.add_urls(urls)
+        self.add_probe_results(finds)
+        return len({stem for stem, _, _ in finds})
+
+    def import_journal(self, path):
+        """Seeds the metadata table from GetMetaData's journal, keyed by canonical actual_url. Returns how many results it had."""
+        rows = {}
+        for row in ResultJournal.load_journal(path, 'actual_url').values():
+            actual_url = CanonicalUrl.canonical_url(row['actual_url'])
+            rows[actual_url] = {**row, 'actual_url': actual_url}
+        self.put_metadata_rows(rows.values())
+        return len(rows)
+
+    def export_urls_csv(self, path=URLS_CSV):
+        temp_file = path + '.tmp'
+        with open(temp_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["URL"])
+            for url in self.urls():
+                writer.writerow([url])
+        os.replace(temp_file, path)
+
+    def export_probe_csv(self, path=PROBE_CSV):
+        """Same rows as xTensionProbe's save_progress: every scraped URL, finds filled in."""
+        rows = self._query(
+            'SELECT u.url, p.actual_url, p.media_type, p.size_bytes FROM urls u '
+            'LEFT JOIN probe_results p ON p.stem = u.stem ORDER BY u.url')
+        temp_file = path + '.tmp'
+        with open(temp_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(PROBE_COLUMNS)
+            for url, actual_url, media_type, size_bytes in rows:
+                if actual_url is None:
+                    writer.writerow([url, url, 'no_media_yet', -1, False])
+                else:
+                    writer.writerow([url, actual_url, media_type, size_bytes, is_tiny(size_bytes)])
+        os.replace(temp_file, path)
+
+    def export_metadata_csv(self, path=METADATA_CSV, preferred_order=METADATA_COLUMNS):
+        rows = self.metadata_rows()
+        if rows:
+            ResultJournal.export_csv(rows, path, preferred_order=preferred_order)
+        return rows
+
+
+def open_store(path=STORE_FILE):
+    store = PipelineStore(path)
+    print(f"🗃️  Pipeline store {path}: {store.url_count()} URLs ({store.alias_count()} duplicate spellings), {store.find_count()} media finds, "
+          f"{sum(store.metadata_counts())} validated")
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Writes the pipeline's CSV files from the shared SQLite store.")
+    parser.add_argument('--export', action='store_true', help="Export all three CSV files")
+    parser.add_argument('--store', default=STORE_FILE, help="SQLite store file")
+    args = parser.parse_args()
+    if not args.export:
+        parser.print_help()
+        return
+    if not os.path.exists(args.store):
+        print(f"❌ Error: {args.store} not found. Nothing to export.")
+        exit(1)
+    store = PipelineStore(args.store)
+    store.export_urls_csv()
+    print(f"💾 Exported {store.url_count()} URLs to {URLS_CSV}")
+    store.export_probe_csv()
+    print(f"💾 Exported {store.find_count()} media finds to {PROBE_CSV}")
+    rows = store.export_metadata_csv()
+    print(f"💾 Exported {len(rows)} validated URLs to {METADATA_CSV}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
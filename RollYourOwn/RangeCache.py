@@ -0,0 +1,270 @@
+"""
+Persistent on-disk byte-range cache shared by GetMetaData runs and scan modes.
+
+Every URL gets one sparse data file holding whatever byte ranges have been
+fetched so far, plus an entry in index.json recording those ranges, the total
+file size (when known) and when the entry was last used. The cache is capped
+at max_bytes of cached data; least recently used URLs are evicted first.
+Cached bytes are read back through mmap, so they can be fed to ffprobe
+straight from disk.
+"""
+import collections
+import hashlib
+import json
+import mmap
+import os
+import threading
+import time
+
+INDEX_FILE = 'index.json'
+INDEX_SAVE_INTERVAL = 10  # Seconds between index writes while the cache is busy
+MAX_OPEN_FILES = 32  # Data files kept open for writing between chunks
+
+
+def merge_ranges(ranges):
+    """Sorts and merges overlapping/adjacent half-open [start, end) ranges."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+class DataFile:
+    """A data file kept open for writing; writes and close() are serialised."""
+    def __init__(self, path, truncate):
+        self.file = open(path, 'wb' if truncate or not os.path.exists(path) else 'r+b', buffering=0)
+        self.lock = threading.Lock()
+
+    def write(self, offset, data):
+        """Writes data at offset. Returns False if the file was closed in the meantime."""
+        with self.lock:
+            if self.file.closed:
+                return False
+            self.file.seek(offset)
+            self.file.write(data)
+            return True
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class RangeCache:
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.files = collections.OrderedDict()  # {key: DataFile} open for writing, least recently used first
+        self.dirty = False
+        self.last_save = 0.0
+        os.makedirs(cache_dir, exist_ok=True)
+
+        index_path = os.path.join(cache_dir, INDEX_FILE)
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Range cache index unreadable ({e}) - starting with an empty cache")
+                self.entries = {}
+        # Drop entries whose data file has gone missing or is shorter than the ranges recorded
+        for key in [k for k in self.entries if not self._file_covers(k)]:
+            del self.entries[key]
+        self.total_bytes = sum(self._entry_bytes(entry) for entry in self.entries.values())
+
+    @staticmethod
+    def _key(url):
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def _data_path(self, key):
+        return os.path.join(self.cache_dir, key + '.bin')
+
+    def _file_covers(self, key):
+        ranges = self.entries[key]['ranges']
+        try:
+            return os.path.getsize(self._data_path(key)) >= (ranges[-1][1] if ranges else 0)
+        except OSError:
+            return False
+
+    def _entry(self, url, create=False):
+        key = self._key(url)
+        entry = self.entries.get(key)
+        if entry is None and create:
+            entry = {'url': url, 'ranges': [], 'total_size': None, 'last_used': time.time()}
+            self.entries[key] = entry
+        return key, entry
+
+    @staticmethod
+    def _entry_bytes(entry):
+        return sum(end - start for start, end in entry['ranges'])
+
+    def total_size(self, url):
+        """Total file size recorded for url, or None."""
+        with self.lock:
+            _, entry = self._entry(url)
+            return entry['total_size'] if entry else None
+
+    def set_total_size(self, url, total_size):
+        with self.lock:
+            _, entry = self._entry(url, create=True)
+            if entry['total_size'] != total_size:
+                entry['total_size'] = total_size
+                self.dirty = True
+
+    def plan(self, url, start, end):
+        """
+        Splits [start, end) into consecutive (seg_start, seg_end, is_cached) segments,
+        so the caller only goes to the network for the segments that aren't cached.
+        """
+        with self.lock:
+            _, entry = self._entry(url)
+            ranges = entry['ranges'] if entry else []
+            if entry:
+                entry['last_used'] = time.time()
+                self.dirty = True
+
+        segments = []
+        pos = start
+        for r_start, r_end in ranges:
+            if r_end <= pos:
+                continue
+            if r_start >= end:
+                break
+            if r_start > pos:
+                segments.append((pos, r_start, False))
+            segments.append((max(pos, r_start), min(r_end, end), True))
+            pos = min(r_end, end)
+            if pos >= end:
+                break
+        if pos < end:
+            segments.append((pos, end, False))
+        return segments
+
+    def _open_file(self, key, truncate):
+        """The open DataFile for key, opening it if needed. Caller holds the lock."""
+        data_file = self.files.pop(key, None)
+        if data_file is None:
+            data_file = DataFile(self._data_path(key), truncate)
+        self.files[key] = data_file
+        while len(self.files) > MAX_OPEN_FILES:
+            self.files.popitem(last=False)[1].close()
+        return data_file
+
+    def _close_file(self, key):
+        """Closes key's data file if it is open. Caller holds the lock."""
+        data_file = self.files.pop(key, None)
+        if data_file is not None:
+            data_file.close()
+
+    def write(self, url, offset, data):
+        """
+        Stores data at offset in url's sparse file and records the range. The data
+        file stays open between chunks and is written outside the cache lock.
+        """
+        if not data:
+            return
+        while True:
+            with self.lock:
+                key, entry = self._entry(url)
+                new = entry is None
+                if new:
+                    key, entry = self._entry(url, create=True)
+                data_file = self._open_file(key, truncate=new)  # A new entry's file may hold stale bytes
+            if data_file.write(offset, data):
+                break
+            # Closed by eviction or to free a handle since - reopen and try again
+
+        with self.lock:
+            if self.entries.get(key) is not entry:
+                return  # Evicted while the chunk was written
+            old_bytes = self._entry_bytes(entry)
+            entry['ranges'] = merge_ranges(entry['ranges'] + [[offset, offset + len(data)]])
+            self.total_bytes += self._entry_bytes(entry) - old_bytes
+            entry['last_used'] = time.time()
+            self.dirty = True
+            evicted = self._evict(keep=key)
+        if evicted:
+            self.save()  # The index must not list data files that are gone
+        else:
+            self.maybe_save()
+
+    def read_chunks(self, url, start, end, chunk_size):
+        """
+        Memory-maps url's data file and returns an iterator over cached bytes [start, end).
+        Raises OSError right away if the entry has been evicted in the meantime, or if
+        the file is shorter than the index says (the entry is dropped then).
+        """
+        key = self._key(url)
+        with open(self._data_path(key), 'rb') as f:
+            if os.fstat(f.fileno()).st_size < end:
+                self._drop(key)
+                raise OSError(f"Range cache file for {url} is shorter than its index entry")
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._iter_mapped(mapped, start, end, chunk_size)
+
+    @staticmethod
+    def _iter_mapped(mapped, start, end, chunk_size):
+        with mapped:
+            for pos in range(start, end, chunk_size):
+                yield mapped[pos:min(pos + chunk_size, end)]
+
+    def _drop(self, key):
+        """Forgets key's entry and deletes its data file."""
+        with self.lock:
+            self._remove(key)
+        self.save()
+
+    def _remove(self, key):
+        """Removes key's entry and data file. Caller holds the lock."""
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.total_bytes -= self._entry_bytes(entry)
+        self.dirty = True
+        self._close_file(key)
+        try:
+            os.remove(self._data_path(key))
+        except OSError:
+            pass
+
+    def _evict(self, keep=None):
+        """
+        Removes least recently used entries until the cache fits max_bytes. Caller
+        holds the lock. Returns whether anything was evicted.
+        """
+        evicted = False
+        for key in sorted(self.entries, key=lambda k: self.entries[k]['last_used']):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if key != keep:
+                self._remove(key)
+                evicted = True
+        return evicted
+
+    def maybe_save(self):
+        if self.dirty and time.time() - self.last_save >= INDEX_SAVE_INTERVAL:
+            self.save()
+
+    def save(self):
+        """Atomically writes index.json."""
+        with self.lock:
+            if not self.dirty:
+                return
+            index_path = os.path.join(self.cache_dir, INDEX_FILE)
+            temp_file = index_path + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f)
+            os.replace(temp_file, index_path)
+            self.dirty = False
+            self.last_save = time.time()
+
+    def close(self):
+        """Saves the index and closes the open data files."""
+        self.save()
+        with self.lock:
+            for key in list(self.files):
+                self._close_file(key)
@@ -0,0 +1,115 @@
+"""
+Adaptive request rate governor shared by xTensionProbe and GetMetaData.
+
+One token bucket paces every request in the process. Its rate is tuned AIMD
+style: each healthy response nudges the rate up additively, while 401/403/429
+responses, connection errors and slow responses cut it multiplicatively (at
+most once per cooldown, so one burst of failures counts as one signal).
+We run as fast as the server tolerates and back off on our own, instead of
+sleeping a fixed random time around every request.
+
+Use the module-level `governor` so all tools in a process share one bucket.
+"""
+import asyncio
+import threading
+import time
+
+THROTTLE_STATUSES = (401, 403, 429)
+
+
+class RateGovernor:
+    def __init__(self, initial_rate=5.0, min_rate=0.2, max_rate=100.0,
+                 increase=0.5, decrease=0.5, latency_target=5.0, cooldown=2.0):
+        """
+        Args:
+            initial_rate: Starting requests/second
+            min_rate, max_rate: Bounds for the adaptive rate
+            increase: Rate gained per second of healthy traffic (additive increase)
+            decrease: Factor applied on a throttle signal (multiplicative decrease)
+            latency_target: Responses slower than this (seconds) count as mild congestion
+            cooldown: Minimum seconds between two rate cuts
+        """
+        self.lock = threading.Lock()
+        self.configure(initial_rate, min_rate, max_rate, increase, decrease, latency_target, cooldown)
+
+    def configure(self, initial_rate=None, min_rate=None, max_rate=None, increase=None,
+                  decrease=None, latency_target=None, cooldown=None):
+        """Updates any of the constructor settings; the bucket is reset."""
+        with self.lock:
+            for name, value in (('min_rate', min_rate), ('max_rate', max_rate), ('increase', increase),
+                                ('decrease', decrease), ('latency_target', latency_target), ('cooldown', cooldown)):
+                if value is not None:
+                    setattr(self, name, value)
+            if initial_rate is not None:
+                self.rate = initial_rate
+            self.rate = min(max(self.rate, self.min_rate), self.max_rate)
+            self.tokens = 1.0
+            self.last_refill = time.monotonic()
+            self.paused_until = 0.0
+            self.last_cut = 0.0
+
+    def _reserve(self):
+        """Takes one token (possibly going into debt) and returns how long to wait for it."""
+        with self.lock:
+            now = time.monotonic()
+            burst = max(1.0, self.rate)
+            self.tokens = min(burst, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def acquire(self):
+        """Blocks the calling thread until a request may be sent."""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Waits (without blocking the event loop) until a request may be sent."""
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def record(self, status, latency=None, retry_after=None):
+        """
+        Feeds one outcome back into the rate.
+
+        Args:
+            status: HTTP status code, or None for a connection error/timeout
+            latency: Seconds until the response headers arrived
+            retry_after: Retry-After seconds from a 429, if the server sent one
+        """
+        with self.lock:
+            now = time.monotonic()
+            if status is None or status in THROTTLE_STATUSES:
+                if retry_after:
+                    self.paused_until = max(self.paused_until, now + retry_after)
+                self._cut(now, self.decrease, status)
+            elif latency is not None and latency > self.latency_target:
+                self._cut(now, (1 + self.decrease) / 2, f'slow {latency:.1f}s')
+            else:
+                # ~`increase` req/s gained per second when running at the current rate
+                self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def _cut(self, now, factor, reason):
+        if now - self.last_cut < self.cooldown:
+            return
+        self.last_cut = now
+        new_rate = max(self.min_rate, self.rate * factor)
+        if new_rate < self.rate:
+            print(f"🐢 Request rate {self.rate:.1f} → {new_rate:.1f}/s ({reason or 'connection error'})")
+        self.rate = new_rate
+
+
+def parse_retry_after(headers):
+    """Retry-After header in seconds (numeric form only), or None."""
+    value = headers.get('Retry-After', '')
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+# Shared by every tool running in this process
+governor = RateGovernor()
@@ -0,0 +1,143 @@
+"""
+Append-only, crash-safe result journal (JSON Lines).
+
+Each result is appended as one JSON object per line and fsync'd in batches, so
+saving progress costs O(1) per result instead of rewriting the whole output.
+When the same key appears more than once (e.g. a rescan), the last line wins.
+Wide CSV / typed Parquet files are produced from the journal in a separate
+export step.
+"""
+import csv
+import json
+import os
+import threading
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+class ResultJournal:
+    def __init__(self, path, fsync_every=50):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.lock = threading.Lock()
+        self.pending = 0
+        # A crash can leave a torn last line - start the next record on a fresh line
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b'\n'
+            if needs_newline:
+                with open(path, 'a', encoding='utf-8') as f:
+                    f.write('\n')
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def append(self, row):
+        """Appends one result; fsyncs every `fsync_every` appends."""
+        line = json.dumps(row, ensure_ascii=False, default=str)
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+            self.pending += 1
+            if self.pending >= self.fsync_every:
+                os.fsync(self.file.fileno())
+                self.pending = 0
+
+    def sync(self):
+        with self.lock:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending = 0
+
+    def close(self):
+        self.sync()
+        self.file.close()
+
+    def compact(self, rows):
+        """Atomically rewrites the journal so it holds exactly `rows` (one line per key)."""
+        with self.lock:
+            self.file.close()
+            temp_file = self.path + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False, default=str) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file, self.path)
+            self.file = open(self.path, 'a', encoding='utf-8')
+            self.pending = 0
+
+
+def load_journal(path, key):
+    """
+    Reads a journal into {row[key]: row}, last line per key winning.
+    A torn final line from a crash is skipped.
+    """
+    rows = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                print(f"⚠️  Skipping unreadable journal line {line_no} in {path}")
+                continue
+            if row.get(key):
+                rows[row[key]] = row
+    return rows
+
+
+def export_csv(rows, file_path, preferred_order=()):
+    """Writes rows as one wide CSV with the union of all keys as headers (atomically)."""
+    all_headers = set()
+    for row in rows:
+        all_headers.update(row.keys())
+    preferred_order = list(preferred_order)
+    sorted_headers = sorted(all_headers, key=lambda h: (preferred_order.index(h) if h in preferred_order else len(preferred_order), h))
+
+    temp_file = file_path + '.tmp'
+    with open(temp_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=sorted_headers, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(temp_file, file_path)
+
+
+def _typed_column(values):
+    """
+    Picks a Parquet type for one column and converts the values to it.
+    ffprobe reports many numbers as strings ("duration": "12.5") and CSV-seeded
+    rows are all strings, so numeric/boolean text is converted as well.
+    """
+    present = [v for v in values if v is not None and v != '']
+    if present and all(isinstance(v, bool) or v in ('True', 'False') for v in present):
+        return pyarrow.bool_(), [None if v is None or v == '' else v in (True, 'True') for v in values]
+    for column_type, parse in ((pyarrow.int64(), int), (pyarrow.float64(), float)):
+        try:
+            converted = [None if v is None or v == '' else parse(v) for v in values]
+        except (TypeError, ValueError):
+            continue
+        if present and not any(isinstance(v, bool) for v in present) \
+                and (parse is float or all(isinstance(v, int) or str(v).lstrip('-').isdigit() for v in present)):
+            return column_type, converted
+    return pyarrow.string(), [None if v is None else str(v) for v in values]
+
+
+def export_parquet(rows, file_path):
+    """
+    Writes rows as a typed Parquet file (needs pyarrow). Columns whose values are
+    all booleans/integers/numbers get that type; anything mixed is stored as text.
+    """
+    if pyarrow is None:
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+    all_headers = sorted({h for row in rows for h in row})
+    columns = {}
+    for header in all_headers:
+        column_type, values = _typed_column([row.get(header) for row in rows])
+        columns[header] = pyarrow.array(values, type=column_type)
+    pyarrow.parquet.write_table(pyarrow.table(columns), file_path)
@@ -0,0 +1,221 @@
+"""
+Streaming end-to-end mode: GetURLs, xTensionProbe and GetMetaData at once.
+
+Normally each script waits for the previous one's output file. Here every URL
+the scraper finds goes straight to xTensionProbe's probe_stem, and every media
+find straight to GetMetaData's validate_url_entry:
+
+    scraper --submit()--> [stems] --> probe threads --finds--> [media] --> validation threads
+
+Both queues are bounded, so a slow stage holds back the one in front of it
+instead of piling up work in memory. All stages share one requests session
+(the scraper's browser cookies) and the one adaptive rate governor. Results
+are saved where the scripts save them (xTensionProbe's CSV and GetMetaData's
+journal, or the shared SQLite store), so either script can still resume or
+rescan them on its own later.
+"""
+import os
+import queue
+import threading
+import time
+
+import CanonicalUrl
+import ExtensionStats
+import GetMetaData
+import MissCache
+import ResultJournal
+import xTensionProbe
+
+DEFAULT_EXTENSIONS = ['.mp4', '.mov', '.jpg', '.jpeg', '.png', '.mp3']  # xTensionProbe's default selection
+SAVE_EVERY = 250  # Stems probed between saves of the probe CSV (as in xTensionProbe)
+
+
+class StreamingPipeline:
+    """
+    Args:
+        session: requests.Session shared by every stage (pooled for all their threads)
+        extensions: Extensions to probe; the original .pdf is always tried last (mislabeled media)
+        scan_mode: GetMetaData scan mode for the finds ('fast', 'full', 'two-pass', ...)
+        probe_workers: Threads running xTensionProbe.probe_stem
+        validate_workers: Threads running GetMetaData.validate_url_entry
+        queue_depth: Max stems / finds waiting for each stage
+        store: PipelineStore to read and write instead of the CSV and journal files
+    """
+
+    def __init__(self, session, extensions=DEFAULT_EXTENSIONS, scan_mode='fast', probe_workers=5,
+                 validate_workers=4, queue_depth=200, store=None):
+        self.session = session
+        self.extensions = [ext for ext in extensions if ext != '.pdf'] + ['.pdf']
+        self.scan_mode = scan_mode
+        self.store = store
+        self.stems = queue.Queue(maxsize=queue_depth)
+        self.media = queue.Queue(maxsize=queue_depth)
+        self.lock = threading.Lock()
+        self.probe_threads = [threading.Thread(target=self._probe_worker, daemon=True) for _ in range(probe_workers)]
+        self.validate_threads = [threading.Thread(target=self._validate_worker, daemon=True) for _ in range(validate_workers)]
+        self.feeder = None
+        self.urls = {}  # {canonical URL: URL} rows of the probe CSV: earlier runs' plus every URL submitted
+        self.seen = set()  # PDF stems already queued (or done) this run
+        self.finds = {}  # {stem: result}, earlier runs included
+        self.results = {}  # {actual_url: metadata row} (CSV/journal mode only)
+        self.journal = None
+        self.probed = self.found = self.validated = self.valid = 0
+        self.started = None
+        self.first_result = None
+
+    def start(self, backlog=()):
+        """
+        Loads what earlier runs found and validated, then starts the stages.
+        `backlog` (URLs scraped by earlier runs) is submitted from a background
+        thread, so the scraper doesn't wait for it.
+        """
+        if self.store is not None:
+            self.finds = self.store.probe_finds()
+        else:
+            self.finds = xTensionProbe.load_finds(xTensionProbe.OUTPUT_CSV)
+            if os.path.exists(xTensionProbe.OUTPUT_CSV):
+                # Kept in the CSV while the backlog of the same URLs is still being submitted
+                self.urls = {CanonicalUrl.canonical_url(url): url for url in xTensionProbe.load_urls(xTensionProbe.OUTPUT_CSV)}
+            if os.path.exists(GetMetaData.JOURNAL_FILE):
+                self.results = {CanonicalUrl.canonical_url(url): row for url, row in
+                                ResultJournal.load_journal(GetMetaData.JOURNAL_FILE, 'actual_url').items()}
+            self.journal = ResultJournal.ResultJournal(GetMetaData.JOURNAL_FILE, fsync_every=GetMetaData.SAVE_BATCH_SIZE)
+        if xTensionProbe.LEARN_EXTENSION_ORDER:
+            xTensionProbe.extension_stats = ExtensionStats.ExtensionStats(xTensionProbe.EXTENSION_STATS_FILE, xTensionProbe.BUCKET_BY_PATH)
+        if xTensionProbe.USE_MISS_CACHE:
+            xTensionProbe.miss_cache = MissCache.MissCache(xTensionProbe.MISS_CACHE_FILE, xTensionProbe.MISS_CACHE_TTL_DAYS,
+                                                          xTensionProbe.KEEP_EXPIRED_MISSES)
+        print(f"🔀 Pipeline: {len(self.finds)} earlier media finds; probing {', '.join(self.extensions)} "
+              f"with {len(self.probe_threads)} threads, validating ({self.scan_mode}) with {len(self.validate_threads)}")
+
+        self.started = time.monotonic()
+        for thread in self.probe_threads + self.validate_threads:
+            thread.start()
+        if backlog:
+            self.feeder = threading.Thread(target=self.submit, args=(list(backlog),), daemon=True)
+            self.feeder.start()
+
+    def submit(self, urls):
+        """
+        Queues scraped URLs. Stems already queued are skipped; stems found by an
+        earlier run go straight to validation unless they were validated too.
+        Blocks while the probe queue is full.
+        """
+        for url in urls:
+            with self.lock:
+                self.urls.setdefault(CanonicalUrl.canonical_url(url), url)
+            if not url.lower().endswith('.pdf'):
+                continue
+            stem = url.rsplit('.', 1)[0]
+            with self.lock:
+                if stem in self.seen:
+                    continue
+                self.seen.add(stem)
+                find = self.finds.get(stem)
+            if find is None:
+                self.stems.put((stem, url))
+            elif not self._is_validated(find['actual_url']):
+                self.media.put(self._media_row(url, find))
+
+    def _is_validated(self, actual_url):
+        if self.store is not None:
+            return self.store.has_metadata(actual_url)
+        with self.lock:
+            return CanonicalUrl.canonical_url(actual_url) in self.results
+
+    @staticmethod
+    def _media_row(original_url, result):
+        """The row GetMetaData would read from xTensionProbe's CSV."""
+        size = result.get('size_bytes', -1)
+        return {
+            'original_url': original_url,
+            'actual_url': result['actual_url'],
+            'media_type': result['media_type'],
+            'size_bytes': size,
+            'is_tiny': size < (1024 * 100) if size != -1 else False,
+        }
+
+    def _probe_worker(self):
+        while True:
+            item = self.stems.get()
+            if item is None:
+                return
+            stem, url = item
+            try:
+                hit = xTensionProbe.probe_stem(stem, self.extensions, self.session)
+            except Exception as e:
+                print(f"⚠️  Probe failed for {os.path.basename(stem)}: {e}")
+                hit = None
+            with self.lock:
+                self.probed += 1
+                if hit:
+                    self.found += 1
+                    self.finds[stem] = hit[1]
+                save_now = self.store is None and self.probed % SAVE_EVERY == 0
+            if xTensionProbe.extension_stats is not None:
+                xTensionProbe.extension_stats.maybe_save()
+            if hit:
+                ext, result = hit
+                print(f"{'MISLabeled' if ext == '.pdf' else 'FOUND'}: {os.path.basename(stem)}{ext} → {result['media_type']}")
+                if self.store is not None:
+                    self.store.add_probe_result(stem, url, result)
+                self.media.put(self._media_row(url, result))
+            if save_now:
+                self._save_probe_csv()
+
+    def _validate_worker(self):
+        while True:
+            row = self.media.get()
+            if row is None:
+                return
+            try:
+                metadata = GetMetaData.validate_url_entry(row['actual_url'], self.session, self.scan_mode)
+            except Exception as e:
+                metadata = {'is_valid': False, 'error': f'pipeline_error: {e}'}
+            full_row_data = {**row, **metadata}
+            if self.store is not None:
+                self.store.put_metadata(full_row_data)
+            else:
+                self.journal.append(full_row_data)
+            with self.lock:
+                if self.store is None:
+                    self.results[CanonicalUrl.canonical_url(row['actual_url'])] = full_row_data
+                self.validated += 1
+                self.valid += bool(metadata.get('is_valid'))
+                if self.first_result is None:
+                    self.first_result = time.monotonic() - self.started
+            print(f"{'✅' if metadata.get('is_valid') else '❌'} {os.path.basename(row['actual_url'])}")
+
+    def _save_probe_csv(self):
+        with self.lock:
+            urls, finds = list(self.urls.values()), dict(self.finds)
+        xTensionProbe.save_progress(urls, finds, xTensionProbe.OUTPUT_CSV)
+
+    def finish(self):
+        """Waits for every queued stem and find to be done, then saves the outputs."""
+        if self.feeder is not None:
+            self.feeder.join()
+        for _ in self.probe_threads:
+            self.stems.put(None)
+        for thread in self.probe_threads:
+            thread.join()
+        for _ in self.validate_threads:
+            self.media.put(None)
+        for thread in self.validate_threads:
+            thread.join()
+
+        if self.store is None:
+            self._save_probe_csv()
+            # Rescans append a new line per URL - keep only the latest result for each
+            self.journal.compact(self.results.values())
+            self.journal.close()
+            GetMetaData.save_results_to_csv(list(self.results.values()), GetMetaData.OUTPUT_CSV)
+        if xTensionProbe.extension_stats is not None:
+            xTensionProbe.extension_stats.save()
+        if xTensionProbe.miss_cache is not None:
+            xTensionProbe.miss_cache.close()
+
+        elapsed = time.monotonic() - self.started
+        first = f", first result after {self.first_result:.1f}s" if self.first_result is not None else ""
+        print(f"🔀 Pipeline: {self.probed} stems probed → {self.found} media finds → {self.validated} validated "
+              f"({self.valid} valid) in {elapsed:.1f}s{first}")
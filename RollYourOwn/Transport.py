@@ -0,0 +1,246 @@
+"""
+HTTP transport for the requests.Session shared by xTensionProbe and GetMetaData.
+
+requests' default adapter keeps at most 10 connections per host. With more
+worker threads than that, connections are thrown away after use and the next
+request pays for a new TCP + TLS handshake. configure_session() sizes the pool
+to the worker count, or routes the session over HTTP/2 through httpx so every
+thread multiplexes its HEADs and range GETs over a few long-lived connections.
+The call sites keep using session.head()/session.get() either way.
+
+The module-level `stats` counts requests and newly opened connections for
+both adapters and the asyncio engine, so each run can report its
+connection reuse rate.
+
+HTTP/2 needs httpx with h2 (pip install 'httpx[http2]'). It is only
+negotiated over https - plain http URLs stay on HTTP/1.1.
+"""
+import http.client
+import importlib.util
+import os
+import ssl
+import threading
+import types
+
+import requests
+import urllib3
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.cookies import extract_cookies_to_jar
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers, select_proxy
+
+httpx = None  # Imported by the first Http2Adapter
+
+
+def is_http2_available():
+    return all(importlib.util.find_spec(name) is not None for name in ('httpx', 'h2'))
+
+
+class ConnectionStats:
+    """Thread-safe counts of requests sent and connections opened."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+
+    def record_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def record_connection(self):
+        with self.lock:
+            self.connections += 1
+
+    def reuse_rate(self):
+        """Share of requests sent over an already open connection, or None before any request."""
+        with self.lock:
+            if not self.requests:
+                return None
+            return max(0.0, 1 - self.connections / self.requests)
+
+    def summary(self):
+        rate = self.reuse_rate()
+        if rate is None:
+            return "Connection reuse: no requests sent"
+        return f"Connection reuse: {rate:.1%} ({self.requests} requests over {self.connections} new connections)"
+
+
+stats = ConnectionStats()
+
+
+class _CountingHTTPConnectionPool(urllib3.HTTPConnectionPool):
+    def _new_conn(self):
+        stats.record_connection()
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(urllib3.HTTPSConnectionPool):
+    def _new_conn(self):
+        stats.record_connection()
+        return super()._new_conn()
+
+
+class PooledAdapter(HTTPAdapter):
+    """HTTP/1.1 adapter keeping up to `pool_size` connections per host, counted in `stats`."""
+
+    def __init__(self, pool_size):
+        super().__init__(pool_maxsize=pool_size)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, **kwargs):
+        stats.record_request()
+        return super().send(request, **kwargs)
+
+
+class _StreamingBody:
+    """File-like `Response.raw` over a streamed httpx response."""
+
+    def __init__(self, response):
+        self.response = response
+        self.chunks = response.iter_bytes()
+        self.buffer = b''
+        # requests reads Set-Cookie from the raw response's headers through this
+        msg = http.client.HTTPMessage()
+        for name, value in response.headers.multi_items():
+            msg[name] = value
+        self._original_response = types.SimpleNamespace(msg=msg)
+
+    def read(self, amt=None, decode_content=None):
+        try:
+            while amt is None or len(self.buffer) < amt:
+                chunk = next(self.chunks, None)
+                if chunk is None:
+                    break
+                self.buffer += chunk
+        except httpx.HTTPError as e:
+            raise requests.exceptions.ConnectionError(e)
+        if amt is None:
+            data, self.buffer = self.buffer, b''
+        else:
+            data, self.buffer = self.buffer[:amt], self.buffer[amt:]
+        return data
+
+    def close(self):
+        self.response.close()
+
+
+def _ssl_context(verify, cert):
+    """An SSLContext for requests' `verify` (bool or CA bundle/dir path) and `cert` (path or (cert, key))."""
+    if isinstance(verify, str):
+        context = ssl.create_default_context(**{'capath' if os.path.isdir(verify) else 'cafile': verify})
+    elif verify:
+        context = ssl.create_default_context(cafile=requests.certs.where())
+    else:
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    if cert:
+        context.load_cert_chain(*((cert,) if isinstance(cert, str) else cert))
+    return context
+
+
+class Http2Adapter(BaseAdapter):
+    """
+    Sends requests' prepared requests through shared httpx clients with HTTP/2
+    enabled - one per verify/cert/proxy combination the session asks for.
+    """
+
+    def __init__(self, pool_size):
+        super().__init__()
+        global httpx
+        if not is_http2_available():
+            raise RuntimeError("HTTP/2 needs httpx with h2: pip install 'httpx[http2]'")
+        import httpx
+        self.pool_size = pool_size
+        self.clients = {}  # {(verify, cert, proxy): httpx.Client}
+        self.clients_lock = threading.Lock()
+
+    def _client(self, verify, cert, proxy):
+        key = (verify, tuple(cert) if isinstance(cert, (list, tuple)) else cert, proxy)
+        with self.clients_lock:
+            client = self.clients.get(key)
+            if client is None:
+                limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+                client = self.clients[key] = httpx.Client(
+                    http2=True, limits=limits, follow_redirects=False, trust_env=False,
+                    verify=_ssl_context(verify, cert), proxy=proxy)
+            return client
+
+    def _trace(self, event_name, info):
+        if event_name == 'connection.connect_tcp.complete':
+            stats.record_connection()
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        http_request = httpx.Request(
+            request.method, request.url, headers=list(request.headers.items()), content=request.body,
+            extensions={
+                'timeout': httpx.Timeout(read_timeout, connect=connect_timeout).as_dict(),
+                'trace': self._trace,
+            })
+        try:
+            client = self._client(verify, cert, select_proxy(request.url, proxies or {}))
+        except (OSError, ssl.SSLError) as e:  # Unreadable CA bundle or client certificate
+            raise requests.exceptions.SSLError(e, request=request)
+        stats.record_request()
+        try:
+            http_response = client.send(http_request, stream=True)
+        except httpx.ConnectTimeout as e:
+            raise requests.exceptions.ConnectTimeout(e, request=request)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.ReadTimeout(e, request=request)
+        except httpx.HTTPError as e:
+            raise requests.exceptions.ConnectionError(e, request=request)
+
+        response = requests.Response()
+        response.status_code = http_response.status_code
+        headers = CaseInsensitiveDict()
+        for name, value in http_response.headers.multi_items():
+            headers[name] = f"{headers[name]}, {value}" if name in headers else value
+        response.headers = headers
+        response.encoding = get_encoding_from_headers(headers)
+        response.reason = http_response.reason_phrase
+        response.raw = _StreamingBody(http_response)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        extract_cookies_to_jar(response.cookies, request, response.raw)
+        if not stream:
+            response.content  # Reads the body now, as requests does
+        return response
+
+    def close(self):
+        with self.clients_lock:
+            for client in self.clients.values():
+                client.close()
+            self.clients.clear()
+
+
+def response_total_size(status_code, headers):
+    """Total file size from Content-Range (206/416) or Content-Length (200), or None."""
+    content_range = headers.get('Content-Range', '')
+    if '/' in content_range:
+        total = content_range.rsplit('/', 1)[1].strip()
+        return int(total) if total.isdigit() else None
+    if status_code == 200:
+        length = headers.get('Content-Length', '')
+        return int(length) if length.isdigit() else None
+    return None
+
+
+def configure_session(session, pool_size, http2=False):
+    """
+    Mounts a pool of `pool_size` connections (HTTP/2 through httpx if `http2`)
+    on `session` for http and https. Returns the adapter.
+    """
+    adapter = Http2Adapter(pool_size) if http2 else PooledAdapter(pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return adapter
@@ -0,0 +1,74 @@
+"""Tests for MissCache: which cached misses each probe mode skips. Run with `python -m unittest` (or pytest) from RollYourOwn."""
+import json
+import os
+import tempfile
+import unittest
+
+import MissCache
+
+URL = 'https://www.justice.gov/epstein/files/DataSet%201/EFTA00000001.pdf'
+
+
+class MissCacheModeTest(unittest.TestCase):
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)  # After the caches' close(), which rewrites the journal
+        self.path = os.path.join(temp_dir.name, 'misses.jsonl')
+
+    def open_cache(self):
+        cache = MissCache.MissCache(self.path)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_head_content_type_miss_is_sniffed_again(self):
+        cache = self.open_cache()
+        cache.record(URL, 200, 'application/pdf', MissCache.HEAD_MODE)
+        self.assertTrue(cache.is_known_miss(URL, MissCache.HEAD_MODE))
+        self.assertFalse(cache.is_known_miss(URL, MissCache.SNIFF_MODE))
+
+    def test_sniff_miss_is_skipped_in_both_modes(self):
+        cache = self.open_cache()
+        cache.record(URL, 206, 'application/pdf', MissCache.SNIFF_MODE)
+        self.assertTrue(cache.is_known_miss(URL, MissCache.SNIFF_MODE))
+        self.assertTrue(cache.is_known_miss(URL, MissCache.HEAD_MODE))
+
+    def test_not_found_is_skipped_in_both_modes(self):
+        cache = self.open_cache()
+        cache.record(URL, 404, 'text/html', MissCache.HEAD_MODE)
+        self.assertTrue(cache.is_known_miss(URL, MissCache.SNIFF_MODE))
+        self.assertTrue(cache.is_known_miss(URL, MissCache.HEAD_MODE))
+
+    def test_transient_status_is_not_cached(self):
+        cache = self.open_cache()
+        cache.record(URL, 403, 'text/html', MissCache.SNIFF_MODE)
+        self.assertFalse(cache.is_known_miss(URL, MissCache.SNIFF_MODE))
+
+    def test_mode_survives_reload_and_old_entries_count_as_head(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'url': URL, 'status': 200, 'content_type': 'application/pdf', 'checked_at': 0}) + '\n')
+        cache = MissCache.MissCache(self.path)
+        self.assertFalse(cache.is_known_miss(URL, MissCache.SNIFF_MODE))
+        cache.record(URL, 206, 'application/octet-stream', MissCache.SNIFF_MODE)
+        cache.close()
+        self.assertTrue(self.open_cache().is_known_miss(URL, MissCache.SNIFF_MODE))
+
+    def write_old_miss(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'url': URL, 'status': 404, 'content_type': 'text/html', 'mode': 'head', 'checked_at': 0}) + '\n')
+
+    def test_expired_miss_counts_as_unknown(self):
+        self.write_old_miss()
+        cache = self.open_cache()
+        self.assertEqual(cache.expired_count(), 1)
+        self.assertFalse(cache.is_known_miss(URL, MissCache.HEAD_MODE))
+
+    def test_keep_expired_still_skips_expired_miss(self):
+        self.write_old_miss()
+        cache = MissCache.MissCache(self.path, keep_expired=True)
+        self.addCleanup(cache.close)
+        self.assertTrue(cache.is_known_miss(URL, MissCache.HEAD_MODE))
+
+
+if __name__ == '__main__':
+    unittest.main()
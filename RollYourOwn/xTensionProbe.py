@@ -1,27 +1,66 @@
+"""
+Probes alternate extensions for the scraped PDF URLs and records which stems are media.
+
+Run it as a script for the interactive flow (browser cookie step, prompts,
+resume from the output CSV), or import it and call the library API:
+
+    session = xTensionProbe.create_session(cookies)
+    for stem, hit in xTensionProbe.probe_stems(stems, ['.mp4', '.jpg'], session):
+        ...
+
+Importing has no side effects. Selenium is only imported when a browser step
+actually runs.
+"""
+import argparse
 import csv
 import os
+import queue
+import threading
 import time
-import random
 import json
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.service import Service
-import selenium_stealth
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import requests
-import questionary
+
+import AsyncEngine
+from AuthGate import AuthGate, check_cookies
+import CanonicalUrl
+import ExtensionStats
+import MediaHeaders
+import MissCache
+import PipelineStore
+import RateGovernor
+import Transport
+from RangeCache import RangeCache
 
 # === Config ===
 INPUT_CSV = 'epstein_no_images_pdf_urls.csv'          # Input scraped URLs
 OUTPUT_CSV = 'epstein_media_checked_urls.csv'         # Output with media finds
 COOKIES_FILE = 'doj_cookies.json'                     # Temp cookie storage
+COOKIE_CHECK_URL = None                               # File requested to check the saved cookies (default: a known find, else the first input URL)
 MAX_WORKERS = 5                                       # Reduced for rate limiting
 REQUEST_TIMEOUT = 30
 BATCH_SIZE = 50                                       # More frequent updates
+INITIAL_REQUEST_RATE = 3                              # Requests/second the adaptive rate governor starts at
+MAX_REQUEST_RATE = 30                                 # Upper bound for the adaptive rate governor
+USE_ASYNC_ENGINE = False                              # asyncio + aiohttp engine instead of the thread pool
+NETWORK_CONCURRENCY = AsyncEngine.DEFAULT_NETWORK_CONCURRENCY  # Async engine: max HEADs in flight
+USE_BROWSER = True                                    # False skips the manual cookie step (saved cookies are still used)
+LEARN_EXTENSION_ORDER = True                          # Try each stem's extensions in learned hit-rate order
+EXTENSION_STATS_FILE = 'xtension_hit_rates.json'      # Hit rates kept between runs
+BUCKET_BY_PATH = True                                 # Learn separate hit rates per dataset directory
+USE_MISS_CACHE = True                                 # Remember 404/non-media results so reruns skip them
+MISS_CACHE_FILE = 'xtension_misses.jsonl'             # Cached misses (status, Content-Type, time checked)
+MISS_CACHE_TTL_DAYS = 30                              # Misses older than this count as expired
+KEEP_EXPIRED_MISSES = False                           # Keep skipping expired misses instead of probing them again
+USE_HTTP2 = False                                     # Threads: multiplex all workers over HTTP/2 (pip install 'httpx[http2]')
+SNIFF_PROBE = False                                   # One Range GET per URL instead of a HEAD: type from magic bytes, size from Content-Range
+SNIFF_BYTES = 64 * 1024                               # Head fetched in sniff mode (GetMetaData's HEADER_PARSE_BYTES)
+PREFIX_CACHE_DIR = 'metadata_range_cache'             # Sniffed heads of the finds go to GetMetaData's range cache
+PREFIX_CACHE_MAX_GB = 20                              # Same cap as GetMetaData's RANGE_CACHE_MAX_GB
+USE_PIPELINE_STORE = False                            # Read URLs from / write finds to the shared SQLite store instead of the CSVs
+STORE_FILE = PipelineStore.STORE_FILE
+URL_ALIASES_FILE = CanonicalUrl.ALIASES_FILE           # Other spellings of the input URLs (shared with GetURLs)
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/144.0.0.0 Safari/537.36'
 
 # --- Full list of all possible extensions ---
 ALL_EXTENSIONS = [
@@ -43,283 +82,678 @@ ALL_EXTENSIONS = [
     '.ico', '.tga', '.psd'
 ]
 
-# --- Interactive Extension Selection ---
-if __name__ == "__main__":
-    _CONTACT = "\033[40;97m @ThatRetiredDude on 𝕏 or MaxwellInternational.ai \033[0m"
-    print("Follow the on-screen instructions. Any questions? Contact", _CONTACT)
-    # Use questionary to let the user select which extensions to probe
-    MEDIA_EXTENSIONS = questionary.checkbox(
-        "Select extensions to scan (Space to toggle, Enter to confirm):",
-        choices=[
-            # High-priority extensions are checked by default
-            questionary.Choice(ext, checked=(ext in ['.mp4', '.mov', '.jpg', '.jpeg', '.png', '.mp3']))
-            for ext in ALL_EXTENSIONS
-        ]
-    ).ask()
-
-    if not MEDIA_EXTENSIONS:
-        print("No extensions selected. Exiting.")
-        exit()
-
-    # --- Worker Count Selection ---
-    MAX_WORKERS_str = questionary.text(
-        f"Enter number of concurrent workers (threads) [1-50, default: {MAX_WORKERS}]:",
-        default=str(MAX_WORKERS)
-    ).ask()
-    try:
-        user_max_workers = int(MAX_WORKERS_str)
-        if 1 <= user_max_workers <= 50:
-            MAX_WORKERS = user_max_workers
-        else:
-            print("Invalid number. Using default.")
-    except (ValueError, TypeError):
-        print("Invalid input. Using default.")
-    
-    print(f"Using {MAX_WORKERS} workers.")
-    print(f"Starting scan for: {', '.join(MEDIA_EXTENSIONS)}")
-
 error_threshold = 10
-consecutive_401s = 0
-
-# Load input URLs
-if not os.path.exists(INPUT_CSV):
-    print(f"Error: {INPUT_CSV} not found!")
-    exit()
-
-urls = []
-with open(INPUT_CSV, 'r', newline='', encoding='utf-8') as f:
-    reader = csv.reader(f)
-    next(reader, None)
-    for row in reader:
-        if row:
-            urls.append(row[0].strip())
-
-print(f"Loaded {len(urls)} URLs to probe")
-
-# Load existing output for resume/skip
-processed_stems = set()
-updates = {}
-if os.path.exists(OUTPUT_CSV):
-    with open(OUTPUT_CSV, 'r', newline='', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        header = next(reader, None)
-        for row in reader:
-            if len(row) >= 3 and row[0]:
-                original = row[0]
-                stem = original.rsplit('.', 1)[0]
-                media_type = row[2].strip()
-                if media_type not in ['no_media_yet', 'pdf_or_not_found']:
-                    size_bytes = int(row[3]) if len(row) > 3 and row[3].isdigit() else -1
-                    updates[stem] = {
-                        'actual_url': row[1], 
-                        'media_type': media_type,
-                        'size_bytes': size_bytes
-                    }
-                    processed_stems.add(stem)
-    print(f"Resumed from existing output: {len(processed_stems)} already processed")
+# Shared by every worker (and the async engine): after error_threshold consecutive 401s
+# new HEADs wait while exactly one of them refreshes the cookies, then retry.
+# main() sets the refresh to the browser step; without one, bursts are just retried.
+auth_gate = AuthGate(threshold=error_threshold)
+extension_stats = None  # ExtensionStats instance when learned ordering is enabled
+miss_cache = None  # MissCache instance when cached misses are skipped
+prefix_cache = None  # RangeCache the sniffed heads are saved to in sniff mode
+
+
+# === Browser and session ===
+def open_browser():
+    """Starts a visible, stealth-patched Chrome on the library page. Selenium is only imported here."""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+    from webdriver_manager.chrome import ChromeDriverManager
+    import selenium_stealth
 
-# --- New columns for size and tiny file flag ---
-def save_progress():
-    with open(OUTPUT_CSV, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(['original_url', 'actual_url', 'media_type', 'size_bytes', 'is_tiny'])
-        for original_url in urls:
-            stem = original_url.rsplit('.', 1)[0]
-            if stem in updates:
-                # Add size and tiny flag to the row
-                size = updates[stem].get('size_bytes', -1)
-                is_tiny = size < (1024 * 100) if size != -1 else False
-                writer.writerow([
-                    original_url, 
-                    updates[stem]['actual_url'], 
-                    updates[stem]['media_type'],
-                    size,
-                    is_tiny
-                ])
-            else:
-                writer.writerow([original_url, original_url, 'no_media_yet', -1, False])
-    print(f"Progress saved to {OUTPUT_CSV}: {len(updates)} media finds so far")
-
-
-# === Step 1: Manual cookie grab (visible browser) ===
-options = Options()
-# Visible required for manual challenges
-options.add_argument("--window-size=1920,1080")
-options.add_argument("--disable-gpu")
-options.add_argument("--no-sandbox")
-options.add_argument("--disable-dev-shm-usage")
-options.add_experimental_option("excludeSwitches", ["enable-automation"])
-options.add_experimental_option("useAutomationExtension", False)
-
-service = Service(ChromeDriverManager().install())
-driver = webdriver.Chrome(service=service, options=options)
-
-selenium_stealth.stealth(driver,
-    languages=["en-US", "en"],
-    vendor="Google Inc.",
-    platform="MacIntel",
-    webgl_vendor="Intel Inc.",
-    renderer="Intel Iris OpenGL Engine",
-    fix_hairline=True,
-)
-
-driver.get("https://www.justice.gov/epstein")
-print("\n=== MANUAL VERIFICATION STEP ===")
-print("Browser opened. Solve any anti-bot, age gate, Queue-IT, or captcha.")
-print("Test by opening a direct file URL (e.g., paste a .pdf link) – it should load without redirect.")
-print("When access is clear, press Enter here to export cookies and start probing.")
-input("Press Enter to continue...")
-
-# Export cookies
-cookies = driver.get_cookies()
-with open(COOKIES_FILE, 'w') as f:
-    json.dump(cookies, f)
-print(f"Cookies exported – closing browser")
-driver.quit()
-
-# === Step 2: Parallel probing with requests ===
-session = requests.Session()
-with open(COOKIES_FILE) as f:
-    cookies = json.load(f)
-for cookie in cookies:
-    session.cookies.set(cookie['name'], cookie['value'])
-
-session.headers.update({
-    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/144.0.0.0 Safari/537.36',
-    'Referer': 'https://www.justice.gov/epstein'
-})
-
-def refresh_cookies_and_session():
-    global session, consecutive_401s
-    print("\\n🔄 *** BOT BLOCKED (401 burst) - HUMAN INTERVENTION ***")
-    print("1. Change VPN/IP.")
-    print("2. Browser reopens - solve challenges, test .mp4.")
-    print("3. Enter to resume.")
-    
     options = Options()
+    # Visible required for manual challenges
     options.add_argument("--window-size=1920,1080")
     options.add_argument("--disable-gpu")
     options.add_argument("--no-sandbox")
     options.add_argument("--disable-dev-shm-usage")
     options.add_experimental_option("excludeSwitches", ["enable-automation"])
     options.add_experimental_option("useAutomationExtension", False)
+
     service = Service(ChromeDriverManager().install())
     driver = webdriver.Chrome(service=service, options=options)
+
     selenium_stealth.stealth(driver,
         languages=["en-US", "en"],
         vendor="Google Inc.",
         platform="MacIntel",
         webgl_vendor="Intel Inc.",
         renderer="Intel Iris OpenGL Engine",
-        fix_hairline=True)
+        fix_hairline=True,
+    )
+
     driver.get("https://www.justice.gov/epstein")
+    return driver
+
+def get_cookies():
+    """Step 1: manual cookie grab in a visible browser. Saves and returns the cookies."""
+    driver = open_browser()
+    print("\n=== MANUAL VERIFICATION STEP ===")
+    print("Browser opened. Solve any anti-bot, age gate, Queue-IT, or captcha.")
+    print("Test by opening a direct file URL (e.g., paste a .pdf link) – it should load without redirect.")
+    print("When access is clear, press Enter here to export cookies and start probing.")
+    input("Press Enter to continue...")
+
+    # Export cookies
+    cookies = driver.get_cookies()
+    with open(COOKIES_FILE, 'w') as f:
+        json.dump(cookies, f)
+    print(f"Cookies exported – closing browser")
+    driver.quit()
+    return cookies
+
+def load_cookies():
+    """Cookies saved by an earlier browser step, or [] if there are none."""
+    if not os.path.exists(COOKIES_FILE):
+        return []
+    with open(COOKIES_FILE) as f:
+        return json.load(f)
+
+def create_session(cookies=(), workers=None, http2=None):
+    """
+    requests.Session with the browser cookies and headers, pooled for `workers`
+    threads (MAX_WORKERS by default), optionally over HTTP/2.
+    """
+    session = requests.Session()
+    for cookie in cookies:
+        session.cookies.set(cookie['name'], cookie['value'])
+    session.headers.update({
+        'User-Agent': USER_AGENT,
+        'Referer': 'https://www.justice.gov/epstein'
+    })
+    # One pooled connection per worker instead of requests' default of 10
+    Transport.configure_session(session, workers or MAX_WORKERS, http2=USE_HTTP2 if http2 is None else http2)
+    return session
+
+def refresh_cookies_and_session(session):
+    """Runs once per 401 burst, from auth_gate, while every other request waits."""
+    print("\\n🔄 *** BOT BLOCKED (401 burst) - HUMAN INTERVENTION ***")
+    print("1. Change VPN/IP.")
+    print("2. Browser reopens - solve challenges, test .mp4.")
+    print("3. Enter to resume.")
+
+    driver = open_browser()
     input("Done? Enter...")
     cookies = driver.get_cookies()
     driver.quit()
-    
+
     session.cookies.clear()
     for cookie in cookies:
         session.cookies.set(cookie['name'], cookie['value'])
     print("✅ Cookies refreshed - resuming...")
-    consecutive_401s = 0
 
 
-def probe_url(stem, ext):
+# === Probing ===
+def probe_url(stem, ext, session):
+    """
+    HEADs stem+ext (or sends the sniff GET in sniff mode). Returns (status, result):
+    result is {'actual_url', 'media_type', 'size_bytes'} for media (or tiny files),
+    else None; status is None if the request failed.
+    """
     test_url = stem + ext
     try:
-        r = session.head(test_url, allow_redirects=True, timeout=REQUEST_TIMEOUT)
-        status = r.status_code
-        global consecutive_401s, error_threshold
-        if status == 401:
-            consecutive_401s += 1
-            print(f"401 burst #{consecutive_401s}/{error_threshold} {ext} {stem[-40:]}")
-            if consecutive_401s >= error_threshold:
-                refresh_cookies_and_session()
-                return None
-        elif status != 200:
-            consecutive_401s = 0
-            ct = r.headers.get('Content-Type', '').lower()
+        attempt = 0
+        while True:
+            generation = auth_gate.wait()
+            # Paced by the shared adaptive governor instead of a fixed random sleep
+            RateGovernor.governor.acquire()
+            started = time.monotonic()
+            try:
+                if SNIFF_PROBE:
+                    r = session.get(test_url, headers={'Range': f'bytes=0-{SNIFF_BYTES - 1}'},
+                                    stream=True, allow_redirects=True, timeout=REQUEST_TIMEOUT)
+                else:
+                    r = session.head(test_url, allow_redirects=True, timeout=REQUEST_TIMEOUT)
+            except requests.exceptions.RequestException:
+                RateGovernor.governor.record(None)
+                raise
+            status = r.status_code
+            RateGovernor.governor.record(status, time.monotonic() - started, RateGovernor.parse_retry_after(r.headers))
+            if status != 401:
+                auth_gate.success(generation)
+                break
+            r.close()
+            print(f"401 burst #{auth_gate.failures + 1}/{error_threshold} {ext} {stem[-40:]}")
+            attempt += 1
+            if not auth_gate.failure(generation, attempt):
+                break  # No cookie refresh to wait for - reported as a (non-cached) 401
+            # Retried once the gate is open, with the refreshed cookies
+        if SNIFF_PROBE:
+            with r:
+                head = read_head(r) if status in (200, 206) else b''
+            return status, sniff_result(stem, ext, status, r.headers, head, r.url)
+        ct = r.headers.get('Content-Type', '').lower()
+        if status != 200:
             final_url = r.url
             print(f"NON200 {ext} {stem[-40:]} → status={status} final={final_url[-60:]} CT={ct}")
         if status == 200:
-            ct = r.headers.get('Content-Type', '').lower()
             size = int(r.headers.get('Content-Length', 0))
             if size < 1024 * 100:  # Skip <100KB fakes
                 print(f"TINY {size/1024:.1f}KB {ext} {stem[-40:]} skip")
                 # Still record the find, but with a special 'tiny_file' type
-                return {'actual_url': test_url, 'media_type': 'tiny_file', 'size_bytes': size}
-            
+                return status, {'actual_url': test_url, 'media_type': 'tiny_file', 'size_bytes': size}
+
             if any(m in ct for m in ['video/', 'image/', 'audio/']):
                 print(f"VALID {size/1024/1024:.1f}MB {ct[:20]} {ext} OK")
-                return {'actual_url': test_url, 'media_type': ct, 'size_bytes': size}
-        return None
+                return status, {'actual_url': test_url, 'media_type': ct, 'size_bytes': size}
+        record_miss(test_url, status, ct)
+        return status, None
     except Exception as e:
         print(f"ERR {ext} {stem[-40:]} → {str(e)[:80]}")
+        return None, None
+
+async def async_probe_url(engine, stem, ext):
+    """asyncio version of probe_url - same (status, result) pairs. 401s are retried by the engine."""
+    test_url = stem + ext
+    try:
+        if SNIFF_PROBE:
+            async with engine.request('GET', test_url, headers={'Range': f'bytes=0-{SNIFF_BYTES - 1}'},
+                                      allow_redirects=True) as r:
+                head = b''
+                while r.status in (200, 206) and len(head) < SNIFF_BYTES:
+                    chunk = await r.content.read(SNIFF_BYTES - len(head))
+                    if not chunk:
+                        break
+                    head += chunk
+                return r.status, sniff_result(stem, ext, r.status, r.headers, head, str(r.url))
+        async with engine.request('HEAD', test_url, allow_redirects=True) as r:
+            status = r.status
+            ct = r.headers.get('Content-Type', '').lower()
+            size = int(r.headers.get('Content-Length', 0))
+            final_url = str(r.url)
+        if status != 200:
+            print(f"NON200 {ext} {stem[-40:]} → status={status} final={final_url[-60:]} CT={ct}")
+            record_miss(test_url, status, ct)
+            return status, None
+        if size < 1024 * 100:  # Skip <100KB fakes
+            print(f"TINY {size/1024:.1f}KB {ext} {stem[-40:]} skip")
+            return status, {'actual_url': test_url, 'media_type': 'tiny_file', 'size_bytes': size}
+        if any(m in ct for m in ['video/', 'image/', 'audio/']):
+            print(f"VALID {size/1024/1024:.1f}MB {ct[:20]} {ext} OK")
+            return status, {'actual_url': test_url, 'media_type': ct, 'size_bytes': size}
+        record_miss(test_url, status, ct)
+        return status, None
+    except Exception as e:
+        print(f"ERR {ext} {stem[-40:]} → {str(e)[:80]}")
+        return None, None
+
+def read_head(r):
+    """The first SNIFF_BYTES of a streamed response (servers that ignore Range send the whole file)."""
+    head = b''
+    for chunk in r.iter_content(chunk_size=SNIFF_BYTES):
+        head += chunk
+        if len(head) >= SNIFF_BYTES:
+            break
+    return head[:SNIFF_BYTES]
+
+def sniff_result(stem, ext, status, headers, head, final_url):
+    """
+    Classifies a sniff GET like probe_url classifies a HEAD, but by the magic
+    bytes of `head` (the Content-Type only counts when they're unknown), with
+    the size from Content-Range. The head of every find is saved to
+    prefix_cache, so GetMetaData's header parse starts from disk.
+    """
+    test_url = stem + ext
+    ct = headers.get('Content-Type', '').lower()
+    if status not in (200, 206):
+        print(f"NON200 {ext} {stem[-40:]} → status={status} final={final_url[-60:]} CT={ct}")
+        record_miss(test_url, status, ct)
+        return None
+    media_type = MediaHeaders.sniff_media_type(head) or ct
+    size = Transport.response_total_size(status, headers)
+    if size is None and len(head) < SNIFF_BYTES:
+        size = len(head)  # The whole file fit in the head
+    if size is not None and size < 1024 * 100:  # Skip <100KB fakes
+        print(f"TINY {size/1024:.1f}KB {ext} {stem[-40:]} skip")
+        result = {'actual_url': test_url, 'media_type': 'tiny_file', 'size_bytes': size}
+    elif MediaHeaders.is_media_type(media_type):
+        size_text = f"{size/1024/1024:.1f}MB" if size is not None else "?MB"
+        print(f"VALID {size_text} {media_type[:20]} {ext} OK")
+        result = {'actual_url': test_url, 'media_type': media_type, 'size_bytes': size if size is not None else -1}
+    else:
+        record_miss(test_url, status, media_type)
+        return None
+    if prefix_cache is not None:
+        prefix_cache.write(test_url, 0, head)
+        if size is not None:
+            prefix_cache.set_total_size(test_url, size)
+    return result
+
+def ordered_extensions(stem, extensions):
+    """Media extensions by learned hit rate for this stem (if enabled); the original .pdf stays last."""
+    if extension_stats is None:
+        return extensions
+    media = [ext for ext in extensions if ext != '.pdf']
+    return extension_stats.order(stem, media) + [ext for ext in extensions if ext == '.pdf']
+
+def record_try(stem, ext, status, result):
+    """Counts a try towards the hit rates if the server really answered (not an error or a 401 it gave up on)."""
+    if extension_stats is not None and status in MissCache.CACHEABLE_STATUSES:
+        extension_stats.record(stem, ext, bool(result))
+    if result and miss_cache is not None:
+        miss_cache.discard(stem + ext)
+
+def probe_mode():
+    return MissCache.SNIFF_MODE if SNIFF_PROBE else MissCache.HEAD_MODE
+
+def known_miss(url):
+    return miss_cache is not None and miss_cache.is_known_miss(url, probe_mode())
+
+def record_miss(url, status, ct):
+    if miss_cache is not None:
+        miss_cache.record(url, status, ct, probe_mode())
+
+def probe_stem(stem, extensions, session):
+    """Tries stem+ext for each extension (skipping cached misses), stopping at the first hit. Returns (ext, result) or None."""
+    try:
+        for ext in ordered_extensions(stem, extensions):
+            if known_miss(stem + ext):
+                continue
+            status, result = probe_url(stem, ext, session)
+            record_try(stem, ext, status, result)
+            if result:
+                return ext, result
         return None
     finally:
-        time.sleep(random.uniform(0.5, 2.0))
-
-new_finds = 0
-for ext in MEDIA_EXTENSIONS:
-    total_pdf = sum(1 for u in urls if u.lower().endswith('.pdf'))
-    media_stems = len(updates)
-    stems_to_probe = [u.rsplit('.', 1)[0] for u in urls if u.lower().endswith('.pdf') and u.rsplit('.', 1)[0] not in processed_stems and u.rsplit('.', 1)[0] not in updates]
-    print(f"DEBUG {ext}: Total PDF={total_pdf} Media={media_stems} Probe={len(stems_to_probe)}")
-    if len(stems_to_probe) == 0:
-        print(f"  Skipping {ext} - all probed!")
-    print(f"DEBUG: Probing {len(stems_to_probe)} stems for {ext}")
-    
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        future_to_stem = {executor.submit(probe_url, stem, ext): stem for stem in stems_to_probe}
-        for i, future in enumerate(as_completed(future_to_stem), 1):
-            stem = future_to_stem[future]
-            result = future.result()
+        if extension_stats is not None:
+            extension_stats.stem_done()
+
+async def async_probe_stem(engine, stem, extensions):
+    """asyncio version of probe_stem."""
+    try:
+        for ext in ordered_extensions(stem, extensions):
+            if known_miss(stem + ext):
+                continue
+            status, result = await async_probe_url(engine, stem, ext)
+            record_try(stem, ext, status, result)
             if result:
-                updates[stem] = result
-                processed_stems.add(stem)
-                new_finds += 1
+                return ext, result
+        return None
+    finally:
+        if extension_stats is not None:
+            extension_stats.stem_done()
+
+def probe_stems(stems, extensions, session, use_async=None, workers=None, network_concurrency=None):
+    """
+    Probes every stem with one shared pool and yields (stem, hit) as each stem
+    finishes, in completion order (hit is (ext, result) or None).
+
+    Each stem walks its extensions in order and stops at the first hit, so the
+    remaining extensions of a found stem are never requested, and workers move
+    on to the next stem instead of waiting for the slowest HEAD of an
+    extension-wide pass. Only a window of stems is in flight at a time, and
+    closing the iterator early drops the stems that haven't started yet.
+
+    Args:
+        stems: Iterable of URLs without extension
+        extensions: Extensions to try, e.g. ['.mp4', '.jpg']
+        session: requests.Session with the cookies (see create_session())
+        use_async: asyncio engine instead of threads (USE_ASYNC_ENGINE by default)
+        workers: Threads (MAX_WORKERS by default)
+        network_concurrency: Async engine: HEADs in flight (NETWORK_CONCURRENCY by default)
+    """
+    if USE_ASYNC_ENGINE if use_async is None else use_async:
+        return _iter_async(stems, extensions, session, network_concurrency or NETWORK_CONCURRENCY)
+    return _iter_threaded(stems, extensions, session, workers or MAX_WORKERS)
+
+def _iter_threaded(stems, extensions, session, workers):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        remaining = iter(stems)
+        pending = {}
+        try:
+            while True:
+                for stem in remaining:
+                    pending[executor.submit(probe_stem, stem, extensions, session)] = stem
+                    if len(pending) >= 2 * workers:
+                        break
+                if not pending:
+                    return
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+class _Stopped(Exception):
+    """Raised on the event loop once the consumer of _iter_async has gone away."""
+
+def _iter_async(stems, extensions, session, network_concurrency):
+    # The event loop runs on its own thread and hands results over through a queue
+    results = queue.Queue()
+    stop = threading.Event()
+    finished = object()
+
+    def on_result(stem, hit):
+        if stop.is_set():
+            raise _Stopped()
+        results.put((stem, hit))
+
+    def run():
+        try:
+            AsyncEngine.run_all(
+                stems, lambda engine, stem: async_probe_stem(engine, stem, extensions), on_result, session,
+                network_concurrency=network_concurrency,
+                auth_statuses=(401,),
+                auth_gate=auth_gate,
+                governor=RateGovernor.governor,
+            )
+        except _Stopped:
+            pass
+        except BaseException as e:
+            results.put(e)
+        finally:
+            results.put(finished)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = results.get()
+            if item is finished:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+# === Input/output ===
+def load_urls(path=INPUT_CSV):
+    urls = []
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if row:
+                urls.append(row[0].strip())
+    return urls
+
+def stem_key(url):
+    """Key of url's stem in the finds: the stem of its canonical spelling."""
+    return CanonicalUrl.canonical_url(url).rsplit('.', 1)[0]
+
+def load_finds(path=OUTPUT_CSV):
+    """Media finds from an earlier run's output: {stem: result}, keyed by stem_key()."""
+    updates = {}
+    if not os.path.exists(path):
+        return updates
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        for row in reader:
+            if len(row) >= 3 and row[0]:
+                stem = stem_key(row[0])
+                media_type = row[2].strip()
+                if media_type not in ['no_media_yet', 'pdf_or_not_found']:
+                    size_bytes = int(row[3]) if len(row) > 3 and row[3].isdigit() else -1
+                    updates[stem] = {
+                        'actual_url': row[1].strip(),
+                        'media_type': media_type,
+                        'size_bytes': size_bytes
+                    }
+    return updates
+
+# --- New columns for size and tiny file flag ---
+def save_progress(urls, updates, path=OUTPUT_CSV):
+    """Writes one row per URL as it was listed and fetched; finds are looked up by stem_key()."""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['original_url', 'actual_url', 'media_type', 'size_bytes', 'is_tiny'])
+        for original_url in urls:
+            stem = stem_key(original_url)
+            if stem in updates:
+                # Add size and tiny flag to the row
+                size = updates[stem].get('size_bytes', -1)
+                is_tiny = size < (1024 * 100) if size != -1 else False
+                writer.writerow([
+                    original_url,
+                    updates[stem]['actual_url'],
+                    updates[stem]['media_type'],
+                    size,
+                    is_tiny
+                ])
+            else:
+                writer.writerow([original_url, original_url, 'no_media_yet', -1, False])
+    print(f"Progress saved to {path}: {len(updates)} media finds so far")
+
+
+# === Script ===
+def parse_args():
+    """Command line (non-interactive runs, e.g. Benchmark.py)."""
+    parser = argparse.ArgumentParser(description="Probe alternate extensions for the scraped PDF URLs.")
+    parser.add_argument('--extensions', help="Comma-separated extensions to probe (e.g. .mp4,.jpg); skips the interactive prompts")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help="Worker threads")
+    parser.add_argument('--async-engine', action='store_true', help="Use the asyncio engine")
+    parser.add_argument('--network-concurrency', type=int, default=NETWORK_CONCURRENCY, help="Async engine: max HEADs in flight")
+    parser.add_argument('--initial-rate', type=float, default=INITIAL_REQUEST_RATE, help="Requests/second to start at")
+    parser.add_argument('--max-rate', type=float, default=MAX_REQUEST_RATE, help="Upper bound for the request rate")
+    parser.add_argument('--no-browser', action='store_true', help="Skip the manual cookie step")
+    parser.add_argument('--selection-order', action='store_true', help="Try extensions in the given order instead of by learned hit rate")
+    parser.add_argument('--no-miss-cache', action='store_true', help="Probe every stem+extension, even known misses")
+    parser.add_argument('--miss-ttl-days', type=float, default=MISS_CACHE_TTL_DAYS, help="Age after which a cached miss expires")
+    parser.add_argument('--keep-expired-misses', action='store_true', help="Keep skipping cached misses older than the TTL instead of probing them again")
+    parser.add_argument('--http2', action='store_true', help="Send the threads' HEADs over HTTP/2 (needs httpx[http2])")
+    parser.add_argument('--sniff', action='store_true', help="One Range GET per URL: sniff the type from magic bytes and save the head for GetMetaData")
+    parser.add_argument('--store', action='store_true', default=USE_PIPELINE_STORE, help=f"Use the shared SQLite store ({STORE_FILE}) instead of the CSV files")
+    return parser.parse_args()
+
+def main():
+    global MAX_WORKERS, INITIAL_REQUEST_RATE, MAX_REQUEST_RATE, USE_ASYNC_ENGINE, NETWORK_CONCURRENCY
+    global USE_BROWSER, LEARN_EXTENSION_ORDER, USE_MISS_CACHE, MISS_CACHE_TTL_DAYS, KEEP_EXPIRED_MISSES, USE_HTTP2
+    global SNIFF_PROBE, USE_PIPELINE_STORE, extension_stats, miss_cache, prefix_cache
+    args = parse_args()
+    INITIAL_REQUEST_RATE, MAX_REQUEST_RATE = args.initial_rate, args.max_rate
+    USE_BROWSER = not args.no_browser
+    LEARN_EXTENSION_ORDER = not args.selection_order
+    USE_MISS_CACHE = not args.no_miss_cache
+    MISS_CACHE_TTL_DAYS = args.miss_ttl_days
+    KEEP_EXPIRED_MISSES = args.keep_expired_misses
+    USE_HTTP2 = args.http2 and Transport.is_http2_available()
+    SNIFF_PROBE = args.sniff
+    USE_PIPELINE_STORE = args.store
+    interactive = not args.extensions
+    if interactive:
+        import questionary  # Only the interactive flow needs the prompt toolkit
+
+    # --- Extension Selection (from the command line, or interactive) ---
+    if not interactive:
+        MEDIA_EXTENSIONS = [ext.strip() if ext.strip().startswith('.') else '.' + ext.strip()
+                            for ext in args.extensions.split(',') if ext.strip()]
+        MAX_WORKERS = args.workers
+        USE_ASYNC_ENGINE = args.async_engine and AsyncEngine.is_available()
+        NETWORK_CONCURRENCY = args.network_concurrency
+        print(f"Starting scan for: {', '.join(MEDIA_EXTENSIONS)}")
+    else:
+        _CONTACT = "\033[40;97m @ThatRetiredDude on 𝕏 or MaxwellInternational.ai \033[0m"
+        print("Follow the on-screen instructions. Any questions? Contact", _CONTACT)
+        # Use questionary to let the user select which extensions to probe
+        MEDIA_EXTENSIONS = questionary.checkbox(
+            "Select extensions to scan (Space to toggle, Enter to confirm):",
+            choices=[
+                # High-priority extensions are checked by default
+                questionary.Choice(ext, checked=(ext in ['.mp4', '.mov', '.jpg', '.jpeg', '.png', '.mp3']))
+                for ext in ALL_EXTENSIONS
+            ]
+        ).ask()
+
+        if not MEDIA_EXTENSIONS:
+            print("No extensions selected. Exiting.")
+            exit()
+
+        # --- Worker Count Selection ---
+        MAX_WORKERS_str = questionary.text(
+            f"Enter number of concurrent workers (threads) [1-50, default: {MAX_WORKERS}]:",
+            default=str(MAX_WORKERS)
+        ).ask()
+        try:
+            user_max_workers = int(MAX_WORKERS_str)
+            if 1 <= user_max_workers <= 50:
+                MAX_WORKERS = user_max_workers
+            else:
+                print("Invalid number. Using default.")
+        except (ValueError, TypeError):
+            print("Invalid input. Using default.")
+
+        if AsyncEngine.is_available():
+            USE_ASYNC_ENGINE = questionary.confirm(
+                "Use the asyncio engine? (Many HEAD requests in flight instead of one per thread)",
+                default=False
+            ).ask()
+        if USE_ASYNC_ENGINE:
+            concurrency_str = questionary.text(
+                f"Max HEAD requests in flight [default: {NETWORK_CONCURRENCY}]:",
+                default=str(NETWORK_CONCURRENCY)
+            ).ask()
+            try:
+                if int(concurrency_str) >= 1:
+                    NETWORK_CONCURRENCY = int(concurrency_str)
+            except (ValueError, TypeError):
+                print("Invalid input. Using default.")
+            print(f"Using the asyncio engine with up to {NETWORK_CONCURRENCY} requests in flight.")
+        else:
+            if Transport.is_http2_available():
+                USE_HTTP2 = questionary.confirm(
+                    "Use HTTP/2? (All workers share a few multiplexed connections instead of one each)",
+                    default=False
+                ).ask()
+            print(f"Using {MAX_WORKERS} workers{' over HTTP/2' if USE_HTTP2 else ''}.")
+        SNIFF_PROBE = questionary.confirm(
+            f"Sniff file types? (One {SNIFF_BYTES // 1024}KB Range GET per URL instead of a HEAD; the head is saved for GetMetaData)",
+            default=SNIFF_PROBE
+        ).ask()
+        print(f"Starting scan for: {', '.join(MEDIA_EXTENSIONS)}")
+
+    RateGovernor.governor.configure(initial_rate=INITIAL_REQUEST_RATE, max_rate=MAX_REQUEST_RATE)
+    if LEARN_EXTENSION_ORDER:
+        extension_stats = ExtensionStats.ExtensionStats(EXTENSION_STATS_FILE, BUCKET_BY_PATH)
+    if USE_MISS_CACHE:
+        miss_cache = MissCache.MissCache(MISS_CACHE_FILE, MISS_CACHE_TTL_DAYS, KEEP_EXPIRED_MISSES)
+        expired = miss_cache.expired_count()
+        print(f"Cached misses: {len(miss_cache.entries)} ({expired} older than {MISS_CACHE_TTL_DAYS:g} days, "
+              f"{'still skipped' if KEEP_EXPIRED_MISSES else 'probed again'})")
+    if SNIFF_PROBE:
+        prefix_cache = RangeCache(PREFIX_CACHE_DIR, PREFIX_CACHE_MAX_GB * 1024 * 1024 * 1024)
+        print(f"Sniff mode: file heads of the finds are saved to {PREFIX_CACHE_DIR}/")
+
+    # Load input URLs
+    store = None
+    if USE_PIPELINE_STORE:
+        # Stems and finds come from indexed queries instead of the CSVs
+        store = PipelineStore.open_store(STORE_FILE)
+        if store.url_count() == 0 and os.path.exists(INPUT_CSV):
+            print(f"Seeded the store with {store.import_urls_csv(INPUT_CSV)} URLs from {INPUT_CSV}")
+        if store.find_count() == 0 and os.path.exists(OUTPUT_CSV):
+            print(f"Seeded the store with {store.import_probe_csv(OUTPUT_CSV)} media finds from {OUTPUT_CSV}")
+        url_count = store.url_count()
+        if not url_count:
+            print(f"Error: no URLs in {STORE_FILE} - run GetURLs first!")
+            exit()
+        pending_stems = store.pending_stems()
+        updates = store.probe_finds()
+        first_url = next(iter(pending_stems.values()), None)
+        print(f"Loaded {url_count} URLs to probe, {len(updates)} already processed")
+    else:
+        if not os.path.exists(INPUT_CSV):
+            print(f"Error: {INPUT_CSV} not found!")
+            exit()
+        # Each file is probed once (under the first spelling listed), however many spellings of its URL were scraped
+        url_index = CanonicalUrl.CanonicalIndex(URL_ALIASES_FILE)
+        urls, duplicates = url_index.dedupe(load_urls(INPUT_CSV), keep_spelling=True)
+        url_index.save()
+        url_count = len(urls)
+        first_url = urls[0] if urls else None
+        print(f"Loaded {url_count} URLs to probe")
+        if duplicates:
+            print(f"Skipped {duplicates} duplicate URLs (another spelling of a listed file) – "
+                  f"up to {duplicates * len(set(MEDIA_EXTENSIONS) | {'.pdf'})} HEAD requests saved")
+
+        # Load existing output for resume/skip
+        updates = load_finds(OUTPUT_CSV)
+        if os.path.exists(OUTPUT_CSV):
+            print(f"Resumed from existing output: {len(updates)} already processed")
+
+    # === Step 1: Manual cookie grab (visible browser), unless the saved cookies still work ===
+    cookies = load_cookies()
+    session = create_session(cookies)
+    if USE_BROWSER:
+        check_url = COOKIE_CHECK_URL or next((find['actual_url'] for find in updates.values()), first_url)
+        if cookies and check_url and check_cookies(session, check_url):
+            print("Saved cookies still work – skipping the browser step")
+        else:
+            cookies = get_cookies()
+            session.cookies.clear()
+            for cookie in cookies:
+                session.cookies.set(cookie['name'], cookie['value'])
+
+    # === Step 2: Parallel probing with requests ===
+    if USE_BROWSER:  # Without one, a rejected HEAD is retried a few times and then given up
+        auth_gate.refresh = lambda: refresh_cookies_and_session(session)
+
+    # Stems are derived once; already found stems are skipped
+    if store is not None:
+        pdf_stem_count = store.pdf_stem_count()
+        stems_to_probe = list(pending_stems)
+        stem_keys = {stem: stem for stem in stems_to_probe}  # The store's URLs are canonical already
+    else:
+        # Probed as listed; the finds are keyed by the canonical stem
+        stem_keys = {u.rsplit('.', 1)[0]: stem_key(u) for u in urls if u.lower().endswith('.pdf')}
+        pdf_stem_count = len(stem_keys)
+        stems_to_probe = [stem for stem, key in stem_keys.items() if key not in updates]
+    # The original .pdf goes last: a stem with no other media may be mislabeled media itself
+    extensions_to_probe = [ext for ext in MEDIA_EXTENSIONS if ext != '.pdf'] + ['.pdf']
+    print(f"DEBUG: Total PDF={pdf_stem_count} Media={len(updates)} Probe={len(stems_to_probe)} stems x {len(extensions_to_probe)} extensions")
+    if not stems_to_probe:
+        print("  Skipping - all probed!")
+
+    probed_count = 0
+    finds_per_extension = {ext: 0 for ext in extensions_to_probe}
+    for stem, hit in probe_stems(stems_to_probe, extensions_to_probe, session):
+        probed_count += 1
+        if hit:
+            ext, result = hit
+            updates[stem_keys[stem]] = result
+            finds_per_extension[ext] += 1
+            if store is not None:
+                store.add_probe_result(stem, pending_stems[stem], result)
+            if ext == '.pdf':
+                print(f"MISLabeled: {stem}.pdf → {result['media_type']}")
+            else:
                 print(f"FOUND: {stem}{ext} → {result['media_type']}")
-            if i % BATCH_SIZE == 0:
-                print(f"   Processed {i}/{len(stems_to_probe)} for {ext}")
-            if i % 250 == 0:
-                save_progress()
-
-    print(f"Found {new_finds} new with {ext} (total finds: {len(updates)})")
-    save_progress()
-
-# Final mislabeled .pdf check (parallel)
-print("\nChecking original .pdf for mislabeled media...")
-total_pdf = sum(1 for u in urls if u.lower().endswith('.pdf'))
-media_stems = len(updates)
-stems_to_check = [u.rsplit('.', 1)[0] for u in urls if u.lower().endswith('.pdf') and u.rsplit('.', 1)[0] not in updates]
-print(f"DEBUG PDF check: Total PDF={total_pdf} Media={media_stems} Probe={len(stems_to_check)}")
-if len(stems_to_check) == 0:
-    print("  Skipping PDF check - all probed!")
-    print(f"DEBUG: PDF check {len(stems_to_check)} stems")
-
-with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-    future_to_stem = {executor.submit(probe_url, stem, '.pdf'): stem for stem in stems_to_check}
-    pdf_batch = 0
-    for future in as_completed(future_to_stem):
-        stem = future_to_stem[future]
-        result = future.result()
-        if result:
-            updates[stem] = result
-            new_finds += 1
-            print(f"MISLabeled: {stem}.pdf → {result['media_type']}")
-        pdf_batch += 1
-        if pdf_batch % 250 == 0:
-            save_progress()
-
-    save_progress()
-
-print(f"\nCOMPLETE! {len(updates)} media files found (out of {len(urls)} URLs)")
-print(f"Results saved to {OUTPUT_CSV}")
-
-# Optional cleanup
-# os.remove(COOKIES_FILE)
-
-# This ensures the script doesn't autorun if imported elsewhere
-if __name__ != "__main__":
-    print("This script is designed to be run directly, not imported.")
-    exit()
+        if probed_count % BATCH_SIZE == 0:
+            print(f"   Processed {probed_count}/{len(stems_to_probe)} stems")
+        if probed_count % 250 == 0 and store is None:
+            save_progress(urls, updates)
+        if extension_stats is not None:
+            extension_stats.maybe_save()
+
+    if store is None:
+        save_progress(urls, updates)
+    else:
+        store.close()
+    if extension_stats is not None:
+        extension_stats.save()
+        print(f"HEAD requests per stem: {extension_stats.requests_per_stem():.2f} (hit rates saved to {EXTENSION_STATS_FILE})")
+    if miss_cache is not None:
+        miss_cache.close()
+        print(f"Skipped {miss_cache.skipped} HEAD requests for cached misses ({len(miss_cache.entries)} saved to {MISS_CACHE_FILE})")
+    if prefix_cache is not None:
+        prefix_cache.close()
+
+    for ext, finds in finds_per_extension.items():
+        if finds:
+            print(f"Found {finds} new with {ext}")
+    print(f"\nCOMPLETE! {len(updates)} media files found (out of {url_count} URLs)")
+    print(Transport.stats.summary())
+    if store is not None:
+        print(f"Results saved to {STORE_FILE} (python PipelineStore.py --export writes {OUTPUT_CSV})")
+    else:
+        print(f"Results saved to {OUTPUT_CSV}")
+
+    # Optional cleanup
+    # os.remove(COOKIES_FILE)
+
+if __name__ == "__main__":
+    main()